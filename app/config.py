@@ -7,19 +7,111 @@ load_dotenv()
 # Storage
 STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
 S3_BUCKET = os.getenv("S3_BUCKET", "my-bucket")
+REGISTRY_PATH = os.getenv("REGISTRY_PATH", os.path.join(STORAGE_PATH, "registry.sqlite3"))
+
+# Claim-check blob store for intermediate pipeline data: "local" or "s3" (uses S3_BUCKET)
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", os.path.join(STORAGE_PATH, "blobs"))
+BLOB_STORE_S3_PREFIX = os.getenv("BLOB_STORE_S3_PREFIX", "blobs/")
+BLOB_STORE_TTL_HOURS = float(os.getenv("BLOB_STORE_TTL_HOURS", "24"))  # Blobs not written for this long are deleted; 0 keeps them
+BLOB_STORE_SWEEP_INTERVAL_MINUTES = float(os.getenv("BLOB_STORE_SWEEP_INTERVAL_MINUTES", "60"))  # Minimum time between sweeps per worker
 
 # Pinecone
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1")  # AWS region
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "document-search")
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")  # Logged by scripts/init_pinecone.py; saves a describe_index call per process
 PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")  # AWS cloud provider
 
+# Vector store: "pinecone" or "local"
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", os.path.join(STORAGE_PATH, "vector_store"))
+LOCAL_VECTOR_STORE_MODE = os.getenv("LOCAL_VECTOR_STORE_MODE", "exact")  # "exact" or "hnsw"
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+HNSW_SAVE_EVERY = int(os.getenv("HNSW_SAVE_EVERY", "10000"))  # Rows changed between saves of the HNSW graph
+
+# Vector upserts: batches are capped by vector count and by estimated request
+# size (Pinecone rejects upserts over 2 MB or 1000 vectors)
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "200"))
+UPSERT_MAX_BATCH_BYTES = int(os.getenv("UPSERT_MAX_BATCH_BYTES", str(1536 * 1024)))
+UPSERT_MAX_IN_FLIGHT = int(os.getenv("UPSERT_MAX_IN_FLIGHT", "4"))  # Concurrent upsert requests per process
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "5"))  # Per batch, on throttling and transient errors
+QUERY_MAX_IN_FLIGHT = int(os.getenv("QUERY_MAX_IN_FLIGHT", "16"))  # Concurrent Pinecone queries per batch search
+
+# Keyword (BM25) index used for hybrid search
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX_ENABLED", "true").lower() == "true"
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", os.path.join(STORAGE_PATH, "keyword_index.sqlite3"))
+KEYWORD_INDEX_MAX_SEGMENTS = int(os.getenv("KEYWORD_INDEX_MAX_SEGMENTS", "16"))  # Posting segments per term before they are merged
+
+# Chunk text lives in a compressed local docstore rather than in vector
+# metadata; search reads it back only for the results it returns
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(STORAGE_PATH, "chunk_store.sqlite3"))
+
+# Keys of the chunks indexed per document, diffed on re-index so only new or
+# changed chunks are embedded
+CHUNK_MANIFEST_PATH = os.getenv("CHUNK_MANIFEST_PATH", os.path.join(STORAGE_PATH, "chunk_manifest.sqlite3"))
+
 # OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Any OpenAI-compatible embeddings endpoint, e.g. a proxy or a benchmark fake
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))  # text-embedding-3-small
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "2048"))  # Max inputs per embeddings request (API limit 2048)
+EMBEDDING_MAX_REQUEST_TOKENS = int(os.getenv("EMBEDDING_MAX_REQUEST_TOKENS", "250000"))  # Token budget per request (API limit 300k)
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))  # Requests in flight per process
+EMBEDDING_MAX_CONNECTIONS = int(os.getenv("EMBEDDING_MAX_CONNECTIONS", "16"))  # Keep-alive pool size
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))  # Account quota shared by all replicas; 0 = unlimited
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+EMBEDDING_QUERY_RESERVE = float(os.getenv("EMBEDDING_QUERY_RESERVE", "0.1"))  # Quota share held back for search queries
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))  # Per request, on 429s and transient errors
+EMBEDDING_LATENCY_TARGET_SECONDS = float(os.getenv("EMBEDDING_LATENCY_TARGET_SECONDS", "15"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(STORAGE_PATH, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+
+# Query embedding cache
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2048"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# Batch search
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "100"))  # Queries per /search/batch request
+
+# Dragonfly (Redis-compatible) shared cache, e.g. redis://dragonfly:6379/0
+DRAGONFLY_URL = os.getenv("DRAGONFLY_URL")
 
 # Temporal
 TEMPORAL_HOST = os.getenv("TEMPORAL_HOST", "localhost:7233")
 
+# Pipeline concurrency
+PARSE_MAX_IN_FLIGHT = int(os.getenv("PARSE_MAX_IN_FLIGHT", "60"))  # 3 parsing replicas x 20 slots
+PARSE_MIN_PAGES_PER_RANGE = int(os.getenv("PARSE_MIN_PAGES_PER_RANGE", "2"))
+PARSE_MAX_PAGES_PER_RANGE = int(os.getenv("PARSE_MAX_PAGES_PER_RANGE", "25"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "12"))  # embed_chunks_activity calls per document
+EMBED_CHUNKS_PER_ACTIVITY = int(os.getenv("EMBED_CHUNKS_PER_ACTIVITY", "100"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))  # Chunk size, in embedding model tokens
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_PAGE_ALIGNED = os.getenv("CHUNK_PAGE_ALIGNED", "true").lower() == "true"  # Chunks never span pages, so an edit only changes its own page's chunks
+PDF_CACHE_MAX_DOCUMENTS = int(os.getenv("PDF_CACHE_MAX_DOCUMENTS", "8"))  # Open PDFs kept per parsing worker
+
+# Thumbnails
+THUMBNAIL_SIZES = [int(size) for size in os.getenv("THUMBNAIL_SIZES", "160,480").split(",") if size.strip()]  # Longest edge, px
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()  # "webp" or "jpeg"
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_PROCESSES = int(os.getenv("THUMBNAIL_PROCESSES", "0"))  # 0 = one per CPU available to the container
+THUMBNAIL_PAGES_PER_TASK = int(os.getenv("THUMBNAIL_PAGES_PER_TASK", "8"))
+
+# OCR for images and PDF pages without a text layer
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", "0"))  # 0 = one per CPU available to the container
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))  # Resolution PDF pages are rendered at for OCR
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))  # Pages with less extractable text are OCRed
+
+# Metrics
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # Prometheus port of each worker process; 0 disables. The API serves /metrics instead
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO") 
\ No newline at end of file
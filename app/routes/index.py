@@ -1,15 +1,54 @@
-from fastapi import APIRouter, UploadFile, File
-from app.services.parser import parse_document
-from app.utils.storage import save_file
-from app.workers.tasks import start_parsing_task
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse
+from temporalio.service import RPCError, RPCStatusCode
+from app.services.registry import get_document_registry
+from app.utils.storage import save_upload
+from app.workers.tasks import submit_document, get_job_status
 
 router = APIRouter()
 
-@router.post("/upload/")
-async def upload_document(file: UploadFile = File(...)):
+@router.post("/upload/", status_code=202)
+async def upload_document(file: UploadFile = File(...), doc_id: Optional[str] = Form(None)):
+    """Store an upload and queue it for ingestion.
+    
+    Returns 202 with a job id as soon as the workflow is started; poll
+    /index/jobs/{job_id} for progress. Content that has already been
+    indexed returns 200 with its existing doc_id.
+    
+    Passing the doc_id of an indexed document re-indexes it with this file:
+    only new or changed chunks are embedded, and chunks that are gone are
+    deleted.
+    """
     try:
-        file_path = save_file(file)
-        await start_parsing_task(file_path)
-        return {"message": "File uploaded successfully", "file_path": file_path}
+        file_path, content_hash = await save_upload(file)
+        submission = await submit_document(
+            file_path,
+            content_hash,
+            registry=get_document_registry(),
+            original_name=file.filename,
+            doc_id=doc_id
+        )
+        return JSONResponse(
+            status_code=200 if submission["duplicate"] else 202,
+            content={
+                "message": "Document already indexed" if submission["duplicate"] else "File accepted for processing",
+                "file_path": file_path,
+                "content_hash": content_hash,
+                **submission
+            }
+        )
     except Exception as e:
-        return {"error": str(e)}, 500 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Report workflow status and per-stage progress for an ingestion job."""
+    try:
+        return await get_job_status(job_id)
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        raise HTTPException(status_code=503, detail=f"Could not reach Temporal: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Body
+import time
+from fastapi import APIRouter, Body, HTTPException
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from app.services.search import SearchService
+from app.config import SEARCH_BATCH_MAX_QUERIES
+from app.services.search import get_search_service
+from app.utils.metrics import SEARCH_DURATION
 
 router = APIRouter()
-search_service = SearchService()
 
 class SearchConfig(BaseModel):
     query: str = Field(..., description="Search query text")
@@ -33,14 +35,35 @@ class SearchConfig(BaseModel):
 
 @router.post("/")
 async def search(config: SearchConfig = Body(...)):
+    started = time.perf_counter()
     try:
-        results = search_service.hybrid_search(
+        results = await get_search_service().ahybrid_search(
             query=config.query,
             required_keywords=config.required_keywords,
             similarity_threshold=config.similarity_threshold,
             hybrid_alpha=config.hybrid_alpha,
             limit=config.limit
         )
+        SEARCH_DURATION.labels("search", "success").observe(time.perf_counter() - started)
         return {"results": results}
     except Exception as e:
-        return {"error": str(e)}, 500 
\ No newline at end of file
+        SEARCH_DURATION.labels("search", "error").observe(time.perf_counter() - started)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch")
+async def search_batch(configs: List[SearchConfig] = Body(...)):
+    """Run several searches with one embeddings request; results are in input order."""
+    if not 0 < len(configs) <= SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {SEARCH_BATCH_MAX_QUERIES} searches")
+    started = time.perf_counter()
+    try:
+        results = await get_search_service().ahybrid_search_batch([dict(config) for config in configs])
+        SEARCH_DURATION.labels("batch", "success").observe(time.perf_counter() - started)
+        return {"results": results}
+    except Exception as e:
+        SEARCH_DURATION.labels("batch", "error").observe(time.perf_counter() - started)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache-stats")
+async def cache_stats():
+    return {"query_cache": get_search_service().cache_stats()}
@@ -0,0 +1,22 @@
+from app.config import PINECONE_INDEX_NAME, VECTOR_STORE_BACKEND
+from app.services.vector_store import ensure_pinecone_index
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def bootstrap():
+    """Create the Pinecone index if it doesn't exist and wait until it is ready.
+
+    Workers and the API don't check the index at startup, so this runs once
+    per deployment before they start.
+    """
+    if VECTOR_STORE_BACKEND != "pinecone":
+        logger.info(f"Using {VECTOR_STORE_BACKEND} vector store, nothing to initialize")
+        return
+
+    host = ensure_pinecone_index()
+    # Setting this skips the host lookup every process would otherwise make
+    logger.info(f"Index {PINECONE_INDEX_NAME} is ready, set PINECONE_INDEX_HOST={host}")
+
+if __name__ == "__main__":
+    bootstrap()
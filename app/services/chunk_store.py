@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+from app.config import CHUNK_STORE_PATH
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ChunkStore:
+    """Compressed, on-disk store of chunk text keyed by vector id.
+
+    Keeps chunk text out of vector metadata so vector queries only carry ids
+    and filter fields. Text is zlib-compressed in SQLite and read back in one
+    batched lookup for the chunks a search actually returns.
+    """
+
+    def __init__(self, path: str, level: int = 6):
+        """
+        Args:
+            path (str): SQLite database file
+            level (int): zlib compression level
+        """
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                text BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id);
+            """
+        )
+        self._db.commit()
+
+    def put_many(self, chunks: Iterable[Tuple[str, str, str]]):
+        """
+        Store chunk text, replacing any previous text for the same chunk id.
+
+        Args:
+            chunks (Iterable[Tuple[str, str, str]]): (chunk_id, doc_id, text) triples
+        """
+        rows = [
+            (chunk_id, doc_id, zlib.compress(text.encode("utf-8"), self.level))
+            for chunk_id, doc_id, text in chunks
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO chunks (chunk_id, doc_id, text) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def get_many(self, chunk_ids: Sequence[str]) -> Dict[str, str]:
+        """
+        Look up chunk text.
+
+        Args:
+            chunk_ids (Sequence[str]): Chunk ids to read
+
+        Returns:
+            Dict[str, str]: Text by chunk id for the ids that were found
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(chunk_ids), 500):
+                part = chunk_ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._db.execute(
+                    f"SELECT chunk_id, text FROM chunks WHERE chunk_id IN ({placeholders})", part
+                ).fetchall()
+                for chunk_id, blob in rows:
+                    found[chunk_id] = zlib.decompress(blob).decode("utf-8")
+        return found
+
+    def chunk_ids(self, doc_id: str) -> List[str]:
+        """Ids of every stored chunk of doc_id."""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,))]
+
+    def delete(self, chunk_ids: Sequence[str]):
+        """Remove chunks; unknown ids are ignored."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+        with self._lock:
+            for i in range(0, len(chunk_ids), 500):
+                part = chunk_ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                self._db.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", part)
+            self._db.commit()
+
+
+_stores: Dict[str, ChunkStore] = {}
+_stores_lock = threading.Lock()
+
+def get_chunk_store() -> ChunkStore:
+    """Return the shared chunk store at CHUNK_STORE_PATH."""
+    with _stores_lock:
+        store = _stores.get(CHUNK_STORE_PATH)
+        if store is None:
+            store = ChunkStore(CHUNK_STORE_PATH)
+            _stores[CHUNK_STORE_PATH] = store
+            logger.info(f"Opened chunk store at {CHUNK_STORE_PATH}")
+        return store
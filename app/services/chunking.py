@@ -1,84 +1,249 @@
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
 import re
+from app.utils.tokenizer import Tokenizer
+
+# Sentence-ending punctuation followed by whitespace
+_SENTENCE_END = re.compile(r'[.!?](?=\s)')
+
+class StreamingChunker:
+    """
+    Incremental, single-pass text chunker.
+
+    Text is fed in pieces (e.g. one page at a time) and chunks are yielded as
+    soon as enough text has arrived to place their end. Each chunk is a
+    (start, end) character span into the stream of all text fed so far; the
+    text for a span can be read with text() until the generator that yielded
+    it is resumed. Text before the next chunk's start is discarded, so memory
+    stays bounded by roughly one chunk plus the piece being fed.
+
+    A chunk ends at the last sentence boundary in the second half of its
+    window, else at the last whitespace, else at exactly chunk_size. The next
+    chunk starts overlap characters before the end of the previous one,
+    moved forward to the next word start so no word is cut in half; if no
+    word starts in the overlap, it is cut mid-word so the overlap is kept.
+
+    With a tokenizer, chunk_size and overlap are measured in tokens instead
+    of characters.
+    """
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200, tokenizer: Optional[Tokenizer] = None):
+        """
+        Args:
+            chunk_size (int): Maximum size of each chunk in characters, or
+                tokens if tokenizer is given
+            overlap (int): Size shared by consecutive chunks, in the same unit
+            tokenizer (Optional[Tokenizer]): Measure sizes in this tokenizer's tokens
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.tokenizer = tokenizer
+        self._buffer = ""
+        self._base = 0   # Stream offset of self._buffer[0]
+        self._start = 0  # Stream offset where the next chunk may start
+
+    def feed(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Append text to the stream and return the spans of chunks it completes.
+
+        Args:
+            text (str): Next piece of the document
+
+        Returns:
+            Iterator[Tuple[int, int]]: (start, end) stream offsets of each
+                completed chunk; must be exhausted before the next feed
+        """
+        self._buffer += text
+        return self._drain(final=False)
+
+    def finish(self) -> Iterator[Tuple[int, int]]:
+        """Return the spans of the remaining chunks once all text has been fed."""
+        return self._drain(final=True)
+
+    def text(self, start: int, end: int) -> str:
+        """Return the text of a span yielded by feed() or finish()."""
+        if start < self._base:
+            raise ValueError("Span has already been discarded from the buffer")
+        return self._buffer[start - self._base:end - self._base]
+
+    def _drain(self, final: bool) -> Iterator[Tuple[int, int]]:
+        buffer_end = self._base + len(self._buffer)
+
+        while True:
+            start = self._skip_whitespace(self._start, buffer_end)
+            self._start = start
+            if start >= buffer_end:
+                break
+
+            limit = self._window_end(start, buffer_end)
+            if limit >= buffer_end:
+                # The chunk's end may depend on text that has not arrived yet
+                if not final:
+                    break
+                end = buffer_end
+            else:
+                end = self._find_end(start, limit)
+
+            chunk_end = end
+            while chunk_end > start and self._buffer[chunk_end - 1 - self._base].isspace():
+                chunk_end -= 1
+
+            yield start, chunk_end
+
+            if end >= buffer_end:
+                self._start = buffer_end
+                break
+            self._start = self._next_start(start, chunk_end)
+            self._discard()
+
+        self._discard()
+
+    def _skip_whitespace(self, position: int, buffer_end: int) -> int:
+        while position < buffer_end and self._buffer[position - self._base].isspace():
+            position += 1
+        return position
+
+    def _window_end(self, start: int, buffer_end: int) -> int:
+        """
+        End of the longest text starting at start that fits in chunk_size.
+
+        Returns buffer_end if all buffered text fits, in which case the end
+        cannot be placed until more text arrives or the stream is finished.
+        """
+        if self.tokenizer is None:
+            return min(start + self.chunk_size, buffer_end)
+
+        # Tokenize a window a little larger than chunk_size tokens should
+        # need, growing it only for unusually dense text
+        span = self.chunk_size * 6
+        while True:
+            window_end = min(start + span, buffer_end)
+            window = self._buffer[start - self._base:window_end - self._base]
+            fit = self.tokenizer.char_limit(window, self.chunk_size)
+            if fit < len(window) or window_end >= buffer_end:
+                return start + fit
+            span *= 2
+
+    def _find_end(self, start: int, limit: int) -> int:
+        """Choose where a chunk starting at start and bounded by limit ends."""
+        lo = start + (limit - start) // 2 - self._base
+        hi = limit - self._base
+
+        # Last sentence end in the window; the character at limit is visible
+        # so a sentence ending exactly at the limit is found
+        sentence_end = -1
+        for match in _SENTENCE_END.finditer(self._buffer, lo, hi + 1):
+            sentence_end = match.end()
+        if sentence_end > 0:
+            return sentence_end + self._base
+
+        # Any whitespace, as elsewhere in the chunker: tabs, \r and NBSP too
+        for position in range(hi, lo, -1):
+            if self._buffer[position].isspace():
+                return position + self._base
+
+        return limit
+
+    def _next_start(self, start: int, chunk_end: int) -> int:
+        """Start of the chunk after [start, chunk_end), overlapping it by up to overlap characters."""
+        if self.tokenizer is None:
+            next_start = chunk_end - self.overlap
+        else:
+            next_start = start + self.tokenizer.tail_start(self.text(start, chunk_end), self.overlap)
+        cut = max(start + 1, next_start)
+        # Move off a partial word
+        next_start = cut
+        while (next_start < chunk_end
+               and not self._buffer[next_start - 1 - self._base].isspace()
+               and not self._buffer[next_start - self._base].isspace()):
+            next_start += 1
+        # No word starts in the overlap: keep it by cutting mid-word
+        if next_start >= chunk_end:
+            return cut
+        return next_start
+
+    def _discard(self):
+        """Drop text before the next chunk start once it is at least half the buffer."""
+        dead = self._start - self._base
+        if dead > 0 and dead * 2 >= len(self._buffer):
+            self._buffer = self._buffer[dead:]
+            self._base = self._start
+
+def iter_chunks(texts: Iterable[str],
+                chunk_size: int = 1000,
+                overlap: int = 200,
+                separator: str = "\n\n",
+                tokenizer: Optional[Tokenizer] = None) -> Iterator[str]:
+    """
+    Chunk a sequence of texts (e.g. pages) as one document, lazily.
+
+    Args:
+        texts (Iterable[str]): Texts in document order
+        chunk_size (int): Maximum size of each chunk in characters, or tokens
+            if tokenizer is given
+        overlap (int): Size shared by consecutive chunks, in the same unit
+        separator (str): Inserted between consecutive texts
+        tokenizer (Optional[Tokenizer]): Measure sizes in this tokenizer's tokens
+
+    Yields:
+        str: Chunk text
+    """
+    chunker = StreamingChunker(chunk_size=chunk_size, overlap=overlap, tokenizer=tokenizer)
+    first = True
+    for text in texts:
+        if not first:
+            for start, end in chunker.feed(separator):
+                yield chunker.text(start, end)
+        first = False
+        for start, end in chunker.feed(text):
+            yield chunker.text(start, end)
+    for start, end in chunker.finish():
+        yield chunker.text(start, end)
+
+def iter_page_chunks(pages: Iterable[str],
+                     chunk_size: int,
+                     overlap: int,
+                     tokenizer: Optional[Tokenizer] = None,
+                     page_aligned: bool = True) -> Iterator[str]:
+    """
+    Chunk the pages of a document, lazily.
+
+    Both ingestion workflows chunk through this function, so a document
+    gets the same chunks, and chunk keys, whichever path indexes it.
+
+    Args:
+        pages (Iterable[str]): Page texts in document order
+        chunk_size (int): As for iter_chunks
+        overlap (int): As for iter_chunks
+        tokenizer (Optional[Tokenizer]): As for iter_chunks
+        page_aligned (bool): Restart chunking at every page instead of
+            letting chunks span pages
+
+    Yields:
+        str: Chunk text
+    """
+    options = {"chunk_size": chunk_size, "overlap": overlap, "separator": "\n\n", "tokenizer": tokenizer}
+    if not page_aligned:
+        yield from iter_chunks(pages, **options)
+        return
+    # Restarting the chunker on every page keeps an edit from shifting
+    # chunk boundaries, and so chunk keys, on the pages after it
+    for text in pages:
+        yield from iter_chunks([text], **options)
 
 def split_into_chunks(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     """
-    Split text into chunks using a simple sentence-based approach.
-    
+    Split text into chunks of at most chunk_size characters.
+
     Args:
         text (str): Text to split into chunks
         chunk_size (int): Target size of each chunk in characters
         overlap (int): Number of characters to overlap between chunks
-        
+
     Returns:
         List[str]: List of text chunks
     """
-    # Split text into sentences (simple approach)
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        sentence_size = len(sentence)
-        
-        # If this sentence alone is bigger than chunk_size, split it
-        if sentence_size > chunk_size:
-            # If we have a current chunk, add it to chunks
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_size = 0
-            
-            # Split long sentence into smaller pieces
-            words = sentence.split()
-            current_piece = []
-            current_piece_size = 0
-            
-            for word in words:
-                word_size = len(word) + 1  # +1 for space
-                if current_piece_size + word_size > chunk_size:
-                    if current_piece:
-                        chunks.append(" ".join(current_piece))
-                        # Keep some words for overlap
-                        overlap_words = current_piece[-3:]  # Keep last 3 words for context
-                        current_piece = overlap_words + [word]
-                        current_piece_size = sum(len(w) + 1 for w in current_piece)
-                    else:
-                        # If a single word is too long, just add it
-                        chunks.append(word)
-                        current_piece = []
-                        current_piece_size = 0
-                else:
-                    current_piece.append(word)
-                    current_piece_size += word_size
-            
-            if current_piece:
-                chunks.append(" ".join(current_piece))
-            continue
-        
-        # If adding this sentence would exceed chunk_size
-        if current_size + sentence_size + 1 > chunk_size:
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-                # Keep last sentence for overlap
-                current_chunk = current_chunk[-1:] + [sentence]
-                current_size = sum(len(s) + 1 for s in current_chunk)
-            else:
-                chunks.append(sentence)
-                current_chunk = []
-                current_size = 0
-        else:
-            current_chunk.append(sentence)
-            current_size += sentence_size + 1
-    
-    # Add any remaining chunk
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    
-    return chunks 
\ No newline at end of file
+    return list(iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
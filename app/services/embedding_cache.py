@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class EmbeddingCache:
+    """Content-addressed, on-disk cache of embedding vectors.
+
+    Entries are keyed on sha256(model, dimensions, text) and stored in SQLite
+    as float32 blobs. When the database grows past max_bytes the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            path (str): SQLite database file
+            max_bytes (int): Size of live data above which entries are evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                tokens INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        logger.info(f"Opened embedding cache at {path}")
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> bytes:
+        """Build the cache key for a text embedded with model/dimensions."""
+        digest = hashlib.sha256()
+        digest.update(f"{model}\x00{dimensions or 0}\x00".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def get_many(self, model: str, dimensions: Optional[int], texts: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            model (str): Embedding model name
+            dimensions (Optional[int]): Requested output dimensions, if any
+            texts (Sequence[str]): Texts to look up (should be unique)
+
+        Returns:
+            Dict[str, List[float]]: Cached vectors for the texts that were found
+        """
+        if not texts:
+            return {}
+
+        keys = {self.make_key(model, dimensions, text): text for text in texts}
+        found: Dict[str, List[float]] = {}
+        saved_tokens = 0
+
+        with self._lock:
+            key_list = list(keys)
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(key_list), 500):
+                part = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, tokens FROM embeddings WHERE key IN ({placeholders})",
+                    part
+                ).fetchall()
+                for key, blob, tokens in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    saved_tokens += tokens
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, self.make_key(model, dimensions, text)) for text in found]
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+            self.saved_tokens += saved_tokens
+
+        return found
+
+    def put_many(self, model: str, dimensions: Optional[int], items: Sequence[Tuple[str, List[float], int]]):
+        """
+        Store embeddings and evict old entries if the cache is over budget.
+
+        Args:
+            model (str): Embedding model name
+            dimensions (Optional[int]): Requested output dimensions, if any
+            items (Sequence[Tuple[str, List[float], int]]): (text, vector, token count) triples
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (
+                self.make_key(model, dimensions, text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                tokens,
+                now
+            )
+            for text, vector, tokens in items
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, tokens, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._evict_if_needed()
+
+    def _used_bytes(self) -> int:
+        """Bytes occupied by live pages of the database."""
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _evict_if_needed(self):
+        """Delete least recently used entries until usage is below 90% of max_bytes."""
+        used = self._used_bytes()
+        if used <= self.max_bytes:
+            return
+
+        total_rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if not total_rows:
+            return
+
+        # Rows are roughly equal in size, so evict proportionally
+        target = int(self.max_bytes * 0.9)
+        evict_rows = max(1, int(total_rows * (used - target) / used))
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (evict_rows,)
+        )
+        self._conn.commit()
+        logger.info(f"Evicted {evict_rows} entries from embedding cache ({used} bytes > {self.max_bytes})")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and estimated tokens saved."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_tokens": self.saved_tokens
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,62 +1,343 @@
-from typing import List
-import numpy as np
-from openai import OpenAI
-from app.config import OPENAI_API_KEY
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_REQUEST_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_CONNECTIONS,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_LATENCY_TARGET_SECONDS,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_MB,
+)
+from app.services.embedding_cache import EmbeddingCache
+from app.services.rate_limiter import (
+    AdaptiveConcurrency,
+    RateLimiter,
+    PRIORITY_BULK,
+    PRIORITY_QUERY,
+    get_rate_limiter
+)
 from app.utils.logger import get_logger
+from app.utils.metrics import TOKENS, track_request
+from app.utils.tokenizer import Tokenizer, get_tokenizer
 
 logger = get_logger()
 
+# Errors worth retrying in place rather than failing the whole activity
+_TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError)
+
+def _retry_after(error: RateLimitError, attempt: int) -> float:
+    """Seconds to back off after a 429, from the response headers if present."""
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(30.0, 2 ** attempt)
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+
 class EmbeddingService:
-    def __init__(self, model: str = "text-embedding-3-small"):
+    def __init__(self,
+                 model: str = OPENAI_EMBEDDING_MODEL,
+                 batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_request_tokens: int = EMBEDDING_MAX_REQUEST_TOKENS,
+                 max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+                 dimensions: Optional[int] = None,
+                 cache: Optional[EmbeddingCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """Initialize the OpenAI embedding service.
         
         Args:
-            model (str): OpenAI embedding model to use
+            model (str): OpenAI embedding model to use (default OPENAI_EMBEDDING_MODEL,
+                the model chunking sizes text for)
                 Options: text-embedding-3-small (1536 dimensions)
                         text-embedding-3-large (3072 dimensions)
                         text-embedding-ada-002 (1536 dimensions, legacy)
+            batch_size (int): Maximum number of texts sent per embeddings request
+            max_request_tokens (int): Maximum total tokens sent per embeddings
+                request; requests are packed up to both limits
+            max_concurrency (int): Maximum embeddings requests in flight at once
+                on the async path; the actual limit adapts below this to
+                rate-limit responses and latency
+            dimensions (Optional[int]): Output dimensions for models that support
+                shortening (text-embedding-3-*); model default if None
+            cache (Optional[EmbeddingCache]): Embedding cache; defaults to the
+                on-disk cache at EMBEDDING_CACHE_PATH when EMBEDDING_CACHE_ENABLED
+            rate_limiter (Optional[RateLimiter]): Quota shared with other
+                processes; defaults to the process-wide limiter
         """
+        # Retries are handled here so that 429s feed the rate limiter and
+        # concurrency control instead of being retried blindly by the client
         self.client = OpenAI(
             api_key=OPENAI_API_KEY,
-            base_url="https://api.openai.com/v1"  # Explicitly set the base URL
+            base_url=OPENAI_BASE_URL,  # Explicitly set the base URL
+            max_retries=0
+        )
+        # Shared keep-alive connection pool for the async path, sized so every
+        # in-flight request gets its own connection
+        self.async_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max(EMBEDDING_MAX_CONNECTIONS, max_concurrency),
+                    max_keepalive_connections=max(EMBEDDING_MAX_CONNECTIONS, max_concurrency)
+                ),
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
         )
         self.model = model
+        self.dimensions = dimensions
+        if cache is None and EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_request_tokens = max_request_tokens
+        self._tokenizer: Optional[Tokenizer] = None
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.concurrency = AdaptiveConcurrency(max_concurrency, latency_target=EMBEDDING_LATENCY_TARGET_SECONDS)
         logger.info(f"Initialized OpenAI embedding service with model: {model}")
     
-    def generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for a list of texts using OpenAI's API.
         
+        Duplicate texts are embedded once and cached texts are not sent to
+        the API at all.
+        
         Args:
             texts (List[str]): List of text chunks to embed
             
         Returns:
-            List[np.ndarray]: List of embedding vectors
+            List[List[float]]: List of embedding vectors
         """
         try:
-            # OpenAI has a rate limit, so we'll process in batches
-            batch_size = 100
-            all_embeddings = []
+            vectors, misses = self._lookup(texts)
             
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=batch,
-                    encoding_format="float"
-                )
-                # Extract embeddings from response
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
+            for batch_num, (batch, batch_tokens) in enumerate(self._pack(misses), 1):
+                response = self._create(batch, batch_tokens, PRIORITY_BULK)
+                self._store(batch, *self._parse_response(response), vectors)
                 
-                logger.info(f"Generated embeddings for batch {i//batch_size + 1}")
+                logger.info(f"Generated embeddings for batch {batch_num}")
             
-            return all_embeddings
+            return [vectors[text] for text in texts]
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
     
+    async def agenerate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings without blocking the event loop.
+        
+        Batches are sent concurrently over the shared connection pool, with at
+        most max_concurrency requests in flight across all callers of this
+        service instance. Duplicate and cached texts are handled as in
+        generate_embeddings.
+        
+        Args:
+            texts (List[str]): List of text chunks to embed
+            
+        Returns:
+            List[List[float]]: Embedding vectors in the same order as texts
+        """
+        try:
+            # The embedding cache is SQLite, so its reads and writes run in a thread
+            vectors, misses = await asyncio.to_thread(self._lookup, texts)
+            batches = self._pack(misses)
+            results = await asyncio.gather(*(
+                self._aembed_batch(batch, batch_tokens, batch_num)
+                for batch_num, (batch, batch_tokens) in enumerate(batches, 1)
+            ))
+            
+            def store():
+                for (batch, _), (batch_embeddings, tokens) in zip(batches, results):
+                    self._store(batch, batch_embeddings, tokens, vectors)
+            await asyncio.to_thread(store)
+            return [vectors[text] for text in texts]
+            
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}")
+            raise
+    
+    async def _aembed_batch(self, batch: List[str], tokens: int, batch_num: int) -> Tuple[List[List[float]], int]:
+        """Send one bulk embeddings request."""
+        response = await self._acreate(batch, tokens, PRIORITY_BULK)
+        logger.info(f"Generated embeddings for batch {batch_num}")
+        return self._parse_response(response)
+    
+    def _create(self, batch: List[str], tokens: int, priority: str):
+        """Send an embeddings request within the shared quota, retrying 429s and transient errors."""
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            self.rate_limiter.acquire(tokens, priority)
+            try:
+                with track_request("openai", "embeddings"):
+                    response = self.client.embeddings.create(model=self.model, input=batch, **self._request_options())
+                self._count_tokens(response, priority)
+                return response
+            except RateLimitError as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = _retry_after(e, attempt)
+                logger.warning(f"Embeddings rate limited, pausing {delay:.1f}s")
+                self.rate_limiter.pause(delay)
+            except _TRANSIENT_ERRORS as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embeddings request failed ({str(e)}), retrying")
+                time.sleep(_backoff(attempt))
+    
+    async def _acreate(self, batch: List[str], tokens: int, priority: str):
+        """
+        Async version of _create.
+        
+        Bulk requests also hold an adaptive concurrency slot; query requests
+        skip it so they never queue behind ingestion.
+        """
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            await self.rate_limiter.aacquire(tokens, priority)
+            try:
+                if priority == PRIORITY_QUERY:
+                    with track_request("openai", "embeddings"):
+                        response = await self.async_client.embeddings.create(
+                            model=self.model, input=batch, **self._request_options()
+                        )
+                    self._count_tokens(response, priority)
+                    return response
+                async with self.concurrency.slot():
+                    started = time.monotonic()
+                    with track_request("openai", "embeddings"):
+                        response = await self.async_client.embeddings.create(
+                            model=self.model, input=batch, **self._request_options()
+                        )
+                    self.concurrency.on_success(time.monotonic() - started)
+                    self._count_tokens(response, priority)
+                    return response
+            except RateLimitError as e:
+                self.concurrency.on_throttle()
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = _retry_after(e, attempt)
+                logger.warning(f"Embeddings rate limited, pausing {delay:.1f}s")
+                await self.rate_limiter.apause(delay)
+            except _TRANSIENT_ERRORS as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                logger.warning(f"Embeddings request failed ({str(e)}), retrying")
+                await asyncio.sleep(_backoff(attempt))
+    
+    @property
+    def tokenizer(self) -> Tokenizer:
+        # Loaded on first use so query-only callers never load an encoding
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer(self.model)
+        return self._tokenizer
+    
+    def _pack(self, texts: List[str]) -> List[Tuple[List[str], int]]:
+        """
+        Group texts into requests of at most batch_size texts and
+        max_request_tokens tokens.
+        
+        Texts are taken in order and each request is filled until the next
+        text would exceed either limit. A single text larger than the token
+        budget is sent on its own.
+        
+        Returns:
+            List[Tuple[List[str], int]]: Texts of each request and their token count
+        """
+        if not texts:
+            return []
+        # Estimated counts can undershoot for dense text, so leave headroom
+        max_tokens = self.max_request_tokens if self.tokenizer.exact else self.max_request_tokens // 2
+        batches: List[Tuple[List[str], int]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text, tokens in zip(texts, self.tokenizer.count_many(texts)):
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > max_tokens):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        if len(batches) > 1:
+            logger.info(f"Packed {len(texts)} texts into {len(batches)} embeddings requests")
+        return batches
+    
+    def _request_options(self) -> Dict[str, object]:
+        options = {"encoding_format": "float"}
+        if self.dimensions:
+            options["dimensions"] = self.dimensions
+        return options
+    
+    def _count_tokens(self, response, priority: str):
+        if response.usage:
+            TOKENS.labels(self.model, priority).inc(response.usage.total_tokens)
+    
+    @staticmethod
+    def _parse_response(response) -> Tuple[List[List[float]], int]:
+        """Return (embeddings in input order, total tokens billed)."""
+        # The API does not guarantee response order, so sort by input index
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        tokens = response.usage.total_tokens if response.usage else 0
+        return embeddings, tokens
+    
+    def _lookup(self, texts: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+        """
+        Deduplicate texts and resolve what we can from the cache.
+        
+        Returns:
+            Tuple[Dict[str, List[float]], List[str]]: Vectors found so far keyed
+                by text, and the unique texts that still need embedding
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        vectors = self.cache.get_many(self.model, self.dimensions, unique_texts) if self.cache else {}
+        misses = [text for text in unique_texts if text not in vectors]
+        if len(misses) < len(texts):
+            logger.info(
+                f"Embedding {len(misses)} of {len(texts)} texts "
+                f"({len(texts) - len(unique_texts)} duplicates, {len(vectors)} cached)"
+            )
+        return vectors, misses
+    
+    def _store(self, batch: List[str], embeddings: List[List[float]], tokens: int, vectors: Dict[str, List[float]]):
+        """Record freshly generated embeddings in the result map and the cache."""
+        vectors.update(zip(batch, embeddings))
+        if self.cache:
+            # Usage is reported per request, so apportion it by text length
+            total_chars = sum(len(text) for text in batch) or 1
+            self.cache.put_many(self.model, self.dimensions, [
+                (text, embedding, round(tokens * len(text) / total_chars))
+                for text, embedding in zip(batch, embeddings)
+            ])
+    
+    def cache_stats(self) -> Dict[str, float]:
+        """Return embedding cache hit/miss counters, or an empty dict if caching is off."""
+        return self.cache.stats() if self.cache else {}
+    
+    @staticmethod
+    def _estimate_query_tokens(query: str) -> int:
+        # Queries are short; an estimate avoids loading the tokenizer in the API
+        return max(1, math.ceil(len(query) / 4))
+    
     def generate_query_embedding(self, query: str) -> List[float]:
         """
         Generate embedding for a search query.
@@ -68,13 +349,59 @@ class EmbeddingService:
             List[float]: Query embedding vector
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=[query],
-                encoding_format="float"
-            )
+            response = self._create([query], self._estimate_query_tokens(query), PRIORITY_QUERY)
+            return response.data[0].embedding
+            
+        except Exception as e:
+            logger.error(f"Error generating query embedding: {str(e)}")
+            raise
+    
+    async def agenerate_query_embedding(self, query: str) -> List[float]:
+        """
+        Generate embedding for a search query without blocking the event loop.
+        
+        Args:
+            query (str): Search query text
+            
+        Returns:
+            List[float]: Query embedding vector
+        """
+        try:
+            response = await self._acreate([query], self._estimate_query_tokens(query), PRIORITY_QUERY)
             return response.data[0].embedding
             
         except Exception as e:
             logger.error(f"Error generating query embedding: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def agenerate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several search queries in a single request.
+        
+        Args:
+            queries (List[str]): Search query texts
+            
+        Returns:
+            List[List[float]]: Query embeddings in the same order as queries
+        """
+        if not queries:
+            return []
+        try:
+            tokens = sum(self._estimate_query_tokens(query) for query in queries)
+            response = await self._acreate(list(queries), tokens, PRIORITY_QUERY)
+            return self._parse_response(response)[0]
+            
+        except Exception as e:
+            logger.error(f"Error generating query embeddings: {str(e)}")
+            raise
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide embedding service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
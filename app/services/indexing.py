@@ -1,92 +1,141 @@
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import json
+import random
+import sqlite3
+import threading
 import time
-from pinecone import Pinecone, ServerlessSpec
+import urllib3
 from app.config import (
-    PINECONE_API_KEY,
-    PINECONE_ENVIRONMENT,
-    PINECONE_INDEX_NAME,
-    PINECONE_CLOUD
+    UPSERT_BATCH_SIZE,
+    UPSERT_MAX_BATCH_BYTES,
+    UPSERT_MAX_IN_FLIGHT,
+    UPSERT_MAX_RETRIES
 )
+from app.services.chunk_store import ChunkStore, get_chunk_store
+from app.services.keyword_index import BM25Index, get_keyword_index
+from app.services.manifest import ChunkManifest, get_chunk_manifest
+from app.services.vector_store import VectorStore, get_vector_store
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Upper bound on the JSON size of one float in an upsert request, e.g.
+# "-0.012345678901234567, "
+_VALUE_BYTES = 24
+# Fixed JSON overhead per vector: keys, braces and quotes
+_VECTOR_OVERHEAD_BYTES = 64
+
+def _vector_bytes(vector: Dict[str, Any]) -> int:
+    """Estimated serialized size of one vector in an upsert request."""
+    return (
+        _VECTOR_OVERHEAD_BYTES
+        + len(vector["id"])
+        + len(vector["values"]) * _VALUE_BYTES
+        + len(json.dumps(vector["metadata"]))
+    )
+
+def _is_transient(error: Exception) -> bool:
+    """True for throttling, server and connection errors worth retrying."""
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(error, sqlite3.OperationalError):
+        # Local store: another writer holds the database lock
+        return "locked" in str(error)
+    return isinstance(error, (OSError, urllib3.exceptions.HTTPError))
+
 class IndexingService:
-    def __init__(self):
+    def __init__(self,
+                 store: Optional[VectorStore] = None,
+                 keyword_index: Optional[BM25Index] = None,
+                 chunk_store: Optional[ChunkStore] = None,
+                 manifest: Optional[ChunkManifest] = None,
+                 batch_size: int = UPSERT_BATCH_SIZE,
+                 max_batch_bytes: int = UPSERT_MAX_BATCH_BYTES,
+                 max_in_flight: int = UPSERT_MAX_IN_FLIGHT):
+        """
+        Args:
+            store (Optional[VectorStore]): Vector store to write to; defaults to the
+                backend selected by VECTOR_STORE_BACKEND
+            keyword_index (Optional[BM25Index]): Keyword index to write to;
+                defaults to the shared index unless KEYWORD_INDEX_ENABLED is off
+            chunk_store (Optional[ChunkStore]): Where chunk text is stored;
+                defaults to the shared store at CHUNK_STORE_PATH
+            manifest (Optional[ChunkManifest]): Record of indexed chunk keys;
+                defaults to the shared manifest at CHUNK_MANIFEST_PATH
+            batch_size (int): Maximum vectors per upsert request
+            max_batch_bytes (int): Maximum estimated size of an upsert request
+            max_in_flight (int): Upsert requests sent concurrently
+        """
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        # Shared by every document this service indexes, so concurrent
+        # upserts reuse the store client's keep-alive connections
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="upsert")
         try:
-            # Initialize Pinecone
-            self.pc = Pinecone(api_key=PINECONE_API_KEY)
-            self._ensure_index_exists()
+            self.store = store or get_vector_store()
+            self.keyword_index = keyword_index or get_keyword_index()
+            self.chunk_store = chunk_store or get_chunk_store()
+            self.manifest = manifest or get_chunk_manifest()
         except Exception as e:
-            logger.error(f"Failed to initialize Pinecone: {str(e)}")
-            raise
-    
-    def _ensure_index_exists(self):
-        """Ensure the Pinecone index exists and is ready"""
-        try:
-            # Check if index exists
-            existing_indexes = self.pc.list_indexes()
-            logger.info(f"Found existing indexes: {existing_indexes.names()}")
-            
-            if PINECONE_INDEX_NAME not in existing_indexes.names():
-                logger.info(f"Creating index {PINECONE_INDEX_NAME} in {PINECONE_CLOUD}/{PINECONE_ENVIRONMENT}")
-                
-                # Create serverless spec
-                spec = ServerlessSpec(
-                    cloud=PINECONE_CLOUD,
-                    region=PINECONE_ENVIRONMENT
-                )
-                
-                # Create the index
-                self.pc.create_index(
-                    name=PINECONE_INDEX_NAME,
-                    dimension=384,  # BGE-small dimension
-                    metric='cosine',
-                    spec=spec
-                )
-                
-                # Wait for index to be ready
-                max_wait = 60  # Maximum wait time in seconds
-                start_time = time.time()
-                
-                while time.time() - start_time < max_wait:
-                    try:
-                        desc = self.pc.describe_index(PINECONE_INDEX_NAME)
-                        status = desc.status
-                        
-                        if status and status.get('ready'):
-                            logger.info(f"Index {PINECONE_INDEX_NAME} is ready")
-                            break
-                            
-                        logger.info(f"Waiting for index to be ready. Status: {status}")
-                    except Exception as e:
-                        logger.warning(f"Error checking index status: {str(e)}")
-                    
-                    time.sleep(5)
-                else:
-                    raise TimeoutError(f"Index did not become ready within {max_wait} seconds")
-            
-            # Initialize index connection
-            self.index = self.pc.Index(PINECONE_INDEX_NAME)
-            logger.info(f"Successfully connected to index {PINECONE_INDEX_NAME}")
-            
-        except Exception as e:
-            logger.error(f"Error ensuring index exists: {str(e)}")
+            logger.error(f"Failed to initialize vector store: {str(e)}")
             raise
+
+    def _batches(self, vectors: List[Dict[str, Any]]) -> Iterator[Tuple[List[Dict[str, Any]], int]]:
+        """Split vectors into upsert requests bounded by batch_size and max_batch_bytes.
+
+        Yields:
+            Tuple[List[Dict[str, Any]], int]: Batch and its estimated size in bytes
+        """
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for vector in vectors:
+            size = _vector_bytes(vector)
+            if batch and (len(batch) >= self.batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch, batch_bytes
+                batch, batch_bytes = [], 0
+            if size > self.max_batch_bytes:
+                # Sent alone; the store reports it if it really is too large
+                logger.warning(f"Vector {vector['id']} is ~{size} bytes, over the {self.max_batch_bytes} byte batch limit")
+            batch.append(vector)
+            batch_bytes += size
+        if batch:
+            yield batch, batch_bytes
+
+    def _upsert_batch(self, batch: List[Dict[str, Any]], label: str):
+        """Upsert one batch, retrying it alone on transient errors."""
+        for attempt in range(UPSERT_MAX_RETRIES + 1):
+            try:
+                self.store.upsert(batch)
+                return
+            except Exception as e:
+                if attempt == UPSERT_MAX_RETRIES or not _is_transient(e):
+                    raise
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Upsert of {label} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
     
     def index_document(self, 
                       doc_id: str, 
                       chunks: List[str], 
                       embeddings: List[List[float]], 
-                      metadata: Dict[str, Any]):
+                      metadata: Dict[str, Any],
+                      start_index: int = 0,
+                      chunk_keys: Optional[List[str]] = None):
         """
-        Index document chunks in Pinecone
+        Index document chunks in the vector store
         
         Args:
             doc_id (str): Unique document identifier
             chunks (List[str]): List of text chunks
             embeddings (List[List[float]]): List of embedding vectors
             metadata (Dict[str, Any]): Document metadata
+            start_index (int): Position of chunks[0] in the document, so that
+                batches indexed separately get distinct vector ids
+            chunk_keys (Optional[List[str]]): Content keys of the chunks (see
+                app.services.manifest). When given they replace positions in
+                vector ids and are added to the document's manifest.
         """
         try:
             if not chunks or not embeddings:
@@ -95,35 +144,104 @@ class IndexingService:
             if len(chunks) != len(embeddings):
                 raise ValueError(f"Number of chunks ({len(chunks)}) does not match number of embeddings ({len(embeddings)})")
             
+            if chunk_keys is not None and len(chunk_keys) != len(chunks):
+                raise ValueError(f"Number of chunk keys ({len(chunk_keys)}) does not match number of chunks ({len(chunks)})")
+            
+            chunk_ids = chunk_keys or range(start_index, start_index + len(chunks))
             vectors = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                vector_id = f"{doc_id}_{i}"
+            for chunk_id, embedding in zip(chunk_ids, embeddings):
+                vector_id = f"{doc_id}_{chunk_id}"
                 vectors.append({
                     "id": vector_id,
                     "values": embedding,
+                    # Text goes to the chunk store; metadata keeps only
+                    # filter fields so queries stay small
                     "metadata": {
-                        "text": chunk,
                         "doc_id": doc_id,
-                        "chunk_id": i,
+                        "chunk_id": chunk_id,
                         **metadata
                     }
                 })
             
-            # Upsert vectors in batches of 100
-            batch_size = 100
-            total_batches = (len(vectors) + batch_size - 1) // batch_size
+            # Written first so a vector is never searchable without its text
+            self.chunk_store.put_many(
+                (vector["id"], doc_id, chunk) for vector, chunk in zip(vectors, chunks)
+            )
             
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                try:
-                    self.index.upsert(vectors=batch)
-                    logger.info(f"Indexed batch {i//batch_size + 1}/{total_batches} for document {doc_id}")
-                except Exception as e:
-                    logger.error(f"Error indexing batch {i//batch_size + 1}/{total_batches} for document {doc_id}: {str(e)}")
-                    raise
+            # Batches go out concurrently; a failed batch is retried on its own
+            # and only a batch that exhausts its retries fails the document
+            started = time.perf_counter()
+            batches = list(self._batches(vectors))
+            total_bytes = sum(batch_bytes for _, batch_bytes in batches)
+            futures = [
+                self.executor.submit(self._upsert_batch, batch, f"batch {n}/{len(batches)} of document {doc_id}")
+                for n, (batch, _) in enumerate(batches, 1)
+            ]
+            try:
+                for n, future in enumerate(futures, 1):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Error indexing batch {n}/{len(batches)} for document {doc_id}: {str(e)}")
+                        raise
+            finally:
+                for future in futures:
+                    future.cancel()
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            logger.info(
+                f"Upserted {len(vectors)} vectors for document {doc_id} in {len(batches)} batches, "
+                f"{elapsed:.2f}s ({len(vectors) / elapsed:.0f} vectors/s, {total_bytes / elapsed / 1e6:.1f} MB/s)"
+            )
+            
+            # Keep the sparse index in step with the vectors for hybrid search
+            if self.keyword_index is not None:
+                self.keyword_index.add_documents(
+                    (vector["id"], chunk) for vector, chunk in zip(vectors, chunks)
+                )
+            
+            # Only now are these chunks fully indexed
+            if chunk_keys is not None:
+                self.manifest.add(doc_id, chunk_keys)
             
             logger.info(f"Successfully indexed document {doc_id} with {len(vectors)} vectors")
             
         except Exception as e:
             logger.error(f"Error indexing document {doc_id}: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+    
+    def delete_chunks(self, doc_id: str, chunk_keys: List[str]):
+        """
+        Remove chunks of a document from every index.
+        
+        The manifest is updated last, so chunks whose deletion fails are
+        still listed and deleted by the next re-index.
+        
+        Args:
+            doc_id (str): Document the chunks belong to
+            chunk_keys (List[str]): Content keys of the chunks to remove
+        """
+        if not chunk_keys:
+            return
+        try:
+            vector_ids = [f"{doc_id}_{chunk_key}" for chunk_key in chunk_keys]
+            for i in range(0, len(vector_ids), 1000):
+                self.store.delete(vector_ids[i:i + 1000])
+            if self.keyword_index is not None:
+                self.keyword_index.delete(vector_ids)
+            self.chunk_store.delete(vector_ids)
+            self.manifest.remove(doc_id, chunk_keys)
+            logger.info(f"Deleted {len(vector_ids)} stale chunks of document {doc_id}")
+        except Exception as e:
+            logger.error(f"Error deleting chunks of document {doc_id}: {str(e)}")
+            raise
+
+_service: Optional[IndexingService] = None
+_service_lock = threading.Lock()
+
+def get_indexing_service() -> IndexingService:
+    """Return the process-wide indexing service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = IndexingService()
+        return _service
@@ -0,0 +1,351 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.config import KEYWORD_INDEX_ENABLED, KEYWORD_INDEX_PATH, KEYWORD_INDEX_MAX_SEGMENTS
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Very common English words carry no ranking signal and have the longest postings
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or
+such that the their then there these they this to was were will with
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into alphanumeric terms, dropping stopwords."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """Sparse keyword index scored with Okapi BM25.
+
+    Posting lists are stored in SQLite as packed arrays: uint32 document rows
+    and uint16 term frequencies. Each add_documents call appends one segment
+    per term rather than rewriting existing postings; a term's segments are
+    merged once it has max_segments of them, and compact() merges all terms
+    and drops deleted documents.
+
+    Document lengths and tombstones are cached in memory. Every write stamps
+    the docs rows it touches with a new version, so after another connection
+    commits only the rows changed since the last seen version are read.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_segments: int = KEYWORD_INDEX_MAX_SEGMENTS):
+        """
+        Args:
+            path (str): SQLite database file
+            k1 (float): BM25 term-frequency saturation
+            b (float): BM25 length normalization
+            max_segments (int): Posting segments a term may have before they
+                are merged
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max(2, max_segments)
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                row INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_chunk_id ON docs (chunk_id);
+            CREATE INDEX IF NOT EXISTS docs_version ON docs (version);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                rows BLOB NOT NULL,
+                tfs BLOB NOT NULL,
+                PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('next_row', 0), ('next_segment', 0)"
+        )
+        self._db.commit()
+
+        self._count = 0
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._chunk_ids: List[Optional[str]] = []
+        self._rows_by_chunk: Dict[str, int] = {}
+        self._total_length = 0.0
+        self._version = -1
+        self._data_version = None
+        self._catch_up()
+
+    @property
+    def _avg_length(self) -> float:
+        live = len(self._rows_by_chunk)
+        return self._total_length / live if live else 0.0
+
+    def _catch_up(self):
+        """Apply docs rows written since the last version this process has seen."""
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._db.execute(
+            "SELECT row, chunk_id, length, deleted, version FROM docs WHERE version > ? ORDER BY version, row",
+            (self._version,)
+        ).fetchall()
+        if not changed:
+            return
+
+        count = max(self._count, max(row for row, *_ in changed) + 1)
+        if count > len(self._lengths):
+            capacity = max(count, 2 * len(self._lengths))
+            self._lengths = np.resize(self._lengths, capacity)
+            self._alive = np.resize(self._alive, capacity)
+            self._lengths[self._count:] = 0
+            self._alive[self._count:] = False
+        self._chunk_ids.extend([None] * (count - len(self._chunk_ids)))
+        self._count = count
+
+        for row, chunk_id, length, deleted, version in changed:
+            if self._alive[row]:
+                self._alive[row] = False
+                self._total_length -= float(self._lengths[row])
+                if self._rows_by_chunk.get(self._chunk_ids[row]) == row:
+                    del self._rows_by_chunk[self._chunk_ids[row]]
+            self._lengths[row] = length
+            self._chunk_ids[row] = chunk_id
+            if not deleted:
+                self._alive[row] = True
+                self._total_length += length
+                self._rows_by_chunk[chunk_id] = row
+            self._version = max(self._version, version)
+
+    def _refresh(self):
+        if self._db.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._catch_up()
+
+    @staticmethod
+    def _next(cursor: sqlite3.Cursor, key: str, step: int = 1) -> int:
+        """Reserve step values of the meta counter key and return the first."""
+        value = cursor.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+        cursor.execute("UPDATE meta SET value = ? WHERE key = ?", (value + step, key))
+        return value
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]):
+        """
+        Index (chunk_id, text) pairs. Re-adding a chunk_id replaces its previous text.
+
+        Args:
+            documents (Iterable[Tuple[str, str]]): Chunk ids and their text
+        """
+        # The last text given for a chunk id wins
+        documents = list(dict(documents).items())
+        if not documents:
+            return
+
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._next(cursor, "version") + 1
+                self._mark_deleted(cursor, [chunk_id for chunk_id, _ in documents], version)
+                next_row = self._next(cursor, "next_row", len(documents))
+                segment = self._next(cursor, "next_segment")
+
+                term_rows: Dict[str, List[int]] = defaultdict(list)
+                term_tfs: Dict[str, List[int]] = defaultdict(list)
+                doc_rows = []
+                for row, (chunk_id, text) in enumerate(documents, next_row):
+                    terms = tokenize(text)
+                    doc_rows.append((row, chunk_id, len(terms), version))
+                    for term, tf in Counter(terms).items():
+                        term_rows[term].append(row)
+                        term_tfs[term].append(min(tf, 65535))
+
+                cursor.executemany("INSERT INTO docs (row, chunk_id, length, version) VALUES (?, ?, ?, ?)", doc_rows)
+                cursor.executemany(
+                    "INSERT INTO postings (term, segment, rows, tfs) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            term,
+                            segment,
+                            np.asarray(rows, dtype=np.uint32).tobytes(),
+                            np.asarray(term_tfs[term], dtype=np.uint16).tobytes()
+                        )
+                        for term, rows in term_rows.items()
+                    ]
+                )
+                self._catch_up()
+                self._merge_segments(cursor, self._fragmented(cursor, list(term_rows)))
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                # Our in-memory state may include the rolled back rows
+                self._reload()
+                raise
+
+    def delete(self, chunk_ids: Sequence[str]):
+        """Remove chunks from the index; their postings are skipped until they are merged."""
+        if not chunk_ids:
+            return
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._mark_deleted(cursor, chunk_ids, self._next(cursor, "version") + 1)
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            self._catch_up()
+
+    @staticmethod
+    def _mark_deleted(cursor: sqlite3.Cursor, chunk_ids: Sequence[str], version: int):
+        chunk_ids = list(chunk_ids)
+        for i in range(0, len(chunk_ids), 500):
+            part = chunk_ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            cursor.execute(
+                f"UPDATE docs SET deleted = 1, version = ? WHERE deleted = 0 AND chunk_id IN ({placeholders})",
+                [version, *part]
+            )
+
+    def _reload(self):
+        """Rebuild the in-memory state from scratch."""
+        self._count = 0
+        self._lengths[:] = 0
+        self._alive[:] = False
+        self._chunk_ids = []
+        self._rows_by_chunk = {}
+        self._total_length = 0.0
+        self._version = -1
+        self._catch_up()
+
+    def _fragmented(self, cursor: sqlite3.Cursor, terms: List[str]) -> List[str]:
+        """Those of terms that have reached max_segments posting segments."""
+        fragmented = []
+        for i in range(0, len(terms), 500):
+            part = terms[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            fragmented.extend(
+                term for (term,) in cursor.execute(
+                    f"SELECT term FROM postings WHERE term IN ({placeholders}) GROUP BY term HAVING COUNT(*) >= ?",
+                    [*part, self.max_segments]
+                )
+            )
+        return fragmented
+
+    def _merge_segments(self, cursor: sqlite3.Cursor, terms: List[str]):
+        """Replace the posting segments of each term with one segment of its live postings."""
+        if not terms:
+            return
+        segment = self._next(cursor, "next_segment")
+        merged = []
+        for term in terms:
+            rows, tfs = self._postings(term)
+            cursor.execute("DELETE FROM postings WHERE term = ?", (term,))
+            if len(rows):
+                merged.append((term, segment, rows.astype(np.uint32).tobytes(), tfs.astype(np.uint16).tobytes()))
+        cursor.executemany("INSERT INTO postings (term, segment, rows, tfs) VALUES (?, ?, ?, ?)", merged)
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        segments = self._db.execute(
+            "SELECT rows, tfs FROM postings WHERE term = ? ORDER BY segment", (term,)
+        ).fetchall()
+        if not segments:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+        rows = np.concatenate([np.frombuffer(blob, dtype=np.uint32) for blob, _ in segments])
+        tfs = np.concatenate([np.frombuffer(blob, dtype=np.uint16) for _, blob in segments])
+        # Skip tombstoned documents, and rows committed by another process
+        # since our last refresh
+        live = rows < self._count
+        live[live] = self._alive[rows[live]]
+        return rows[live], tfs[live]
+
+    def search(self, query: str, top_k: int, include_ids: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """
+        Score chunks against query with BM25.
+
+        Args:
+            query (str): Query text
+            top_k (int): Number of best-scoring chunks to return
+            include_ids (Optional[Sequence[str]]): Chunk ids whose scores are
+                returned even if they are outside the top_k
+
+        Returns:
+            Dict[str, float]: BM25 score by chunk id (only chunks that match
+                at least one query term)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            self._refresh()
+            n_docs = len(self._rows_by_chunk)
+            if not terms or not n_docs:
+                return {}
+
+            lengths = self._lengths[:self._count]
+            scores = np.zeros(self._count, dtype=np.float32)
+            length_norm = self.k1 * (1 - self.b + self.b * lengths / max(self._avg_length, 1e-9))
+            for term in terms:
+                rows, tfs = self._postings(term)
+                if not len(rows):
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                tfs = tfs.astype(np.float32)
+                np.add.at(scores, rows, idf * tfs * (self.k1 + 1) / (tfs + length_norm[rows]))
+
+            matched = np.flatnonzero(scores > 0)
+            if len(matched) > top_k:
+                matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+
+            results = {self._chunk_ids[row]: float(scores[row]) for row in matched}
+            for chunk_id in include_ids or ():
+                row = self._rows_by_chunk.get(chunk_id)
+                if row is not None and scores[row] > 0:
+                    results[chunk_id] = float(scores[row])
+            return results
+
+    def compact(self):
+        """Merge posting segments of every term and drop tombstoned documents."""
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up()
+                terms = [term for (term,) in cursor.execute("SELECT DISTINCT term FROM postings").fetchall()]
+                self._merge_segments(cursor, terms)
+                cursor.execute("DELETE FROM docs WHERE deleted = 1")
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            logger.info(f"Compacted keyword index: {len(terms)} terms, {len(self._rows_by_chunk)} chunks")
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+def get_keyword_index() -> Optional[BM25Index]:
+    """Return the shared BM25 index, or None if KEYWORD_INDEX_ENABLED is off."""
+    if not KEYWORD_INDEX_ENABLED:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(KEYWORD_INDEX_PATH)
+        if index is None:
+            index = BM25Index(KEYWORD_INDEX_PATH)
+            _indexes[KEYWORD_INDEX_PATH] = index
+        return index
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Set
+from app.config import CHUNK_MANIFEST_PATH
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ChunkKeys:
+    """Assigns content-derived keys to the chunks of one document, in order.
+
+    A chunk's key is a hash of its text, so it survives edits elsewhere in
+    the document; the n-th repeat of the same text within a document gets
+    "-n" appended so every chunk still has a distinct key.
+    """
+
+    def __init__(self):
+        self._seen: Counter = Counter()
+
+    def key(self, text: str) -> str:
+        """Key of the next chunk, whose text is text."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+        occurrence = self._seen[digest]
+        self._seen[digest] += 1
+        return digest if occurrence == 0 else f"{digest}-{occurrence}"
+
+def chunk_keys(chunks: Iterable[str]) -> List[str]:
+    """Content keys of a document's chunks, in order."""
+    keys = ChunkKeys()
+    return [keys.key(chunk) for chunk in chunks]
+
+class ChunkManifest:
+    """Keys of the chunks currently indexed for each document.
+
+    Re-indexing a document compares its new chunk keys with this manifest:
+    only chunks with unknown keys are embedded and upserted, and indexed keys
+    that no longer occur are deleted. Keys are added only after their
+    vectors are upserted, so a failed run is picked up by the next one.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS manifest (
+                doc_id TEXT NOT NULL,
+                chunk_key TEXT NOT NULL,
+                PRIMARY KEY (doc_id, chunk_key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._db.commit()
+
+    def get(self, doc_id: str) -> Set[str]:
+        """Keys of the chunks indexed for doc_id."""
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT chunk_key FROM manifest WHERE doc_id = ?", (doc_id,))}
+
+    def add(self, doc_id: str, chunk_keys: Sequence[str]):
+        """Record chunks of doc_id as indexed."""
+        if not chunk_keys:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO manifest (doc_id, chunk_key) VALUES (?, ?)",
+                [(doc_id, chunk_key) for chunk_key in chunk_keys]
+            )
+            self._db.commit()
+
+    def remove(self, doc_id: str, chunk_keys: Sequence[str]):
+        """Forget chunks of doc_id; unknown keys are ignored."""
+        if not chunk_keys:
+            return
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM manifest WHERE doc_id = ? AND chunk_key = ?",
+                [(doc_id, chunk_key) for chunk_key in chunk_keys]
+            )
+            self._db.commit()
+
+
+_manifests: Dict[str, ChunkManifest] = {}
+_manifests_lock = threading.Lock()
+
+def get_chunk_manifest() -> ChunkManifest:
+    """Return the shared chunk manifest at CHUNK_MANIFEST_PATH."""
+    with _manifests_lock:
+        manifest = _manifests.get(CHUNK_MANIFEST_PATH)
+        if manifest is None:
+            manifest = ChunkManifest(CHUNK_MANIFEST_PATH)
+            _manifests[CHUNK_MANIFEST_PATH] = manifest
+        return manifest
@@ -1,9 +1,16 @@
+import asyncio
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List
+from app.config import OCR_ENABLED, OCR_MIN_PAGE_CHARS
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+def _extract_pdf_pages(file_path: str) -> List[str]:
+    import pdfplumber
+    with pdfplumber.open(file_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
 async def parse_document(file_path: str) -> Dict[str, Any]:
     """Parse a document and extract text/metadata.
     
@@ -28,14 +35,28 @@ async def parse_document(file_path: str) -> Dict[str, Any]:
         # Lazy import OCR module only when needed
         if file_ext in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
             logger.info(f"Using OCR for image file: {file_path}")
-            from app.services.ocr import extract_text_from_image
-            text = await extract_text_from_image(file_path)
+            from app.services.ocr import get_ocr_engine
+            # Runs on the OCR process pool; extract_text_from_image is synchronous
+            text = await get_ocr_engine().ocr_image(file_path)
             
         elif file_ext == '.pdf':
             logger.info(f"Processing PDF file: {file_path}")
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                text = '\n'.join(page.extract_text() for page in pdf.pages)
+            page_texts = await asyncio.to_thread(_extract_pdf_pages, file_path)
+            
+            # OCR pages without a usable text layer, e.g. scanned pages
+            scanned = [
+                page_num for page_num, page_text in enumerate(page_texts)
+                if len(page_text.strip()) < OCR_MIN_PAGE_CHARS
+            ]
+            if OCR_ENABLED and scanned:
+                logger.info(f"OCRing {len(scanned)} of {len(page_texts)} pages without a text layer: {file_path}")
+                from app.services.ocr import get_ocr_engine
+                ocr_texts = await get_ocr_engine().ocr_pdf_pages(file_path, scanned)
+                for page_num, ocr_text in ocr_texts.items():
+                    if ocr_text and len(ocr_text) > len(page_texts[page_num].strip()):
+                        page_texts[page_num] = ocr_text
+            text = '\n'.join(page_texts)
+            pages = page_texts
                 
         elif file_ext in ['.doc', '.docx']:
             logger.info(f"Processing Word document: {file_path}")
@@ -48,6 +69,9 @@ async def parse_document(file_path: str) -> Dict[str, Any]:
             logger.error(error_msg)
             raise ValueError(error_msg)
             
+        if file_ext != '.pdf':
+            pages = [text]
+            
         if not text:
             error_msg = f"No text extracted from document {file_path}"
             logger.error(error_msg)
@@ -58,6 +82,8 @@ async def parse_document(file_path: str) -> Dict[str, Any]:
         
         return {
             "text": text,
+            # Page texts, for chunking the same way as the parallel workflow
+            "pages": pages,
             "file_type": file_ext,
             "file_path": file_path,
             "size": file_size,
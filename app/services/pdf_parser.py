@@ -1,5 +1,11 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import pdfplumber
-from typing import Optional
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from app.config import PDF_CACHE_MAX_DOCUMENTS
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -30,4 +36,233 @@ def extract_text_from_pdf(file_path: str) -> Optional[str]:
         
     except Exception as e:
         logger.error(f"Error extracting text from PDF {file_path}: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+class _CachedDocument:
+    def __init__(self, path: str, pdf: pdfplumber.PDF):
+        self.path = path
+        self.pdf = pdf
+        # pdfplumber documents are not thread-safe
+        self.lock = threading.Lock()
+        # Set once the cache has dropped the document; whichever thread
+        # holds lock at that point closes it
+        self.evicted = False
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+        try:
+            self.pdf.close()
+        except Exception as e:
+            logger.warning(f"Error closing cached document {self.path}: {str(e)}")
+
+
+class PDFDocumentCache:
+    """Per-process LRU cache of open pdfplumber documents.
+    
+    Opening a PDF parses its xref table and catalog, which dominates the cost
+    of reading a single page. Workers parse many pages of the same file in a
+    row, so documents are kept open and keyed by (path, mtime) so that a file
+    replaced on disk is reopened instead of served stale.
+    
+    Documents are not thread-safe, so open() hands a document to one thread
+    at a time; threads parsing different documents run concurrently.
+    Documents are opened and closed outside the cache lock, and a document
+    evicted while in use is closed by the thread using it when it is done.
+    """
+    
+    def __init__(self, max_documents: int = 8):
+        """
+        Args:
+            max_documents (int): Number of documents kept open before the
+                least recently used one is closed
+        """
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[Tuple[str, float], _CachedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def open(self, file_path: str) -> Iterator[pdfplumber.PDF]:
+        """
+        Hold an open document for file_path, opening it if necessary.
+        
+        Other threads asking for the same document wait until the block exits.
+        
+        Args:
+            file_path (str): Path to the PDF file
+            
+        Yields:
+            pdfplumber.PDF: Open document, owned by the cache
+        """
+        while True:
+            entry = self._get(file_path)
+            with entry.lock:
+                # Evicted and closed while we waited for the lock: open it again
+                if entry.closed:
+                    continue
+                try:
+                    yield entry.pdf
+                finally:
+                    if entry.evicted:
+                        entry.close()
+                return
+    
+    def _get(self, file_path: str) -> _CachedDocument:
+        path = os.path.abspath(file_path)
+        key = (path, os.path.getmtime(path))
+        
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+                return entry
+        
+        # Opening can take a while; other documents stay available meanwhile
+        opened = _CachedDocument(path, pdfplumber.open(path))
+        
+        dropped = []
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                # Another thread opened it first
+                self._documents.move_to_end(key)
+                dropped.append(opened)
+            else:
+                entry = opened
+                # Drop handles on older versions of the same file
+                for stale_key in [k for k in self._documents if k[0] == path]:
+                    dropped.append(self._documents.pop(stale_key))
+                self._documents[key] = entry
+                logger.debug(f"Opened {path} in document cache ({len(self._documents)} open)")
+                while len(self._documents) > self.max_documents:
+                    dropped.append(self._documents.popitem(last=False)[1])
+        
+        for old in dropped:
+            self._release(old)
+        return entry
+    
+    def close(self, file_path: Optional[str] = None):
+        """
+        Close cached documents.
+        
+        Documents in use are closed when their current reader finishes.
+        
+        Args:
+            file_path (Optional[str]): Only close this file; closes everything if None
+        """
+        with self._lock:
+            if file_path is None:
+                keys = list(self._documents)
+            else:
+                path = os.path.abspath(file_path)
+                keys = [k for k in self._documents if k[0] == path]
+            dropped = [self._documents.pop(key) for key in keys]
+        for entry in dropped:
+            self._release(entry)
+    
+    @staticmethod
+    def _release(entry: _CachedDocument):
+        """Close a document dropped from the cache, or leave that to the thread reading it."""
+        entry.evicted = True
+        # Never wait for a reader; if one holds the lock it closes the
+        # document on release, having seen evicted set
+        if entry.lock.acquire(blocking=False):
+            try:
+                if not entry.closed:
+                    entry.close()
+            finally:
+                entry.lock.release()
+
+
+document_cache = PDFDocumentCache(max_documents=PDF_CACHE_MAX_DOCUMENTS)
+atexit.register(document_cache.close)
+
+
+def extract_page_range(file_path: str, start_page: int, end_page: int) -> List[Dict[str, Any]]:
+    """
+    Extract text from pages [start_page, end_page) of a PDF.
+    
+    Uses the process-wide document cache so consecutive ranges of the same
+    file do not reopen it. Blocking; async callers run it in a thread.
+    
+    Args:
+        file_path (str): Path to the PDF file
+        start_page (int): First page to extract (0-based, inclusive)
+        end_page (int): Page to stop at (0-based, exclusive)
+        
+    Returns:
+        List[Dict[str, Any]]: One result per page with page_num, status and text or error
+    """
+    results = []
+    with document_cache.open(file_path) as pdf:
+        end_page = min(end_page, len(pdf.pages))
+        
+        for page_num in range(start_page, end_page):
+            page = pdf.pages[page_num]
+            try:
+                text = page.extract_text()
+            except Exception as e:
+                logger.error(f"Error extracting page {page_num} of {file_path}: {str(e)}")
+                text = None
+                error = str(e)
+            else:
+                error = "No text extracted"
+            finally:
+                # Release parsed layout objects; the document itself stays open
+                page.flush_cache()
+            
+            if text:
+                results.append({"status": "success", "page_num": page_num, "text": text})
+            else:
+                results.append({"status": "error", "page_num": page_num, "error": error})
+    
+    return results
+
+
+# Document information dictionary entries reported by probe_pdf
+_INFO_KEYS = ("Title", "Author", "Subject", "Creator", "Producer", "CreationDate", "ModDate")
+
+def probe_pdf(file_path: str) -> Dict[str, Any]:
+    """
+    Read a PDF's page count and document metadata without loading its pages.
+    
+    Only the trailer, cross-reference table, catalog and information
+    dictionary are parsed; the page count comes from the /Count of the root
+    page tree. Falls back to walking the page tree if /Count is missing.
+    
+    Args:
+        file_path (str): Path to the PDF file
+        
+    Returns:
+        Dict[str, Any]: page_count and metadata (decoded information dictionary entries)
+    """
+    # pdfminer.six is installed with pdfplumber
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+    from pdfminer.utils import decode_text
+    
+    with open(file_path, "rb") as fp:
+        document = PDFDocument(PDFParser(fp))
+        
+        page_count = None
+        pages = resolve1(document.catalog.get("Pages"))
+        if isinstance(pages, dict):
+            count = resolve1(pages.get("Count"))
+            if isinstance(count, int) and count >= 0:
+                page_count = count
+        if page_count is None:
+            logger.warning(f"No page count in catalog of {file_path}, walking the page tree")
+            from pdfminer.pdfpage import PDFPage
+            page_count = sum(1 for _ in PDFPage.create_pages(document))
+        
+        metadata = {}
+        for info in document.info:
+            for key in _INFO_KEYS:
+                value = resolve1(info.get(key))
+                if isinstance(value, bytes):
+                    value = decode_text(value)
+                if isinstance(value, str) and value:
+                    metadata[key.lower()] = value
+    
+    return {"page_count": page_count, "metadata": metadata}
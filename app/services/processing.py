@@ -1,47 +1,75 @@
+import asyncio
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from app.config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_PAGE_ALIGNED, OPENAI_EMBEDDING_MODEL
 from app.services.parser import parse_document
-from app.services.chunking import split_into_chunks
-from app.services.embeddings import EmbeddingService
-from app.services.indexing import IndexingService
+from app.services.chunking import iter_page_chunks
+from app.services.embeddings import get_embedding_service
+from app.services.indexing import get_indexing_service
+from app.services.manifest import chunk_keys
 from app.utils.logger import get_logger
+from app.utils.tokenizer import get_tokenizer
 
 logger = get_logger(__name__)
 
-# Initialize services
-embedding_service = EmbeddingService()
-indexing_service = IndexingService()
-
-async def process_document(file_path: str, workflow_id: str) -> Dict[str, Any]:
+async def process_document(file_path: str, workflow_id: str, doc_id: Optional[str] = None) -> Dict[str, Any]:
     """Process a document through the pipeline.
     
     Args:
         file_path (str): Path to the document
         workflow_id (str): ID of the workflow for logging
+        doc_id (Optional[str]): Index the file as a new version of this
+            document; only chunks not already indexed for it are embedded
         
     Returns:
         Dict[str, Any]: Processing results
     """
     try:
         logger.info(f"[{workflow_id}] Starting document processing for file: {file_path}")
+        embedding_service = get_embedding_service()
+        indexing_service = get_indexing_service()
         
         # Parse document
         parse_result = await parse_document(file_path)
-        text = parse_result["text"]
         
-        # Generate document ID
-        doc_id = str(uuid.uuid4())
-        logger.info(f"[{workflow_id}] Generated document ID: {doc_id}")
+        # Generate document ID unless re-indexing an existing document
+        if doc_id is None:
+            doc_id = str(uuid.uuid4())
+            logger.info(f"[{workflow_id}] Generated document ID: {doc_id}")
         
         # Split into chunks
         logger.info(f"[{workflow_id}] Splitting document into chunks")
-        chunks = split_into_chunks(text, chunk_size=1000, overlap=200)
+        # Same chunking as chunk_text_activity, so a document keeps its chunk
+        # keys if it is re-indexed through the other workflow
+        # Tokenizing is CPU-bound; the chunk generator is consumed in a thread
+        chunks = await asyncio.to_thread(list, iter_page_chunks(
+            [page for page in parse_result["pages"] if page],
+            chunk_size=CHUNK_MAX_TOKENS,
+            overlap=CHUNK_OVERLAP_TOKENS,
+            tokenizer=get_tokenizer(OPENAI_EMBEDDING_MODEL),
+            page_aligned=CHUNK_PAGE_ALIGNED
+        ))
         logger.info(f"[{workflow_id}] Created {len(chunks)} chunks")
         
-        # Generate embeddings
-        logger.info(f"[{workflow_id}] Generating embeddings")
-        embeddings = embedding_service.generate_embeddings(chunks)
-        logger.info(f"[{workflow_id}] Generated {len(embeddings)} embeddings")
+        # Diff against the chunks already indexed for this document
+        keys = chunk_keys(chunks)
+        indexed = indexing_service.manifest.get(doc_id)
+        new_chunks = [(chunk, key) for chunk, key in zip(chunks, keys) if key not in indexed]
+        stale_keys = sorted(indexed - set(keys))
+        # Chunks of pages that produced no text look stale too, so nothing is
+        # deleted unless every page has text
+        failed_pages = [page_num for page_num, page in enumerate(parse_result["pages"]) if not page]
+        if stale_keys and failed_pages:
+            logger.warning(
+                f"[{workflow_id}] Keeping {len(stale_keys)} possibly stale chunks of {doc_id}: "
+                f"{len(failed_pages)} pages produced no text"
+            )
+            stale_keys = []
+        if indexed:
+            logger.info(
+                f"[{workflow_id}] Re-indexing {doc_id}: {len(new_chunks)} new chunks, "
+                f"{len(chunks) - len(new_chunks)} unchanged, {len(stale_keys)} stale"
+            )
         
         # Create metadata
         metadata = {
@@ -53,15 +81,34 @@ async def process_document(file_path: str, workflow_id: str) -> Dict[str, Any]:
             "chunk_count": len(chunks)
         }
         
-        # Index document
-        logger.info(f"[{workflow_id}] Indexing document")
-        indexing_service.index_document(doc_id, chunks, embeddings, metadata)
+        if new_chunks:
+            # Generate embeddings
+            logger.info(f"[{workflow_id}] Generating embeddings")
+            embeddings = await embedding_service.agenerate_embeddings([chunk for chunk, _ in new_chunks])
+            logger.info(f"[{workflow_id}] Generated {len(embeddings)} embeddings")
+            
+            # Index document; upserts and SQLite writes block, so they run in
+            # a thread to keep the worker's event loop free
+            logger.info(f"[{workflow_id}] Indexing document")
+            await asyncio.to_thread(
+                indexing_service.index_document,
+                doc_id,
+                [chunk for chunk, _ in new_chunks],
+                embeddings,
+                metadata,
+                chunk_keys=[key for _, key in new_chunks]
+            )
+        
+        # Old chunks go only after the new ones are searchable
+        await asyncio.to_thread(indexing_service.delete_chunks, doc_id, stale_keys)
         logger.info(f"[{workflow_id}] Successfully indexed document")
         
         return {
             "status": "success",
             "doc_id": doc_id,
-            "metadata": metadata
+            "metadata": metadata,
+            "embedded_chunks": len(new_chunks),
+            "deleted_chunks": len(stale_keys)
         }
         
     except Exception as e:
@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class QueryEmbeddingCache:
+    """In-process LRU+TTL cache of query embeddings.
+
+    Optionally backed by a shared Redis-compatible store (the Dragonfly
+    service in docker-compose) so that API replicas reuse each other's
+    vectors. The local LRU is always consulted first; the shared store is
+    best effort and errors there only count as misses.
+    """
+
+    def __init__(self,
+                 max_entries: int = 2048,
+                 ttl_seconds: float = 3600,
+                 redis_url: Optional[str] = None,
+                 key_prefix: str = "qemb"):
+        """
+        Args:
+            max_entries (int): Maximum vectors held in process
+            ttl_seconds (float): Time a vector stays valid, locally and in Redis
+            redis_url (Optional[str]): Shared cache URL, e.g. redis://dragonfly:6379/0
+            key_prefix (str): Prefix for keys in the shared cache
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        self._redis = None
+        if redis_url:
+            try:
+                # Lazy import so redis is only needed when a shared cache is configured
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+                logger.info(f"Query embedding cache backed by {redis_url}")
+            except Exception as e:
+                logger.warning(f"Shared query cache unavailable, using local cache only: {str(e)}")
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize query text so trivially different spellings share an entry."""
+        return " ".join(query.split()).casefold()
+
+    def _key(self, model: str, query: str) -> str:
+        digest = hashlib.sha256(self.normalize(query).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}:{model}:{digest}"
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """
+        Return the cached vector for query under model, if any.
+
+        Args:
+            model (str): Embedding model (including any dimension override)
+            query (str): Raw query text
+
+        Returns:
+            Optional[List[float]]: Cached embedding, or None on a miss
+        """
+        key = self._key(model, query)
+        vector = self._get_local(key)
+        if vector is None and self._redis is not None:
+            vector = self._get_shared(key)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+        return vector
+
+    async def aget(self, model: str, query: str) -> Optional[List[float]]:
+        """Like get, but runs the shared-store lookup in a thread so it does not block the event loop."""
+        key = self._key(model, query)
+        vector = self._get_local(key)
+        if vector is None and self._redis is not None:
+            vector = await asyncio.to_thread(self._get_shared, key)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+        return vector
+
+    def set(self, model: str, query: str, vector: List[float]):
+        """
+        Cache the embedding for query under model.
+
+        Args:
+            model (str): Embedding model (including any dimension override)
+            query (str): Raw query text
+            vector (List[float]): Query embedding
+        """
+        key = self._key(model, query)
+        self._put_local(key, vector)
+        if self._redis is not None:
+            self._set_shared(key, vector)
+
+    async def aset(self, model: str, query: str, vector: List[float]):
+        """Like set, but runs the shared-store write in a thread."""
+        key = self._key(model, query)
+        self._put_local(key, vector)
+        if self._redis is not None:
+            await asyncio.to_thread(self._set_shared, key, vector)
+
+    def _get_local(self, key: str) -> Optional[List[float]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+        return None
+
+    def _get_shared(self, key: str) -> Optional[List[float]]:
+        try:
+            blob = self._redis.get(key)
+        except Exception as e:
+            logger.warning(f"Shared query cache get failed: {str(e)}")
+            return None
+        if not blob:
+            return None
+        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+        self._put_local(key, vector)
+        with self._lock:
+            self.shared_hits += 1
+        return vector
+
+    def _set_shared(self, key: str, vector: List[float]):
+        try:
+            self._redis.set(key, np.asarray(vector, dtype=np.float32).tobytes(), ex=int(self.ttl_seconds))
+        except Exception as e:
+            logger.warning(f"Shared query cache set failed: {str(e)}")
+
+    def _put_local(self, key: str, vector: List[float]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current hit rate."""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,297 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from app.config import (
+    DRAGONFLY_URL,
+    EMBEDDING_RPM_LIMIT,
+    EMBEDDING_TPM_LIMIT,
+    EMBEDDING_QUERY_RESERVE,
+)
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Priorities accepted by RateLimiter.acquire. Bulk callers leave the query
+# reserve untouched; query callers may use the whole bucket.
+PRIORITY_BULK = "bulk"
+PRIORITY_QUERY = "query"
+
+# Two token buckets (requests, tokens) refilled continuously at limit/60 per
+# second, plus a cluster-wide pause set after a 429. Returns "0" if the cost
+# was taken, otherwise the seconds to wait before trying again. Numbers are
+# returned as strings because Redis truncates Lua numbers to integers.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local cost_r = tonumber(ARGV[4])
+local cost_t = tonumber(ARGV[5])
+local reserve = tonumber(ARGV[6])
+
+local state = redis.call('HMGET', KEYS[1], 'r', 't', 'ts', 'pause')
+local pause = tonumber(state[4]) or 0
+if pause > now then
+    return tostring(pause - now)
+end
+
+local r = tonumber(state[1]) or rpm
+local t = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts)
+r = math.min(rpm, r + elapsed * rpm / 60)
+t = math.min(tpm, t + elapsed * tpm / 60)
+
+local wait = 0
+local need_r = cost_r + reserve * rpm
+local need_t = cost_t + reserve * tpm
+if r < need_r then wait = math.max(wait, (need_r - r) * 60 / rpm) end
+if t < need_t then wait = math.max(wait, (need_t - t) * 60 / tpm) end
+if wait == 0 then
+    r = r - cost_r
+    t = t - cost_t
+end
+
+redis.call('HSET', KEYS[1], 'r', tostring(r), 't', tostring(t), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 300)
+return tostring(wait)
+"""
+
+_PAUSE_SCRIPT = """
+local until_ts = tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'pause')) or 0
+if until_ts > current then
+    redis.call('HSET', KEYS[1], 'pause', tostring(until_ts))
+    redis.call('EXPIRE', KEYS[1], 300)
+end
+return 1
+"""
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter for one API quota.
+
+    Bucket state lives in a Redis-compatible store (the Dragonfly service in
+    docker-compose) so every embedding worker and API replica draws from the
+    same quota. A fraction of both buckets is reserved for query-priority
+    callers, so bulk ingestion cannot starve search. If no shared store is
+    configured the same algorithm runs in process; if the store fails, the
+    limiter runs in process for retry_interval seconds before trying it
+    again, so an unreachable store costs one timeout per interval rather
+    than one per request.
+    """
+
+    def __init__(self,
+                 requests_per_minute: int = EMBEDDING_RPM_LIMIT,
+                 tokens_per_minute: int = EMBEDDING_TPM_LIMIT,
+                 query_reserve: float = EMBEDDING_QUERY_RESERVE,
+                 redis_url: Optional[str] = DRAGONFLY_URL,
+                 key: str = "ratelimit:openai-embeddings",
+                 retry_interval: float = 30.0):
+        """
+        Args:
+            requests_per_minute (int): Request quota; 0 disables the request bucket
+            tokens_per_minute (int): Token quota; 0 disables the token bucket
+            query_reserve (float): Fraction of each bucket only query-priority
+                callers may use
+            redis_url (Optional[str]): Shared store URL, e.g. redis://dragonfly:6379/0
+            key (str): Key holding the bucket state in the shared store
+            retry_interval (float): Seconds to limit in process after the
+                shared store fails
+        """
+        if not 0 <= query_reserve < 1:
+            raise ValueError("query_reserve must be in [0, 1)")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.query_reserve = query_reserve
+        self.key = key
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._local: Dict[str, float] = {}
+        self._shared_retry_at = 0.0
+
+        self._redis = None
+        if redis_url and self.enabled:
+            try:
+                # Lazy import so redis is only needed when a shared store is configured
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                self._acquire_script = self._redis.register_script(_ACQUIRE_SCRIPT)
+                self._pause_script = self._redis.register_script(_PAUSE_SCRIPT)
+                logger.info(f"Embedding rate limiter shared through {redis_url}")
+            except Exception as e:
+                logger.warning(f"Shared rate limiter unavailable, limiting per process: {str(e)}")
+                self._redis = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    @property
+    def shared(self) -> bool:
+        """Whether calls currently go to the shared store."""
+        return self._redis is not None and time.monotonic() >= self._shared_retry_at
+
+    def _shared_failed(self, action: str, error: Exception):
+        self._shared_retry_at = time.monotonic() + self.retry_interval
+        logger.warning(
+            f"Shared rate limiter {action} failed, limiting per process for {self.retry_interval:.0f}s: {str(error)}"
+        )
+
+    def _costs(self, tokens: int, priority: str):
+        """Bucket parameters for one request.
+
+        Disabled buckets get a nominal rate and zero cost, and token costs are
+        capped at what the caller may use so any request can eventually fit.
+        """
+        reserve = 0.0 if priority == PRIORITY_QUERY else self.query_reserve
+        rpm = self.requests_per_minute or 1
+        tpm = self.tokens_per_minute or 1
+        cost_r = 1 if self.requests_per_minute else 0
+        cost_t = min(tokens, tpm * (1 - reserve)) if self.tokens_per_minute else 0
+        return rpm, tpm, cost_r, cost_t, reserve
+
+    def try_acquire(self, tokens: int, priority: str = PRIORITY_BULK) -> float:
+        """
+        Take one request and tokens from the buckets if available.
+
+        Args:
+            tokens (int): Tokens the request will consume
+            priority (str): PRIORITY_BULK or PRIORITY_QUERY
+
+        Returns:
+            float: 0 if acquired, otherwise seconds to wait before retrying
+        """
+        now = time.time()
+        if not self.enabled:
+            # No quota to enforce, but still honour pauses after a 429
+            with self._lock:
+                return max(0.0, self._local.get("pause", 0) - now)
+        rpm, tpm, cost_r, cost_t, reserve = self._costs(tokens, priority)
+
+        if self.shared:
+            try:
+                return float(self._acquire_script(keys=[self.key], args=[now, rpm, tpm, cost_r, cost_t, reserve]))
+            except Exception as e:
+                self._shared_failed("acquire", e)
+
+        with self._lock:
+            state = self._local
+            if state.get("pause", 0) > now:
+                return state["pause"] - now
+            elapsed = max(0.0, now - state.get("ts", now))
+            r = min(rpm, state.get("r", rpm) + elapsed * rpm / 60)
+            t = min(tpm, state.get("t", tpm) + elapsed * tpm / 60)
+            wait = 0.0
+            if r < cost_r + reserve * rpm:
+                wait = max(wait, (cost_r + reserve * rpm - r) * 60 / rpm)
+            if t < cost_t + reserve * tpm:
+                wait = max(wait, (cost_t + reserve * tpm - t) * 60 / tpm)
+            if wait == 0:
+                r -= cost_r
+                t -= cost_t
+            state.update(r=r, t=t, ts=now)
+            return wait
+
+    def acquire(self, tokens: int, priority: str = PRIORITY_BULK):
+        """Block until a request of tokens tokens may be sent."""
+        while (wait := self.try_acquire(tokens, priority)) > 0:
+            time.sleep(self._jitter(wait))
+
+    async def aacquire(self, tokens: int, priority: str = PRIORITY_BULK):
+        """Wait without blocking the event loop until a request of tokens tokens may be sent."""
+        while True:
+            # Only the shared store does network I/O
+            if self.shared:
+                wait = await asyncio.to_thread(self.try_acquire, tokens, priority)
+            else:
+                wait = self.try_acquire(tokens, priority)
+            if wait <= 0:
+                return
+            await asyncio.sleep(self._jitter(wait))
+
+    def pause(self, seconds: float):
+        """Stop all callers sharing this quota for seconds, e.g. after a 429."""
+        until = time.time() + seconds
+        if self.shared:
+            try:
+                self._pause_script(keys=[self.key], args=[until])
+                return
+            except Exception as e:
+                self._shared_failed("pause", e)
+        with self._lock:
+            self._local["pause"] = max(self._local.get("pause", 0), until)
+
+    async def apause(self, seconds: float):
+        """pause without blocking the event loop."""
+        if self.shared:
+            await asyncio.to_thread(self.pause, seconds)
+        else:
+            self.pause(seconds)
+
+    @staticmethod
+    def _jitter(wait: float) -> float:
+        # Spread out retries so waiting callers don't wake in lockstep
+        return min(wait, 5.0) * random.uniform(1.0, 1.2)
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight.
+
+    The limit grows by about one slot per limit's worth of fast successful
+    requests and halves on a rate-limit response; a slow response shrinks
+    it by a quarter. It never leaves [min_limit, max_limit].
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_target: float = 15.0):
+        """
+        Args:
+            max_limit (int): Upper bound, and the starting limit
+            min_limit (int): Lower bound
+            latency_target (float): Seconds above which a response counts as slow
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_target = latency_target
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one in-flight slot for the duration of the block."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self._set_limit(self.limit * 0.75)
+        else:
+            self._set_limit(self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        self._set_limit(self.limit / 2)
+
+    def _set_limit(self, limit: float):
+        previous = int(self.limit)
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+        if int(self.limit) != previous:
+            logger.info(f"Embedding concurrency limit {previous} -> {int(self.limit)}")
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide embeddings rate limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from app.config import REGISTRY_PATH
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class DocumentRegistry:
+    """Maps document content hashes to the doc_id they were indexed under.
+    
+    Uploads are content-addressed by SHA-256, so the registry lets us answer
+    "have we already ingested these exact bytes?" before doing any work.
+    """
+    
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                content_hash TEXT PRIMARY KEY,
+                doc_id TEXT,
+                file_path TEXT NOT NULL,
+                original_name TEXT,
+                status TEXT NOT NULL,
+                workflow_id TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+    
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a document by content hash.
+        
+        Args:
+            content_hash (str): SHA-256 hex digest of the file contents
+            
+        Returns:
+            Optional[Dict[str, Any]]: Registry record, or None if unknown
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+    
+    def mark_processing(self,
+                        content_hash: str,
+                        file_path: str,
+                        original_name: Optional[str] = None,
+                        workflow_id: Optional[str] = None):
+        """Record that ingestion of content_hash has started."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO documents (content_hash, file_path, original_name, status, workflow_id, created_at, updated_at)
+                VALUES (?, ?, ?, 'processing', ?, ?, ?)
+                ON CONFLICT(content_hash) DO UPDATE SET
+                    status = 'processing', error = NULL,
+                    workflow_id = excluded.workflow_id, updated_at = excluded.updated_at
+                """,
+                (content_hash, file_path, original_name, workflow_id, now, now)
+            )
+            self._conn.commit()
+    
+    def mark_completed(self, content_hash: str, doc_id: str, result: Dict[str, Any]):
+        """Record the doc_id and workflow result for content_hash."""
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE documents SET status = 'completed', doc_id = ?, result = ?, updated_at = ?
+                WHERE content_hash = ?
+                """,
+                (doc_id, json.dumps(result, default=str), time.time(), content_hash)
+            )
+            self._conn.commit()
+        logger.info(f"Registered document {doc_id} for content {content_hash}")
+    
+    def mark_failed(self, content_hash: str, error: str):
+        """Record a failed ingestion so the next upload retries it."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET status = 'failed', error = ?, updated_at = ? WHERE content_hash = ?",
+                (error, time.time(), content_hash)
+            )
+            self._conn.commit()
+
+_registry: Optional[DocumentRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_document_registry() -> DocumentRegistry:
+    """Return the process-wide document registry at REGISTRY_PATH, opened on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DocumentRegistry()
+        return _registry
@@ -1,51 +1,256 @@
-from typing import List, Dict, Any, Optional
-from pinecone import Pinecone
-from app.config import PINECONE_API_KEY, PINECONE_INDEX_NAME
-from app.services.embeddings import EmbeddingService
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from app.config import (
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+    DRAGONFLY_URL
+)
+from app.services.chunk_store import ChunkStore, get_chunk_store
+from app.services.embeddings import EmbeddingService, get_embedding_service
+from app.services.keyword_index import BM25Index, get_keyword_index
+from app.services.query_cache import QueryEmbeddingCache
+from app.services.vector_store import VectorStore, get_vector_store
 from app.utils.logger import get_logger
-import time
+from app.utils.metrics import SEARCH_COALESCED
+from app.utils.singleflight import SingleFlight
 
 logger = get_logger()
 
 class SearchService:
-    def __init__(self):
-        # Initialize Pinecone
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self._init_index()
-        self.embedding_service = EmbeddingService()
+    def __init__(self,
+                 store: Optional[VectorStore] = None,
+                 keyword_index: Optional[BM25Index] = None,
+                 chunk_store: Optional[ChunkStore] = None,
+                 embedding_service: Optional[EmbeddingService] = None):
+        """
+        Args:
+            store (Optional[VectorStore]): Vector store to query; defaults to
+                the backend selected by VECTOR_STORE_BACKEND
+            keyword_index (Optional[BM25Index]): BM25 index for hybrid scoring;
+                defaults to the shared index unless KEYWORD_INDEX_ENABLED is off
+            chunk_store (Optional[ChunkStore]): Source of result text; defaults
+                to the shared store at CHUNK_STORE_PATH
+            embedding_service (Optional[EmbeddingService]): Embeds queries;
+                defaults to the process-wide service
+        """
+        self.store = store or get_vector_store()
+        self.keyword_index = keyword_index or get_keyword_index()
+        self.chunk_store = chunk_store or get_chunk_store()
+        self.embedding_service = embedding_service or get_embedding_service()
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=QUERY_CACHE_MAX_ENTRIES,
+            ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+            redis_url=DRAGONFLY_URL
+        )
+        self._search_flights = SingleFlight()
+        self._embed_flights = SingleFlight()
+    
+    def _cache_model_key(self) -> str:
+        """Model identifier used in query cache keys."""
+        return f"{self.embedding_service.model}:{self.embedding_service.dimensions or 'default'}"
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Return the query embedding, served from the query cache when possible."""
+        model_key = self._cache_model_key()
+        query_vector = self.query_cache.get(model_key, query)
+        if query_vector is None:
+            query_vector = self.embedding_service.generate_query_embedding(query)
+            self.query_cache.set(model_key, query, query_vector)
+        return query_vector
     
-    def _init_index(self):
-        """Initialize connection to Pinecone index with retries"""
-        max_retries = 5
-        retry_delay = 5  # seconds
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return query embedding cache metrics."""
+        return self.query_cache.stats()
+    
+    def _fetch_keyword_only(self,
+                            query_vector: List[float],
+                            keyword_scores: Dict[str, float],
+                            candidates: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Load keyword-only hits with their vector similarity to the query."""
+        missing = [chunk_id for chunk_id in keyword_scores if chunk_id not in candidates]
+        if not missing:
+            return {}
+        return self.store.score(query_vector, missing)
+    
+    @staticmethod
+    def _fuse_scores(candidates: Dict[str, Dict[str, Any]],
+                     keyword_scores: Dict[str, float],
+                     hybrid_alpha: float) -> List[Tuple[Dict[str, Any], float, float]]:
+        """
+        Rank candidates by alpha * vector score + (1 - alpha) * keyword score.
         
-        for attempt in range(max_retries):
-            try:
-                # Check if index exists
-                if PINECONE_INDEX_NAME not in self.pc.list_indexes().names():
-                    logger.warning(f"Index {PINECONE_INDEX_NAME} does not exist yet")
-                    time.sleep(retry_delay)
-                    continue
-                
-                # Try to connect to the index
-                desc = self.pc.describe_index(PINECONE_INDEX_NAME)
-                if desc.status['ready']:
-                    self.index = self.pc.Index(PINECONE_INDEX_NAME)
-                    logger.info(f"Successfully connected to index {PINECONE_INDEX_NAME}")
-                    return
-                    
-            except Exception as e:
-                logger.error(f"Attempt {attempt + 1}/{max_retries} to connect to index failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"Failed to connect to index after {max_retries} attempts")
+        BM25 scores are unbounded, so they are divided by the best keyword
+        score in this result set to put them on the same 0-1 scale as
+        cosine similarity.
+        
+        Returns:
+            List[Tuple[Dict[str, Any], float, float]]: (match, fused score,
+                normalized keyword score), best first
+        """
+        max_keyword = max(keyword_scores.values(), default=0.0) or 1.0
+        ranked = []
+        for vector_id, match in candidates.items():
+            keyword_score = keyword_scores.get(vector_id, 0.0) / max_keyword
+            fused = hybrid_alpha * match["score"] + (1 - hybrid_alpha) * keyword_score
+            ranked.append((match, fused, keyword_score))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked
+    
+    def _hydrate(self, matches: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Read the text of matches from the chunk store in one batched lookup.
+        
+        Vectors indexed before text moved out of metadata still carry it
+        there, and that copy is used as is.
+        """
+        texts = {
+            match["id"]: match["metadata"]["text"]
+            for match in matches if "text" in match["metadata"]
+        }
+        missing = [match["id"] for match in matches if match["id"] not in texts]
+        if missing:
+            texts.update(self.chunk_store.get_many(missing))
+        return texts
     
     def _check_required_keywords(self, text: str, keywords: List[str]) -> bool:
         """Check if all required keywords are present in text."""
         text_lower = text.lower()
         return all(keyword.lower() in text_lower for keyword in keywords)
     
+    def _search_key(self,
+                    query: str,
+                    required_keywords: Optional[List[str]],
+                    similarity_threshold: float,
+                    hybrid_alpha: float,
+                    limit: int) -> Tuple:
+        """Identity of a search request, for coalescing identical concurrent requests."""
+        return (
+            self._cache_model_key(),
+            QueryEmbeddingCache.normalize(query),
+            tuple(required_keywords or ()),
+            similarity_threshold,
+            hybrid_alpha,
+            limit
+        )
+    
+    async def _aembed_query(self, query: str) -> List[float]:
+        """
+        Async _embed_query. Concurrent cache misses for the same query share
+        one embeddings request.
+        """
+        model_key = self._cache_model_key()
+        query_vector = await self.query_cache.aget(model_key, query)
+        if query_vector is not None:
+            return query_vector
+        
+        key = (model_key, QueryEmbeddingCache.normalize(query))
+        if self._embed_flights.in_flight(key):
+            SEARCH_COALESCED.labels("embedding").inc()
+        
+        async def embed() -> List[float]:
+            vector = await self.embedding_service.agenerate_query_embedding(query)
+            await self.query_cache.aset(model_key, query, vector)
+            return vector
+        
+        return await self._embed_flights.do(key, embed)
+    
+    @staticmethod
+    def _top_k(required_keywords: Optional[List[str]], limit: int) -> int:
+        """Vector candidates to fetch for a search."""
+        # Only substring filtering still needs a deep candidate pool; the
+        # keyword side now contributes its own candidates
+        return min(limit * 3 if required_keywords else limit * 2, 100)
+    
+    def _retrieve(self,
+                  query: str,
+                  query_vector: List[float],
+                  required_keywords: Optional[List[str]],
+                  similarity_threshold: float,
+                  hybrid_alpha: float,
+                  limit: int,
+                  matches: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Run the vector and keyword searches for an embedded query and build the results.
+        
+        matches, if given, are the vector store results for query_vector at
+        _top_k(required_keywords, limit), already fetched by a batch query.
+        """
+        use_keywords = self.keyword_index is not None and hybrid_alpha < 1.0
+        top_k = self._top_k(required_keywords, limit)
+        
+        # Execute search
+        if matches is None:
+            matches = self.store.query(
+                query_vector,
+                top_k=top_k,
+                include_metadata=True
+            )
+        candidates = {match["id"]: match for match in matches}
+        
+        keyword_scores: Dict[str, float] = {}
+        if use_keywords:
+            keyword_scores = self.keyword_index.search(query, top_k=top_k, include_ids=list(candidates))
+            candidates.update(self._fetch_keyword_only(query_vector, keyword_scores, candidates))
+        
+        ranked = self._fuse_scores(candidates, keyword_scores, hybrid_alpha)
+        
+        # Threshold and deduplicate on the slim metadata first, so text is
+        # only read for chunks that can still make it into the results
+        selected = []
+        seen_chunks = set()
+        
+        for match, score, keyword_score in ranked:
+            metadata = match["metadata"]
+            
+            # The threshold applies to vector similarity, which a pure
+            # keyword ranking (alpha 0) does not use
+            if hybrid_alpha > 0 and match["score"] < similarity_threshold:
+                continue
+                
+            chunk_id = f"{metadata['doc_id']}_{metadata['chunk_id']}"
+            if chunk_id in seen_chunks:
+                continue
+            seen_chunks.add(chunk_id)
+            selected.append((match, score, keyword_score))
+            
+            # Keyword filtering needs the text of every remaining
+            # candidate; otherwise the first limit are the results
+            if not required_keywords and len(selected) >= limit:
+                break
+        
+        texts = self._hydrate([match for match, _, _ in selected])
+        
+        processed_results = []
+        for match, score, keyword_score in selected:
+            metadata = match["metadata"]
+            text = texts.get(match["id"])
+            if text is None:
+                logger.warning(f"No text stored for chunk {match['id']}")
+                text = ""
+            
+            # Check required keywords if specified
+            if required_keywords and not self._check_required_keywords(text, required_keywords):
+                continue
+            
+            processed_results.append({
+                "score": score,
+                "vector_score": match["score"],
+                "keyword_score": keyword_score,
+                "text": text,
+                "doc_id": metadata["doc_id"],
+                "chunk_id": metadata["chunk_id"],
+                "metadata": {
+                    k: v for k, v in metadata.items()
+                    if k not in ['text', 'doc_id', 'chunk_id']
+                }
+            })
+            
+            if len(processed_results) >= limit:
+                break
+        
+        return processed_results
+    
     def hybrid_search(
         self,
         query: str,
@@ -55,12 +260,13 @@ class SearchService:
         limit: int = 5
     ) -> List[Dict[str, Any]]:
         """
-        Perform hybrid search using Pinecone's vector search with metadata filtering
+        Perform hybrid search, fusing vector similarity with BM25 keyword scores
         
         Args:
             query (str): Search query
             required_keywords (Optional[List[str]]): Keywords that must be present in results
-            similarity_threshold (float): Minimum similarity score (0-1)
+            similarity_threshold (float): Minimum vector similarity (0-1); not
+                applied when hybrid_alpha is 0
             hybrid_alpha (float): Weight between vector (1.0) and keyword search (0.0)
             limit (int): Number of results to return
             
@@ -71,54 +277,149 @@ class SearchService:
             logger.info(f"Performing hybrid search with query: {query}")
             
             # Generate query embedding for dense vector search
-            query_vector = self.embedding_service.generate_query_embedding(query)
-            
-            # Configure search parameters
-            search_params = {
-                "vector": query_vector,
-                "top_k": min(limit * 3, 100),  # Get more results for post-filtering, max 100
-                "include_metadata": True
-            }
-            
-            # Execute search
-            results = self.index.query(**search_params)
+            query_vector = self._embed_query(query)
+            processed_results = self._retrieve(
+                query, query_vector, required_keywords, similarity_threshold, hybrid_alpha, limit
+            )
             
-            # Process and filter results
-            processed_results = []
-            seen_chunks = set()
+            logger.info(f"Found {len(processed_results)} results for query: {query}")
+            return processed_results
             
-            for match in results.matches:
-                # Skip if below similarity threshold
-                if match.score < similarity_threshold:
-                    continue
-                    
-                chunk_id = f"{match.metadata['doc_id']}_{match.metadata['chunk_id']}"
-                text = match.metadata['text']
+        except Exception as e:
+            logger.error(f"Error performing hybrid search: {str(e)}")
+            raise 
+    
+    async def ahybrid_search(
+        self,
+        query: str,
+        required_keywords: Optional[List[str]] = None,
+        similarity_threshold: float = 0.7,
+        hybrid_alpha: float = 0.5,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        hybrid_search for the API's event loop.
+        
+        The query is embedded with the async OpenAI client and the vector
+        store, BM25 and chunk store lookups run in a worker thread, so one
+        process serves many searches at once. Identical requests that arrive
+        while one is in flight share its result instead of repeating it.
+        
+        Args and return value are as for hybrid_search.
+        """
+        key = self._search_key(query, required_keywords, similarity_threshold, hybrid_alpha, limit)
+        if self._search_flights.in_flight(key):
+            SEARCH_COALESCED.labels("search").inc()
+        
+        async def search() -> List[Dict[str, Any]]:
+            try:
+                logger.info(f"Performing hybrid search with query: {query}")
                 
-                # Check required keywords if specified
-                if required_keywords and not self._check_required_keywords(text, required_keywords):
-                    continue
+                query_vector = await self._aembed_query(query)
+                processed_results = await asyncio.to_thread(
+                    self._retrieve,
+                    query, query_vector, required_keywords, similarity_threshold, hybrid_alpha, limit
+                )
                 
-                # Add result if it's a new chunk
-                if chunk_id not in seen_chunks:
-                    processed_results.append({
-                        "score": match.score,
-                        "text": text,
-                        "doc_id": match.metadata["doc_id"],
-                        "chunk_id": match.metadata["chunk_id"],
-                        "metadata": {
-                            k: v for k, v in match.metadata.items()
-                            if k not in ['text', 'doc_id', 'chunk_id']
-                        }
-                    })
-                    seen_chunks.add(chunk_id)
+                logger.info(f"Found {len(processed_results)} results for query: {query}")
+                return processed_results
                 
-                if len(processed_results) >= limit:
-                    break
+            except Exception as e:
+                logger.error(f"Error performing hybrid search: {str(e)}")
+                raise
+        
+        results = await self._search_flights.do(key, search)
+        # Coalesced callers get their own list; the result dicts are shared
+        return list(results)
+
+    async def _aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries for a batch search: cached vectors are reused and all
+        remaining distinct queries go to the API in one request.
+        """
+        model_key = self._cache_model_key()
+        unique = {}
+        for query in queries:
+            unique.setdefault(QueryEmbeddingCache.normalize(query), query)
+        
+        cached = await asyncio.gather(*(self.query_cache.aget(model_key, query) for query in unique.values()))
+        vectors = {key: vector for key, vector in zip(unique, cached) if vector is not None}
+        misses = [key for key in unique if key not in vectors]
+        if misses:
+            embedded = await self.embedding_service.agenerate_query_embeddings([unique[key] for key in misses])
+            for key, vector in zip(misses, embedded):
+                vectors[key] = vector
+                await self.query_cache.aset(model_key, unique[key], vector)
+        
+        return [vectors[QueryEmbeddingCache.normalize(query)] for query in queries]
+    
+    def _query_batch(self,
+                     query_vectors: List[List[float]],
+                     top_ks: List[int]) -> List[List[Dict[str, Any]]]:
+        """Vector store matches for each query, one query_batch call per distinct top_k."""
+        matches: List[Optional[List[Dict[str, Any]]]] = [None] * len(query_vectors)
+        for top_k in set(top_ks):
+            positions = [i for i, k in enumerate(top_ks) if k == top_k]
+            results = self.store.query_batch(
+                [query_vectors[i] for i in positions],
+                top_k=top_k,
+                include_metadata=True
+            )
+            for i, result in zip(positions, results):
+                matches[i] = result
+        return matches
+    
+    async def ahybrid_search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Run several hybrid searches with one embeddings request.
+        
+        All query texts are embedded together, the vector queries go to the
+        store as batches, and keyword scoring and hydration for each search
+        then run concurrently in worker threads.
+        
+        Args:
+            searches (List[Dict[str, Any]]): hybrid_search keyword arguments
+                for each search; query is required, the rest default as in
+                hybrid_search
             
-            logger.info(f"Found {len(processed_results)} results for query: {query}")
-            return processed_results
+        Returns:
+            List[List[Dict[str, Any]]]: Results of each search, in input order
+        """
+        if not searches:
+            return []
+        try:
+            logger.info(f"Performing batch hybrid search with {len(searches)} queries")
+            params = [
+                {
+                    "query": search["query"],
+                    "required_keywords": search.get("required_keywords"),
+                    "similarity_threshold": search.get("similarity_threshold", 0.7),
+                    "hybrid_alpha": search.get("hybrid_alpha", 0.5),
+                    "limit": search.get("limit", 5)
+                }
+                for search in searches
+            ]
+            
+            query_vectors = await self._aembed_queries([p["query"] for p in params])
+            top_ks = [self._top_k(p["required_keywords"], p["limit"]) for p in params]
+            matches = await asyncio.to_thread(self._query_batch, query_vectors, top_ks)
+            
+            return list(await asyncio.gather(*(
+                asyncio.to_thread(self._retrieve, query_vector=query_vector, matches=match, **p)
+                for p, query_vector, match in zip(params, query_vectors, matches)
+            )))
             
         except Exception as e:
-            logger.error(f"Error performing hybrid search: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.error(f"Error performing batch hybrid search: {str(e)}")
+            raise
+
+_service: Optional[SearchService] = None
+_service_lock = threading.Lock()
+
+def get_search_service() -> SearchService:
+    """Return the process-wide search service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = SearchService()
+        return _service
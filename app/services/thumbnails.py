@@ -0,0 +1,250 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from PIL import Image
+from app.config import (
+    THUMBNAIL_FORMAT,
+    THUMBNAIL_PAGES_PER_TASK,
+    THUMBNAIL_PROCESSES,
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_SIZES
+)
+from app.utils.cpu import available_cpus
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# File extension and Pillow save options per output format
+_FORMATS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "webp": ("webp", {"format": "WEBP", "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "optimize": True, "progressive": True}),
+}
+
+def thumbnail_path(output_dir: str, page_num: int, size: int, image_format: str = THUMBNAIL_FORMAT) -> str:
+    """Path of the thumbnail of page_num (0-based) whose longest edge is size pixels."""
+    extension = _FORMATS[image_format][0]
+    return os.path.join(output_dir, f"page_{page_num + 1}_{size}.{extension}")
+
+def _save_sizes(image: Image.Image,
+                output_dir: str,
+                page_num: int,
+                sizes: Sequence[int],
+                image_format: str,
+                quality: int) -> Dict[int, str]:
+    """Downscale one decoded image to every size, largest first, and save each."""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    _, save_options = _FORMATS[image_format]
+    paths = {}
+    # Each size is resampled from the previous, larger one rather than the source
+    for size in sorted(sizes, reverse=True):
+        if max(image.size) > size:
+            image = image.resize(_fit(image.size, size), Image.Resampling.LANCZOS)
+        path = thumbnail_path(output_dir, page_num, size, image_format)
+        image.save(path, quality=quality, **save_options)
+        paths[size] = path
+    return paths
+
+def _fit(image_size: Tuple[int, int], size: int) -> Tuple[int, int]:
+    width, height = image_size
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def render_pdf_pages(file_path: str,
+                     start_page: int,
+                     end_page: int,
+                     output_dir: str,
+                     sizes: Sequence[int],
+                     image_format: str,
+                     quality: int) -> List[Optional[Dict[int, str]]]:
+    """
+    Rasterize pages [start_page, end_page) once each and write every size.
+
+    Runs in a pool process. Pages are rendered at the scale needed for the
+    largest size instead of a fixed DPI, so nothing larger than necessary is
+    ever rasterized.
+
+    Returns:
+        List[Optional[Dict[int, str]]]: Thumbnail path by size for each page,
+            None for pages that failed to render
+    """
+    # pypdfium2 ships with pdfplumber and renders directly from the open
+    # document, unlike Page.to_image which reopens the file for every page
+    import pypdfium2
+
+    largest = max(sizes)
+    results: List[Optional[Dict[int, str]]] = []
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        for page_num in range(start_page, end_page):
+            try:
+                page = pdf[page_num]
+                try:
+                    width, height = page.get_size()
+                    bitmap = page.render(scale=largest / max(width, height, 1))
+                    image = bitmap.to_pil()
+                finally:
+                    page.close()
+                results.append(_save_sizes(image, output_dir, page_num, sizes, image_format, quality))
+            except Exception as e:
+                logger.error(f"Error rendering page {page_num} of {file_path}: {str(e)}")
+                results.append(None)
+    finally:
+        pdf.close()
+    return results
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF, read from its page tree without parsing pages."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def render_image(file_path: str,
+                 output_dir: str,
+                 sizes: Sequence[int],
+                 image_format: str,
+                 quality: int) -> Dict[int, str]:
+    """
+    Write every size of an image file.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale by 1/2, 1/4 or
+    1/8 during decoding instead of decoding full resolution and resizing.
+    """
+    largest = max(sizes)
+    with Image.open(file_path) as image:
+        if image.format == "JPEG":
+            image.draft("RGB", (largest, largest))
+        image.load()
+        return _save_sizes(image, output_dir, 0, sizes, image_format, quality)
+
+class ThumbnailEngine:
+    """Renders document thumbnails on a process pool.
+
+    PDF pages are split into ranges of pages_per_task and rendered in
+    parallel; each page is rasterized once and written at every configured
+    size. Rasterization is CPU bound and holds the GIL, so it runs in worker
+    processes and the calling event loop stays free to heartbeat.
+    """
+
+    def __init__(self,
+                 processes: int = THUMBNAIL_PROCESSES,
+                 sizes: Sequence[int] = THUMBNAIL_SIZES,
+                 image_format: str = THUMBNAIL_FORMAT,
+                 quality: int = THUMBNAIL_QUALITY,
+                 pages_per_task: int = THUMBNAIL_PAGES_PER_TASK):
+        """
+        Args:
+            processes (int): Size of the process pool (0 uses the available CPUs)
+            sizes (Sequence[int]): Longest-edge pixel sizes to produce
+            image_format (str): "webp" or "jpeg"
+            quality (int): Encoder quality, 1-100
+            pages_per_task (int): Pages rendered per pool task
+        """
+        if image_format not in _FORMATS:
+            raise ValueError(f"Unsupported thumbnail format: {image_format}")
+        if not sizes:
+            raise ValueError("At least one thumbnail size is required")
+        self.processes = processes or available_cpus()
+        self.sizes = sorted(set(sizes))
+        self.image_format = image_format
+        self.quality = quality
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn rather than fork: the worker process runs threads
+                # (Temporal, HTTP pools) that must not be forked mid-operation
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started thumbnail pool with {self.processes} processes")
+            return self._executor
+
+    async def render(self,
+                     file_path: str,
+                     output_dir: str,
+                     page_count: Optional[int] = None,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> List[Optional[Dict[int, str]]]:
+        """
+        Render thumbnails for a document.
+
+        Args:
+            file_path (str): PDF or image file
+            output_dir (str): Directory to write thumbnails to
+            page_count (Optional[int]): Number of pages, if already known
+            on_progress (Optional[Callable[[int, int], None]]): Called with
+                (completed_pages, page_count) as ranges finish
+
+        Returns:
+            List[Optional[Dict[int, str]]]: Thumbnail path by size for each
+                page, in page order; None for pages that failed to render
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+
+        if not file_path.lower().endswith('.pdf'):
+            paths = await loop.run_in_executor(
+                self.executor, render_image, file_path, output_dir, self.sizes, self.image_format, self.quality
+            )
+            if on_progress:
+                on_progress(1, 1)
+            return [paths]
+
+        if page_count is None:
+            page_count = await loop.run_in_executor(self.executor, count_pdf_pages, file_path)
+
+        # Spread small documents over every process, cap ranges for large ones
+        range_size = min(self.pages_per_task, max(1, math.ceil(page_count / self.processes)))
+        futures = {
+            start: loop.run_in_executor(
+                self.executor,
+                render_pdf_pages,
+                file_path,
+                start,
+                min(start + range_size, page_count),
+                output_dir,
+                self.sizes,
+                self.image_format,
+                self.quality
+            )
+            for start in range(0, page_count, range_size)
+        }
+
+        completed = 0
+        for future in asyncio.as_completed(futures.values()):
+            completed += len(await future)
+            if on_progress:
+                on_progress(completed, page_count)
+
+        return [paths for start in sorted(futures) for paths in futures[start].result()]
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+_engine: Optional[ThumbnailEngine] = None
+_engine_lock = threading.Lock()
+
+def get_thumbnail_engine() -> ThumbnailEngine:
+    """Return the process-wide thumbnail engine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ThumbnailEngine()
+        return _engine
@@ -0,0 +1,791 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from app.config import (
+    PINECONE_API_KEY,
+    PINECONE_ENVIRONMENT,
+    PINECONE_INDEX_NAME,
+    PINECONE_INDEX_HOST,
+    PINECONE_CLOUD,
+    EMBEDDING_DIMENSION,
+    VECTOR_STORE_BACKEND,
+    LOCAL_VECTOR_STORE_PATH,
+    LOCAL_VECTOR_STORE_MODE,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_SAVE_EVERY,
+    QUERY_MAX_IN_FLIGHT
+)
+from app.utils.logger import get_logger
+from app.utils.metrics import track_request
+
+logger = get_logger(__name__)
+
+class VectorStore(ABC):
+    """Backend-agnostic vector index used by IndexingService and SearchService.
+
+    Vectors are dicts with "id", "values" and "metadata". Query results are
+    dicts with "id", "score" (cosine similarity) and "metadata", best first.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        """Insert or overwrite vectors by id."""
+
+    @abstractmethod
+    def query(self,
+              vector: Sequence[float],
+              top_k: int,
+              include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return the top_k most similar vectors."""
+
+    def query_batch(self,
+                    vectors: Sequence[Sequence[float]],
+                    top_k: int,
+                    include_metadata: bool = True,
+                    filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Run several queries; backends that can batch them override this."""
+        return [self.query(vector, top_k, include_metadata=include_metadata, filter=filter) for vector in vectors]
+
+    @abstractmethod
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return stored vectors keyed by id; unknown ids are omitted."""
+
+    def score(self, vector: Sequence[float], ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Score vector against the stored vectors ids, as query results keyed by id.
+
+        Unknown ids are omitted. This fetches the vectors; backends that can
+        score without returning them override it.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scored = {}
+        for vector_id, record in self.fetch(ids).items():
+            values = np.asarray(record["values"], dtype=np.float32)
+            scored[vector_id] = {
+                "id": vector_id,
+                "score": float(values @ query / (np.linalg.norm(values) or 1.0)),
+                "metadata": record["metadata"]
+            }
+        return scored
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete vectors by id; unknown ids are ignored."""
+
+
+def ensure_pinecone_index(index_name: str = PINECONE_INDEX_NAME,
+                          dimension: int = EMBEDDING_DIMENSION,
+                          max_wait: int = 120) -> str:
+    """
+    Create the Pinecone index if it is missing and wait until it is ready.
+
+    Run once per deployment (scripts/init_pinecone.py) rather than by every
+    process that uses the index.
+
+    Args:
+        index_name (str): Pinecone index to check
+        dimension (int): Vector dimension used if the index has to be created
+        max_wait (int): Seconds to wait for the index to become ready
+
+    Returns:
+        str: Host of the index, usable as PINECONE_INDEX_HOST
+    """
+    from pinecone import Pinecone, ServerlessSpec
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+
+    if index_name not in pc.list_indexes().names():
+        logger.info(f"Creating index {index_name} in {PINECONE_CLOUD}/{PINECONE_ENVIRONMENT}")
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric='cosine',
+            spec=ServerlessSpec(
+                cloud=PINECONE_CLOUD,
+                region=PINECONE_ENVIRONMENT
+            )
+        )
+
+    start_time = time.time()
+    while True:
+        description = pc.describe_index(index_name)
+        if description.status and description.status.get('ready'):
+            logger.info(f"Index {index_name} is ready at {description.host}")
+            return description.host
+        if time.time() - start_time > max_wait:
+            raise TimeoutError(f"Index {index_name} did not become ready within {max_wait} seconds")
+        logger.info(f"Waiting for index to be ready. Status: {description.status}")
+        time.sleep(5)
+
+class PineconeVectorStore(VectorStore):
+    def __init__(self,
+                 index_name: str = PINECONE_INDEX_NAME,
+                 host: Optional[str] = PINECONE_INDEX_HOST):
+        """
+        Constructing the store makes no network calls, so it is cheap at
+        worker startup. The index must already exist (see
+        ensure_pinecone_index).
+
+        Args:
+            index_name (str): Pinecone index to use
+            host (Optional[str]): Host of the index; if unset it is looked up
+                with one describe_index call on first use
+        """
+        # Imported here so the local backend works without the Pinecone client
+        from pinecone import Pinecone
+        self.index_name = index_name
+        self.host = host
+        self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        self._index = None
+        self._lock = threading.Lock()
+        # Threads are only started by the first query_batch call
+        self._query_executor = ThreadPoolExecutor(max_workers=max(1, QUERY_MAX_IN_FLIGHT), thread_name_prefix="query")
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                if self.host:
+                    self._index = self.pc.Index(host=self.host)
+                else:
+                    with track_request("pinecone", "describe_index"):
+                        self._index = self.pc.Index(self.index_name)
+                logger.info(f"Connected to index {self.index_name}")
+            return self._index
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        with track_request("pinecone", "upsert"):
+            self.index.upsert(vectors=vectors)
+
+    def query(self,
+              vector: Sequence[float],
+              top_k: int,
+              include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        params = {
+            "vector": list(vector),
+            "top_k": top_k,
+            "include_metadata": include_metadata
+        }
+        if filter:
+            params["filter"] = filter
+        with track_request("pinecone", "query"):
+            results = self.index.query(**params)
+        return [
+            {"id": match.id, "score": match.score, "metadata": match.metadata or {}}
+            for match in results.matches
+        ]
+
+    def query_batch(self,
+                    vectors: Sequence[Sequence[float]],
+                    top_k: int,
+                    include_metadata: bool = True,
+                    filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        # Pinecone has no multi-vector query, so send the queries concurrently
+        return list(self._query_executor.map(
+            lambda vector: self.query(vector, top_k, include_metadata=include_metadata, filter=filter),
+            vectors
+        ))
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        with track_request("pinecone", "fetch"):
+            response = self.index.fetch(ids=list(ids))
+        return {
+            vector_id: {"id": vector_id, "values": vector.values, "metadata": vector.metadata or {}}
+            for vector_id, vector in response.vectors.items()
+        }
+
+    # Vector ids written by IndexingService end in the chunk's content key
+    _CHUNK_KEY_SUFFIX = re.compile(r"_([0-9a-f]{24}(?:-[0-9]+)?)$")
+
+    def score(self, vector: Sequence[float], ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # fetch returns full vectors, so score with a query filtered to the
+        # ids' chunk keys instead; ids it cannot cover fall back to fetch
+        chunk_keys = {}
+        for vector_id in ids:
+            match = self._CHUNK_KEY_SUFFIX.search(vector_id)
+            if match:
+                chunk_keys[vector_id] = match.group(1)
+
+        scored = {}
+        if chunk_keys:
+            keys = sorted(set(chunk_keys.values()))
+            # Identical chunks in other documents share a key, so leave room for them
+            matches = self.query(
+                vector,
+                top_k=min(4 * len(keys), 1000),
+                include_metadata=True,
+                filter={"chunk_id": {"$in": keys}}
+            )
+            wanted = set(ids)
+            scored = {match["id"]: match for match in matches if match["id"] in wanted}
+
+        missing = [vector_id for vector_id in ids if vector_id not in scored]
+        if missing:
+            scored.update(super().score(vector, missing))
+        return scored
+
+    def delete(self, ids: List[str]):
+        if ids:
+            with track_request("pinecone", "delete"):
+                self.index.delete(ids=list(ids))
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store for offline runs and benchmarks.
+
+    Vectors are L2-normalized and kept as float32 rows of a memory-mapped
+    file, so inner product equals cosine similarity. Ids and metadata live in
+    a SQLite sidecar. Two search modes are supported:
+
+    - "exact": brute-force top-k using blocked matrix products over the map
+    - "hnsw": approximate search with an hnswlib graph that is updated
+      incrementally on upsert/delete and saved next to the vectors every
+      hnsw_save_every changed rows and on close()
+
+    Intended for a single writer process; other processes reading the same
+    directory pick up committed changes on their next query. Every write
+    stamps its rows with a new version, so readers apply only the rows
+    changed since the version they last saw, and the saved graph records the
+    version it covers so a process opening it only adds the rows after that.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self,
+                 path: str,
+                 dimension: int = EMBEDDING_DIMENSION,
+                 mode: str = "exact",
+                 hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200,
+                 hnsw_ef_search: int = 64,
+                 hnsw_save_every: int = 10000,
+                 block_size: int = 65536):
+        """
+        Args:
+            path (str): Directory holding vectors.f32, meta.sqlite3 and hnsw.bin
+            dimension (int): Vector dimension
+            mode (str): "exact" or "hnsw"
+            hnsw_m (int): HNSW graph degree
+            hnsw_ef_construction (int): HNSW build-time candidate list size
+            hnsw_ef_search (int): HNSW query-time candidate list size
+            hnsw_save_every (int): Rows upserted or deleted between saves of
+                the HNSW graph
+            block_size (int): Rows scored per matrix product in exact mode
+        """
+        if mode not in ("exact", "hnsw"):
+            raise ValueError(f"Unknown local vector store mode: {mode}")
+
+        self.path = path
+        self.dimension = dimension
+        self.mode = mode
+        self.block_size = block_size
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.hnsw_save_every = max(1, hnsw_save_every)
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._hnsw_path = os.path.join(path, "hnsw.bin")
+
+        self._db = sqlite3.connect(os.path.join(path, "meta.sqlite3"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS vectors_version ON vectors (version);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('hnsw_version', 0)")
+        self._db.commit()
+
+        self._vectors = None
+        self._hnsw = None
+        self._unsaved = 0
+        self._data_version = None
+        self._load()
+        logger.info(f"Opened local vector store at {path} ({self._count} rows, {mode} mode)")
+
+    # -- storage management ------------------------------------------------
+
+    def _meta(self, key: str) -> int:
+        return self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _load(self):
+        """Load row count, live-row mask, vector map and HNSW graph from disk."""
+        # One read transaction, so the rows and versions are consistent
+        self._db.execute("BEGIN")
+        try:
+            self._version = self._meta("version")
+            self._count = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+            self._open_vectors(max(self.INITIAL_CAPACITY, self._count))
+
+            self._alive = np.zeros(self._capacity, dtype=bool)
+            live_rows = [row for (row,) in self._db.execute("SELECT row FROM vectors WHERE deleted = 0")]
+            self._alive[live_rows] = True
+
+            if self.mode == "hnsw":
+                self._load_hnsw()
+            self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._db.execute("COMMIT")
+        if self._unsaved:
+            self._save_hnsw()
+
+    def _refresh(self):
+        """Apply rows other connections have committed since we last looked."""
+        if self._db.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._catch_up()
+
+    def _catch_up(self):
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._db.execute(
+            "SELECT row, deleted, version FROM vectors WHERE version > ?", (self._version,)
+        ).fetchall()
+        if not changed:
+            return
+        count = max(self._count, max(row for row, _, _ in changed) + 1)
+        self._ensure_capacity(count)
+        self._count = count
+        for row, deleted, _ in changed:
+            self._alive[row] = not deleted
+        if self._hnsw is not None:
+            self._apply_to_hnsw([(row, deleted) for row, deleted, _ in changed])
+        self._version = max(self._version, max(version for _, _, version in changed))
+
+    def _open_vectors(self, capacity: int):
+        """Map the vector file with room for at least capacity rows."""
+        size = capacity * self.dimension * 4
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        existing_rows = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+        self._capacity = existing_rows
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(existing_rows, self.dimension))
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < rows_needed:
+            capacity *= 2
+        self._open_vectors(capacity)
+        alive = np.zeros(self._capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+        if self._hnsw is not None and self._hnsw.get_max_elements() < self._capacity:
+            self._hnsw.resize_index(self._capacity)
+
+    def _load_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("LOCAL_VECTOR_STORE_MODE=hnsw requires the hnswlib package") from e
+
+        self._hnsw = hnswlib.Index(space="ip", dim=self.dimension)
+        if os.path.exists(self._hnsw_path):
+            self._hnsw.load_index(self._hnsw_path, max_elements=self._capacity, allow_replace_deleted=False)
+            # Rows written since the graph was last saved
+            changed = self._db.execute(
+                "SELECT row, deleted FROM vectors WHERE version > ?", (self._meta("hnsw_version"),)
+            ).fetchall()
+            self._apply_to_hnsw(changed)
+            self._unsaved = len(changed)
+        else:
+            self._hnsw.init_index(
+                max_elements=self._capacity,
+                M=self.hnsw_m,
+                ef_construction=self.hnsw_ef_construction
+            )
+            # Rebuild from the vector map if the graph file is missing
+            live_rows = np.flatnonzero(self._alive[:self._count])
+            if len(live_rows):
+                self._hnsw.add_items(np.asarray(self._vectors[live_rows]), live_rows)
+                self._unsaved = len(live_rows)
+        self._hnsw.set_ef(self.hnsw_ef_search)
+
+    def _apply_to_hnsw(self, rows: Sequence[Tuple[int, int]]):
+        """Bring the graph in line with (row, deleted) pairs; vectors are read from the map."""
+        live_rows = []
+        for row, deleted in rows:
+            try:
+                if deleted:
+                    self._hnsw.mark_deleted(int(row))
+                else:
+                    # Rows deleted earlier and now written again
+                    self._hnsw.unmark_deleted(int(row))
+            except RuntimeError:
+                # Already in that state, or not in the graph yet
+                pass
+            if not deleted:
+                live_rows.append(int(row))
+        if live_rows:
+            self._hnsw.add_items(np.asarray(self._vectors[live_rows]), live_rows)
+
+    def _save_hnsw(self):
+        """Write the graph to disk along with the version it covers."""
+        with self._lock:
+            if self._hnsw is None:
+                return
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up()
+                temp_path = f"{self._hnsw_path}.tmp"
+                self._hnsw.save_index(temp_path)
+                os.replace(temp_path, self._hnsw_path)
+                cursor.execute("UPDATE meta SET value = ? WHERE key = 'hnsw_version'", (self._version,))
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            self._unsaved = 0
+            logger.info(f"Saved HNSW graph of {self.path} at version {self._version}")
+
+    def _changed(self, rows: int):
+        if self._hnsw is None:
+            return
+        self._unsaved += rows
+        if self._unsaved >= self.hnsw_save_every:
+            self._save_hnsw()
+
+    def close(self):
+        """Save unsaved graph changes and flush the vector map."""
+        with self._lock:
+            if self._unsaved:
+                self._save_hnsw()
+            if self._vectors is not None:
+                self._vectors.flush()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _rows_for_ids(self, ids: Sequence[str], include_deleted: bool = True) -> Dict[str, int]:
+        rows = {}
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            query = f"SELECT id, row FROM vectors WHERE id IN ({placeholders})"
+            if not include_deleted:
+                query += " AND deleted = 0"
+            rows.update(self._db.execute(query, part).fetchall())
+        return rows
+
+    # -- VectorStore interface ---------------------------------------------
+
+    def _next_version(self, cursor: sqlite3.Cursor) -> int:
+        version = self._meta("version") + 1
+        cursor.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version,))
+        return version
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        if not vectors:
+            return
+
+        # Last write wins for ids repeated within one call
+        by_id = {vector["id"]: vector for vector in vectors}
+        ids = list(by_id)
+        values = np.asarray([by_id[vector_id]["values"] for vector_id in ids], dtype=np.float32)
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {values.shape[1]}")
+        values = self._normalize(values)
+
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up()
+                version = self._next_version(cursor)
+                existing = self._rows_for_ids(ids)
+                rows = []
+                count = self._count
+                for vector_id in ids:
+                    if vector_id in existing:
+                        rows.append(existing[vector_id])
+                    else:
+                        rows.append(count)
+                        count += 1
+                rows = np.asarray(rows, dtype=np.int64)
+
+                self._ensure_capacity(count)
+                self._vectors[rows] = values
+                self._vectors.flush()
+
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO vectors (row, id, metadata, deleted, version) VALUES (?, ?, ?, 0, ?)",
+                    [
+                        (int(row), vector_id, json.dumps(by_id[vector_id].get("metadata") or {}), version)
+                        for row, vector_id in zip(rows, ids)
+                    ]
+                )
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            # Applies our rows like any other connection's
+            self._catch_up()
+            self._changed(len(rows))
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up()
+                rows = self._rows_for_ids(ids, include_deleted=False)
+                if not rows:
+                    cursor.execute("COMMIT")
+                    return
+                version = self._next_version(cursor)
+                cursor.executemany(
+                    "UPDATE vectors SET deleted = 1, version = ? WHERE row = ?",
+                    [(version, row) for row in rows.values()]
+                )
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            self._catch_up()
+            self._changed(len(rows))
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        with self._lock:
+            self._refresh()
+            results = {}
+            ids = list(ids)
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                for vector_id, row, metadata in self._db.execute(
+                    f"SELECT id, row, metadata FROM vectors WHERE id IN ({placeholders}) AND deleted = 0", part
+                ):
+                    results[vector_id] = {
+                        "id": vector_id,
+                        "values": self._vectors[row].tolist(),
+                        "metadata": json.loads(metadata)
+                    }
+            return results
+
+    def score(self, vector: Sequence[float], ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        query = self._normalize(np.atleast_2d(np.asarray(vector, dtype=np.float32)))[0]
+        with self._lock:
+            self._refresh()
+            records = []
+            ids = list(ids)
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                records.extend(self._db.execute(
+                    f"SELECT id, row, metadata FROM vectors WHERE id IN ({placeholders}) AND deleted = 0", part
+                ))
+            if not records:
+                return {}
+            # Stored vectors are normalized, so a dot product is the cosine
+            scores = np.asarray(self._vectors[[row for _, row, _ in records]]) @ query
+            return {
+                vector_id: {"id": vector_id, "score": float(score), "metadata": json.loads(metadata)}
+                for (vector_id, _, metadata), score in zip(records, scores)
+            }
+
+    def query(self,
+              vector: Sequence[float],
+              top_k: int,
+              include_metadata: bool = True,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.query_batch([vector], top_k, include_metadata=include_metadata, filter=filter)[0]
+
+    def query_batch(self,
+                    vectors: Sequence[Sequence[float]],
+                    top_k: int,
+                    include_metadata: bool = True,
+                    filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        queries = self._normalize(np.atleast_2d(np.asarray(vectors, dtype=np.float32)))
+
+        with self._lock:
+            self._refresh()
+            mask = self._alive[:self._count].copy()
+            if filter:
+                mask &= self._filter_mask(filter)
+
+            if self.mode == "hnsw":
+                rows, scores = self._search_hnsw(queries, top_k, mask, filtered=bool(filter))
+            else:
+                rows, scores = self._search_exact(queries, top_k, mask)
+
+            return self._build_matches(rows, scores, include_metadata)
+
+    # -- search internals --------------------------------------------------
+
+    def _search_exact(self, queries: np.ndarray, top_k: int, mask: np.ndarray):
+        """Blocked brute-force top-k: one (queries x block) matrix product per block."""
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+
+        for start in range(0, self._count, self.block_size):
+            end = min(start + self.block_size, self._count)
+            block_mask = mask[start:end]
+            if not block_mask.any():
+                continue
+            scores = queries @ np.asarray(self._vectors[start:end]).T
+            scores[:, ~block_mask] = -np.inf
+
+            k = min(top_k, end - start)
+            if k < end - start:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(end - start), (n_queries, end - start))
+
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _search_hnsw(self, queries: np.ndarray, top_k: int, mask: np.ndarray, filtered: bool):
+        available = int(mask.sum())
+        k = min(top_k, available)
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+
+        allowed = (lambda label: bool(mask[label])) if filtered else None
+        labels, distances = self._hnsw.knn_query(queries, k=k, filter=allowed)
+        # "ip" space returns 1 - inner product
+        return labels.astype(np.int64), 1.0 - distances
+
+    def _build_matches(self, rows: np.ndarray, scores: np.ndarray, include_metadata: bool) -> List[List[Dict[str, Any]]]:
+        valid_rows = sorted({int(row) for row, score in zip(rows.ravel(), scores.ravel()) if np.isfinite(score)})
+        records = {}
+        for i in range(0, len(valid_rows), 500):
+            part = valid_rows[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            for row, vector_id, metadata in self._db.execute(
+                f"SELECT row, id, metadata FROM vectors WHERE row IN ({placeholders})", part
+            ):
+                records[row] = (vector_id, metadata)
+
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            matches = []
+            for row, score in zip(query_rows, query_scores):
+                if not np.isfinite(score) or int(row) not in records:
+                    continue
+                vector_id, metadata = records[int(row)]
+                matches.append({
+                    "id": vector_id,
+                    "score": float(score),
+                    "metadata": json.loads(metadata) if include_metadata else {}
+                })
+            results.append(matches)
+        return results
+
+    _FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Evaluate a Pinecone-style equality/$in filter against row metadata."""
+        clauses, params = [], []
+        for field, condition in filter.items():
+            if not self._FIELD_PATTERN.match(field):
+                raise ValueError(f"Unsupported filter field: {field}")
+            expression = f"json_extract(metadata, '$.{field}')"
+            if isinstance(condition, dict):
+                if "$eq" in condition:
+                    clauses.append(f"{expression} = ?")
+                    params.append(condition["$eq"])
+                elif "$in" in condition:
+                    values = list(condition["$in"])
+                    clauses.append(f"{expression} IN ({','.join('?' * len(values))})" if values else "0")
+                    params.extend(values)
+                else:
+                    raise ValueError(f"Unsupported filter operator in {condition}")
+            else:
+                clauses.append(f"{expression} = ?")
+                params.append(condition)
+
+        mask = np.zeros(self._count, dtype=bool)
+        rows = [row for (row,) in self._db.execute(
+            f"SELECT row FROM vectors WHERE deleted = 0 AND {' AND '.join(clauses)}", params
+        )]
+        mask[rows] = True
+        return mask
+
+
+_local_stores: Dict[str, LocalVectorStore] = {}
+_stores_lock = threading.Lock()
+
+_pinecone_store: Optional[PineconeVectorStore] = None
+
+def get_vector_store() -> VectorStore:
+    """
+    Return the vector store selected by VECTOR_STORE_BACKEND.
+
+    Stores are shared within a process, so indexing and search reuse one
+    client and local stores see the same in-memory state.
+
+    Returns:
+        VectorStore: Configured backend
+    """
+    global _pinecone_store
+    if VECTOR_STORE_BACKEND == "local":
+        with _stores_lock:
+            store = _local_stores.get(LOCAL_VECTOR_STORE_PATH)
+            if store is None:
+                store = LocalVectorStore(
+                    LOCAL_VECTOR_STORE_PATH,
+                    dimension=EMBEDDING_DIMENSION,
+                    mode=LOCAL_VECTOR_STORE_MODE,
+                    hnsw_m=HNSW_M,
+                    hnsw_ef_construction=HNSW_EF_CONSTRUCTION,
+                    hnsw_ef_search=HNSW_EF_SEARCH,
+                    hnsw_save_every=HNSW_SAVE_EVERY
+                )
+                _local_stores[LOCAL_VECTOR_STORE_PATH] = store
+                atexit.register(store.close)
+            return store
+    if VECTOR_STORE_BACKEND == "pinecone":
+        with _stores_lock:
+            if _pinecone_store is None:
+                _pinecone_store = PineconeVectorStore()
+            return _pinecone_store
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
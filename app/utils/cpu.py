@@ -0,0 +1,46 @@
+import math
+import os
+from typing import Optional
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPU limit of the container's cgroup, or None if it is unlimited or unknown."""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: quota is -1 when unlimited
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process can actually use.
+
+    os.cpu_count() reports the host's CPUs even inside a container limited
+    to a few, so pools sized with it oversubscribe. This takes the smaller of
+    the scheduler affinity mask and the cgroup CPU quota, rounded up.
+
+    Returns:
+        int: At least 1
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
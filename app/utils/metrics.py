@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from temporalio import activity
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+from app.config import METRICS_PORT
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Activities run from milliseconds (probe) to many minutes (thumbnails of a
+# large document), so the buckets span both
+_ACTIVITY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ACTIVITY_DURATION = Histogram(
+    "rag_activity_duration_seconds",
+    "Duration of Temporal activity executions",
+    ["task_queue", "activity", "status"],
+    buckets=_ACTIVITY_BUCKETS
+)
+ACTIVITIES_IN_FLIGHT = Gauge(
+    "rag_activities_in_flight",
+    "Activities currently executing in this worker",
+    ["task_queue", "activity"]
+)
+PAGES = Counter("rag_pages_total", "Pages processed", ["activity", "status"])
+CHUNKS = Counter("rag_chunks_total", "Chunks produced or embedded", ["activity", "status"])
+VECTORS = Counter("rag_vectors_total", "Vectors upserted or deleted", ["activity", "operation"])
+TOKENS = Counter("rag_embedding_tokens_total", "Tokens billed for embeddings requests", ["model", "priority"])
+
+EXTERNAL_REQUEST_DURATION = Histogram(
+    "rag_external_request_duration_seconds",
+    "Latency of calls to external services, including failed calls",
+    ["service", "operation"],
+    buckets=_REQUEST_BUCKETS
+)
+EXTERNAL_REQUEST_ERRORS = Counter(
+    "rag_external_request_errors_total",
+    "Failed calls to external services by error code",
+    ["service", "operation", "code"]
+)
+
+SEARCH_DURATION = Histogram(
+    "rag_search_duration_seconds",
+    "Latency of search requests",
+    ["endpoint", "status"],
+    buckets=_REQUEST_BUCKETS
+)
+SEARCH_COALESCED = Counter(
+    "rag_search_coalesced_total",
+    "Search requests or query embeddings served by an identical call already in flight",
+    ["stage"]
+)
+
+def error_code(error: BaseException) -> str:
+    """HTTP status of a failed client call if it has one, otherwise the exception type."""
+    # openai uses status_code, the Pinecone and urllib3 clients use status
+    for attribute in ("status_code", "status"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return str(status)
+    return type(error).__name__
+
+@contextmanager
+def track_request(service: str, operation: str) -> Iterator[None]:
+    """
+    Record the latency of the enclosed call to an external service, and its
+    error code if it raises.
+
+    Args:
+        service (str): e.g. "openai" or "pinecone"
+        operation (str): e.g. "embeddings" or "upsert"
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        EXTERNAL_REQUEST_ERRORS.labels(service, operation, error_code(e)).inc()
+        raise
+    finally:
+        EXTERNAL_REQUEST_DURATION.labels(service, operation).observe(time.perf_counter() - started)
+
+class _ActivityMetrics(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        info = activity.info()
+        in_flight = ACTIVITIES_IN_FLIGHT.labels(info.task_queue, info.activity_type)
+        status = "error"
+        started = time.perf_counter()
+        in_flight.inc()
+        try:
+            result = await super().execute_activity(input)
+            status = "success"
+            return result
+        finally:
+            in_flight.dec()
+            ACTIVITY_DURATION.labels(info.task_queue, info.activity_type, status).observe(
+                time.perf_counter() - started
+            )
+
+class MetricsInterceptor(Interceptor):
+    """Worker interceptor recording duration and in-flight count of every activity."""
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ActivityMetrics(next)
+
+_server_started = False
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """
+    Serve this process's metrics at http://0.0.0.0:<port>/metrics.
+
+    Workers call this on startup; the API serves /metrics itself. Calling it
+    again is a no-op, and a port of 0 disables the server.
+    """
+    global _server_started
+    if not port:
+        return
+    with _server_lock:
+        if _server_started:
+            return
+        try:
+            start_http_server(port)
+        except OSError as e:
+            # Metrics are not worth failing the worker over
+            logger.warning(f"Could not serve metrics on port {port}: {str(e)}")
+            return
+        _server_started = True
+        logger.info(f"Serving metrics on port {port}")
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight call.
+    
+    The first caller for a key runs the coroutine; callers arriving while it
+    is still running await the same result (or exception) instead of
+    starting their own. Nothing is cached once the call finishes.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key unless a call for key is already in flight.
+        
+        Args:
+            key (Hashable): Identity of the call
+            fn (Callable[[], Awaitable[Any]]): Coroutine factory, only invoked
+                by the first caller
+            
+        Returns:
+            Any: Result of the shared call
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            # shield so one caller being cancelled does not cancel the others
+            return await asyncio.shield(future)
+        
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+    
+    def in_flight(self, key: Hashable) -> bool:
+        """Return True if a call for key is currently running."""
+        return key in self._calls
@@ -1,34 +1,110 @@
+import asyncio
+import hashlib
+import json
 import os
-import shutil
-from fastapi import UploadFile
-from app.config import STORAGE_PATH
+import tempfile
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+from app.config import (
+    STORAGE_PATH,
+    S3_BUCKET,
+    BLOB_STORE_BACKEND,
+    BLOB_STORE_PATH,
+    BLOB_STORE_S3_PREFIX
+)
 from app.utils.logger import get_logger
-import boto3
-from botocore.exceptions import ClientError
+
+# boto3 is imported where S3 is used and fastapi only for type checking, so
+# workers on the local blob backend load neither
+if TYPE_CHECKING:
+    from fastapi import UploadFile
 
 logger = get_logger()
 
 # Create storage directory if it doesn't exist
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
-def save_file(file: UploadFile) -> str:
+# Read size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_file(file: "UploadFile") -> Tuple[str, str]:
     """
-    Save uploaded file to local storage
+    Save uploaded file to local storage under its content hash
+    
+    The file is hashed with SHA-256 while it streams to a temporary file,
+    then moved to <sha256><ext>. Identical content uploaded under different
+    names therefore lands on the same path, and different content under the
+    same name no longer overwrites an earlier upload.
     
     Args:
         file (UploadFile): Uploaded file
         
     Returns:
-        str: Path where file was saved
+        Tuple[str, str]: Path where file was saved and its SHA-256 hex digest
     """
     try:
-        file_path = os.path.join(STORAGE_PATH, file.filename)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=STORAGE_PATH, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    buffer.write(chunk)
+            
+            content_hash = digest.hexdigest()
+            file_ext = os.path.splitext(file.filename or "")[1].lower()
+            file_path = os.path.join(STORAGE_PATH, f"{content_hash}{file_ext}")
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        logger.info(f"File saved successfully: {file_path} ({file.filename})")
+        return file_path, content_hash
+        
+    except Exception as e:
+        logger.error(f"Error saving file: {str(e)}")
+        raise
+
+async def save_upload(file: "UploadFile") -> Tuple[str, str]:
+    """
+    Stream an upload to content-addressed local storage without blocking the event loop
+    
+    Reads the request body in UPLOAD_CHUNK_SIZE pieces and hashes them as they
+    arrive. Disk writes run in a worker thread. The result is the same as
+    save_file.
+    
+    Args:
+        file (UploadFile): Uploaded file
+        
+    Returns:
+        Tuple[str, str]: Path where file was saved and its SHA-256 hex digest
+    """
+    try:
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=STORAGE_PATH, prefix=".upload-")
+        buffer = os.fdopen(fd, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+            await asyncio.to_thread(buffer.close)
+            
+            content_hash = digest.hexdigest()
+            file_ext = os.path.splitext(file.filename or "")[1].lower()
+            file_path = os.path.join(STORAGE_PATH, f"{content_hash}{file_ext}")
+            await asyncio.to_thread(os.replace, tmp_path, file_path)
+        except BaseException:
+            buffer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         
-        logger.info(f"File saved successfully: {file_path}")
-        return file_path
+        logger.info(f"File saved successfully: {file_path} ({file.filename})")
+        return file_path, content_hash
         
     except Exception as e:
         logger.error(f"Error saving file: {str(e)}")
@@ -36,6 +112,7 @@ def save_file(file: UploadFile) -> str:
 
 class StorageService:
     def __init__(self):
+        import boto3
         self.local_storage_path = STORAGE_PATH
         self.s3_client = boto3.client('s3')
     
@@ -51,6 +128,7 @@ class StorageService:
         Returns:
             bool: True if upload successful, False otherwise
         """
+        from botocore.exceptions import ClientError
         try:
             self.s3_client.upload_file(local_path, bucket, s3_key)
             logger.info(f"File uploaded to S3: s3://{bucket}/{s3_key}")
@@ -72,6 +150,7 @@ class StorageService:
         Returns:
             bool: True if download successful, False otherwise
         """
+        from botocore.exceptions import ClientError
         try:
             self.s3_client.download_file(bucket, s3_key, local_path)
             logger.info(f"File downloaded from S3: {local_path}")
@@ -79,4 +158,189 @@ class StorageService:
             
         except ClientError as e:
             logger.error(f"Error downloading from S3: {str(e)}")
-            return False 
\ No newline at end of file
+            return False 
+
+class BlobStore:
+    """Content-addressed store for intermediate pipeline data (claim checks).
+    
+    Workflow stages write page texts and chunk lists here and pass only the
+    returned reference through Temporal, keeping workflow history small.
+    Blobs are zlib-compressed JSON named by the SHA-256 of their compressed
+    bytes, so identical outputs are written once and a reference always
+    resolves to the same content. Blobs live on local disk (which must be
+    shared by all workers) or in S3.
+    
+    Because a blob may be shared by any workflow that produced the same
+    content, blobs are not deleted with the workflow that wrote them; writing
+    an existing blob refreshes its age, and sweep() removes blobs that have
+    not been written for a given time.
+    """
+    
+    REF_PREFIX = "sha256:"
+    
+    def __init__(self,
+                 backend: str = "local",
+                 path: str = BLOB_STORE_PATH,
+                 bucket: str = S3_BUCKET,
+                 prefix: str = BLOB_STORE_S3_PREFIX):
+        """
+        Args:
+            backend (str): "local" or "s3"
+            path (str): Root directory for the local backend
+            bucket (str): Bucket for the s3 backend
+            prefix (str): Key prefix for the s3 backend
+        """
+        if backend not in ("local", "s3"):
+            raise ValueError(f"Unknown blob store backend: {backend}")
+        self.backend = backend
+        self.path = path
+        self.bucket = bucket
+        self.prefix = prefix
+        self._s3_client = None
+        if backend == "local":
+            os.makedirs(path, exist_ok=True)
+    
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            import boto3
+            self._s3_client = boto3.client('s3')
+        return self._s3_client
+    
+    def _digest(self, ref: str) -> str:
+        if not ref.startswith(self.REF_PREFIX):
+            raise ValueError(f"Invalid blob reference: {ref}")
+        return ref[len(self.REF_PREFIX):]
+    
+    def _local_path(self, digest: str) -> str:
+        # Fan out into subdirectories so no single directory grows too large
+        return os.path.join(self.path, digest[:2], digest)
+    
+    def _s3_key(self, digest: str) -> str:
+        return f"{self.prefix}{digest[:2]}/{digest}"
+    
+    def put_bytes(self, data: bytes) -> str:
+        """
+        Store raw bytes
+        
+        Args:
+            data (bytes): Blob content
+            
+        Returns:
+            str: Reference to pass to get_bytes
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        
+        if self.backend == "s3":
+            self.s3_client.put_object(Bucket=self.bucket, Key=self._s3_key(digest), Body=data)
+        else:
+            blob_path = self._local_path(digest)
+            try:
+                # Refresh the age of an existing blob so sweep() keeps it
+                os.utime(blob_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix=".blob-")
+                try:
+                    with os.fdopen(fd, "wb") as buffer:
+                        buffer.write(data)
+                    os.replace(tmp_path, blob_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        
+        return f"{self.REF_PREFIX}{digest}"
+    
+    def get_bytes(self, ref: str) -> bytes:
+        """
+        Load raw bytes stored under ref
+        
+        Args:
+            ref (str): Reference returned by put_bytes
+            
+        Returns:
+            bytes: Blob content
+        """
+        digest = self._digest(ref)
+        if self.backend == "s3":
+            from botocore.exceptions import ClientError
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket, Key=self._s3_key(digest))
+            except ClientError as e:
+                raise FileNotFoundError(f"Blob {ref} not found: {str(e)}") from e
+            return response["Body"].read()
+        
+        with open(self._local_path(digest), "rb") as buffer:
+            return buffer.read()
+    
+    def put_json(self, value: Any) -> str:
+        """Serialize value as compressed JSON and store it; returns its reference."""
+        data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        return self.put_bytes(zlib.compress(data, 6))
+    
+    def get_json(self, ref: str) -> Any:
+        """Load a value stored with put_json."""
+        return json.loads(zlib.decompress(self.get_bytes(ref)))
+    
+    async def aput_json(self, value: Any) -> str:
+        """put_json without blocking the event loop."""
+        return await asyncio.to_thread(self.put_json, value)
+    
+    async def aget_json(self, ref: str) -> Any:
+        """get_json without blocking the event loop."""
+        return await asyncio.to_thread(self.get_json, ref)
+    
+    def sweep(self, max_age_seconds: float) -> int:
+        """
+        Delete blobs that have not been written for max_age_seconds
+        
+        max_age_seconds must exceed the longest time a workflow can take
+        between writing a blob and reading it back.
+        
+        Args:
+            max_age_seconds (float): Age after which a blob is deleted
+            
+        Returns:
+            int: Number of blobs deleted
+        """
+        cutoff = time.time() - max_age_seconds
+        deleted = 0
+        
+        if self.backend == "s3":
+            expired = []
+            paginator = self.s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+                for item in page.get("Contents", []):
+                    if item["LastModified"].timestamp() < cutoff:
+                        expired.append({"Key": item["Key"]})
+            # delete_objects accepts at most 1000 keys per call
+            for start in range(0, len(expired), 1000):
+                batch = expired[start:start + 1000]
+                self.s3_client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+                deleted += len(batch)
+            return deleted
+        
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            # Includes temporary files left behind by interrupted writes
+            for entry in os.scandir(directory.path):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store configured by BLOB_STORE_BACKEND."""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore(backend=BLOB_STORE_BACKEND)
+        return _blob_store
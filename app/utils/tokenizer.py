@@ -0,0 +1,103 @@
+import functools
+import math
+from typing import List, Sequence
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Characters per token assumed when tiktoken is unavailable (English text
+# averages about four characters per token for OpenAI encodings)
+APPROX_CHARS_PER_TOKEN = 4
+
+class Tokenizer:
+    """Token counting and token-to-character mapping for one model.
+
+    Uses the model's tiktoken encoding when available. Otherwise token counts
+    are estimated as one token per APPROX_CHARS_PER_TOKEN characters.
+    """
+
+    def __init__(self, encoding=None):
+        """
+        Args:
+            encoding (Optional[tiktoken.Encoding]): Encoding to use; None for
+                the character-based estimate
+        """
+        self.encoding = encoding
+
+    @property
+    def exact(self) -> bool:
+        """True if counts come from the model's real encoding."""
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text."""
+        if self.encoding is None:
+            return math.ceil(len(text) / APPROX_CHARS_PER_TOKEN)
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Number of tokens in each of texts."""
+        if self.encoding is None:
+            return [math.ceil(len(text) / APPROX_CHARS_PER_TOKEN) for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(list(texts))]
+
+    def char_limit(self, text: str, max_tokens: int) -> int:
+        """Length of the longest prefix of text that is at most max_tokens tokens."""
+        if self.encoding is None:
+            return min(len(text), max_tokens * APPROX_CHARS_PER_TOKEN)
+        tokens = self.encoding.encode_ordinary(text)
+        if len(tokens) <= max_tokens:
+            return len(text)
+        return self._prefix_chars(tokens[:max_tokens])
+
+    def tail_start(self, text: str, max_tokens: int) -> int:
+        """Offset where the longest suffix of text that is at most max_tokens tokens begins."""
+        if max_tokens <= 0:
+            return len(text)
+        if self.encoding is None:
+            return max(0, len(text) - max_tokens * APPROX_CHARS_PER_TOKEN)
+        tokens = self.encoding.encode_ordinary(text)
+        if len(tokens) <= max_tokens:
+            return 0
+        return self._prefix_chars(tokens[:len(tokens) - max_tokens])
+
+    def _prefix_chars(self, tokens: List[int]) -> int:
+        """Number of whole characters encoded by tokens.
+
+        A token boundary can fall inside a multi-byte character; such a
+        character is not counted.
+        """
+        return len(self.encoding.decode_bytes(tokens).decode("utf-8", errors="ignore"))
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(model: str) -> Tokenizer:
+    """
+    Return the tokenizer for model, loading its encoding once per process.
+
+    Falls back to the character-based estimate if tiktoken is not installed
+    or its encoding files cannot be loaded.
+
+    Args:
+        model (str): OpenAI model name
+
+    Returns:
+        Tokenizer: Shared tokenizer instance
+    """
+    try:
+        # Optional dependency; chunk sizing and request packing only need estimates
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, estimating token counts from text length")
+        return Tokenizer()
+
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}, estimating token counts: {str(e)}")
+        return Tokenizer()
+
+    logger.info(f"Loaded {encoding.name} tokenizer for {model}")
+    return Tokenizer(encoding)
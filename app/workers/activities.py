@@ -1,15 +1,16 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from temporalio import activity
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 @activity.defn(name="process_document_activity")
-async def process_document_activity(file_path: str) -> Dict[str, Any]:
+async def process_document_activity(file_path: str, doc_id: Optional[str] = None) -> Dict[str, Any]:
     """Process a document and return the results.
     
     Args:
         file_path (str): Path to the document to process
+        doc_id (Optional[str]): Re-index this document instead of creating a new one
         
     Returns:
         Dict[str, Any]: Processing results including status and any errors
@@ -21,9 +22,16 @@ async def process_document_activity(file_path: str) -> Dict[str, Any]:
     try:
         # Lazy import to avoid workflow sandbox issues
         from app.services.processing import process_document
+        from app.utils.metrics import CHUNKS, VECTORS
         
         # Process document using the processing service
-        result = await process_document(file_path, workflow_id)
+        result = await process_document(file_path, workflow_id, doc_id=doc_id)
+        CHUNKS.labels("process_document_activity", "new").inc(result["embedded_chunks"])
+        CHUNKS.labels("process_document_activity", "unchanged").inc(
+            result["metadata"]["chunk_count"] - result["embedded_chunks"]
+        )
+        VECTORS.labels("process_document_activity", "upsert").inc(result["embedded_chunks"])
+        VECTORS.labels("process_document_activity", "delete").inc(result["deleted_chunks"])
         return {
             "status": "success",
             "file_path": file_path,
@@ -1,70 +1,157 @@
-from typing import Dict, Any, List
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 import os
-from PIL import Image
+import time
 import pdfplumber
+from PIL import Image
 from temporalio import activity
-from app.services.chunking import split_into_chunks
-from app.services.embeddings import EmbeddingService
-from app.services.indexing import IndexingService
+from app.config import (
+    BLOB_STORE_SWEEP_INTERVAL_MINUTES,
+    BLOB_STORE_TTL_HOURS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_PAGE_ALIGNED,
+    OCR_ENABLED,
+    OCR_MIN_PAGE_CHARS,
+    OPENAI_EMBEDDING_MODEL
+)
+from app.services.chunking import iter_page_chunks
+from app.services.pdf_parser import extract_page_range, probe_pdf
+from app.services.thumbnails import get_thumbnail_engine
+from app.services.manifest import ChunkKeys, get_chunk_manifest
 from app.utils.logger import get_logger
+from app.utils.metrics import CHUNKS, PAGES, VECTORS
+from app.utils.storage import get_blob_store
+from app.utils.tokenizer import get_tokenizer
 
 logger = get_logger(__name__)
-embedding_service = EmbeddingService()
-indexing_service = IndexingService()
+
+def _probe(file_path: str) -> Dict[str, Any]:
+    if file_path.lower().endswith('.pdf'):
+        return probe_pdf(file_path)
+    # Image.open reads only the header
+    with Image.open(file_path) as img:
+        return {
+            "page_count": 1,
+            "metadata": {"format": img.format, "width": img.width, "height": img.height}
+        }
+
+@activity.defn
+async def probe_document_activity(file_path: str) -> Dict[str, Any]:
+    """Read a document's page count and metadata without parsing or rendering pages."""
+    try:
+        info = activity.info()
+        workflow_id = info.workflow_id
+        
+        probe = await asyncio.to_thread(_probe, file_path)
+        
+        logger.info(f"[{workflow_id}] Probed {file_path}: {probe['page_count']} pages")
+        return {"status": "success", **probe}
+        
+    except Exception as e:
+        logger.error(f"Error probing document {file_path}: {str(e)}")
+        raise
 
 @activity.defn
 async def generate_thumbnails_activity(file_path: str) -> Dict[str, Any]:
-    """Generate thumbnails for each page of a document."""
+    """Generate thumbnails at every configured size for each page of a document.
+    
+    Pages are rendered on the thumbnail engine's process pool. Progress is
+    reported as heartbeats so long documents are not mistaken for a stuck
+    activity.
+    """
     try:
         info = activity.info()
         workflow_id = info.workflow_id
         logger.info(f"[{workflow_id}] Generating thumbnails for {file_path}")
         
-        # Create thumbnails directory if it doesn't exist
         thumbnails_dir = os.path.join("assets", "thumbnails", workflow_id)
-        os.makedirs(thumbnails_dir, exist_ok=True)
+        engine = get_thumbnail_engine()
         
-        thumbnail_paths = []
-        page_count = 0
+        def on_progress(completed_pages: int, page_count: int):
+            activity.heartbeat({"completed_pages": completed_pages, "page_count": page_count})
         
-        if file_path.lower().endswith('.pdf'):
-            with pdfplumber.open(file_path) as pdf:
-                page_count = len(pdf.pages)
-                for i, page in enumerate(pdf.pages):
-                    # Convert page to image with specific resolution
-                    img = page.to_image(resolution=72)
-                    # Generate thumbnail path
-                    thumb_path = os.path.join(thumbnails_dir, f"page_{i+1}.png")
-                    # Save thumbnail (pdfplumber's to_image already handles DPI)
-                    img.save(thumb_path, format="PNG")
-                    thumbnail_paths.append(thumb_path)
-                    logger.info(f"[{workflow_id}] Generated thumbnail for page {i+1}")
-        else:
-            # Handle image files
-            with Image.open(file_path) as img:
-                page_count = 1
-                thumb_path = os.path.join(thumbnails_dir, "page_1.png")
-                
-                # Calculate thumbnail size while maintaining aspect ratio
-                max_size = (300, 300)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # For regular images, we can set DPI directly
-                img.save(thumb_path, format="PNG", dpi=(72, 72))
-                thumbnail_paths.append(thumb_path)
-                logger.info(f"[{workflow_id}] Generated thumbnail for image")
-        
-        logger.info(f"[{workflow_id}] Successfully generated {len(thumbnail_paths)} thumbnails")
+        page_paths = await engine.render(file_path, thumbnails_dir, on_progress=on_progress)
+        
+        failed_pages = [page_num for page_num, paths in enumerate(page_paths) if paths is None]
+        if failed_pages:
+            logger.warning(f"[{workflow_id}] Could not render {len(failed_pages)} pages: {failed_pages}")
+        
+        logger.info(f"[{workflow_id}] Successfully generated thumbnails for {len(page_paths) - len(failed_pages)} pages")
+        PAGES.labels("generate_thumbnails_activity", "success").inc(len(page_paths) - len(failed_pages))
+        PAGES.labels("generate_thumbnails_activity", "error").inc(len(failed_pages))
+        largest = max(engine.sizes)
         return {
             "status": "success",
-            "page_count": page_count,
-            "thumbnail_paths": thumbnail_paths
+            "page_count": len(page_paths),
+            "thumbnail_sizes": engine.sizes,
+            # Largest size per page; other sizes sit next to it as page_<n>_<size>.<ext>
+            "thumbnail_paths": [paths[largest] for paths in page_paths if paths is not None],
+            "failed_pages": failed_pages
         }
         
     except Exception as e:
         logger.error(f"Error generating thumbnails: {str(e)}")
         raise
 
+@asynccontextmanager
+async def _heartbeating(interval: float = 30) -> AsyncIterator[None]:
+    """Heartbeat every interval seconds while the block runs.
+    
+    Covers work that reports no progress of its own, like blocking parsing
+    in a thread or pages queued behind other activities for the OCR pool.
+    """
+    async def beat():
+        while True:
+            activity.heartbeat()
+            await asyncio.sleep(interval)
+    
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+async def _ocr_fallback(file_path: str, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """OCR pages with little or no extractable text, e.g. scans without a text layer.
+    
+    The OCR result replaces a page's text only if it is longer. OCR runs on
+    the OCR engine's process pool and heartbeats its progress.
+    """
+    scanned = [
+        page["page_num"] for page in pages
+        if len((page.get("text") or "").strip()) < OCR_MIN_PAGE_CHARS
+    ]
+    if not OCR_ENABLED or not scanned:
+        return pages
+    
+    # Imported lazily so workers that never OCR don't load OpenCV and Tesseract
+    from app.services.ocr import get_ocr_engine
+    engine = get_ocr_engine()
+    
+    if file_path.lower().endswith('.pdf'):
+        def on_progress(completed_pages: int, total_pages: int):
+            activity.heartbeat({"ocr_completed_pages": completed_pages, "ocr_pages": total_pages})
+        
+        texts = await engine.ocr_pdf_pages(file_path, scanned, on_progress=on_progress)
+    else:
+        texts = {0: await engine.ocr_image(file_path)} if 0 in scanned else {}
+    
+    for page in pages:
+        text = texts.get(page["page_num"])
+        if text and len(text) > len((page.get("text") or "").strip()):
+            page.pop("error", None)
+            page.update(status="success", text=text, ocr=True)
+    return pages
+
+def _extract_page(file_path: str, page_num: int) -> Tuple[Optional[str], int]:
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+        if page_num < page_count:
+            return pdf.pages[page_num].extract_text(), page_count
+        return None, page_count
+
 @activity.defn
 async def parse_page_activity(file_path: str, page_num: int) -> Dict[str, Any]:
     """Parse a single page from a document."""
@@ -73,18 +160,19 @@ async def parse_page_activity(file_path: str, page_num: int) -> Dict[str, Any]:
         workflow_id = info.workflow_id
         logger.info(f"[{workflow_id}] Parsing page {page_num} from {file_path}")
         
+        text = None
+        page_count = 1
         if file_path.lower().endswith('.pdf'):
-            with pdfplumber.open(file_path) as pdf:
-                if page_num < len(pdf.pages):
-                    page = pdf.pages[page_num]
-                    text = page.extract_text()
-                    if text:
-                        return {
-                            "status": "success",
-                            "page_num": page_num,
-                            "text": text
-                        }
+            text, page_count = await asyncio.to_thread(_extract_page, file_path, page_num)
+        
+        if page_num < page_count:
+            page = {"status": "success", "page_num": page_num, "text": text}
+            page = (await _ocr_fallback(file_path, [page]))[0]
+            if page.get("text"):
+                PAGES.labels("parse_page_activity", "success").inc()
+                return page
         
+        PAGES.labels("parse_page_activity", "error").inc()
         return {
             "status": "error",
             "page_num": page_num,
@@ -96,24 +184,152 @@ async def parse_page_activity(file_path: str, page_num: int) -> Dict[str, Any]:
         raise
 
 @activity.defn
-async def chunk_text_activity(texts: List[str], doc_id: str) -> Dict[str, Any]:
-    """Split texts into chunks for processing."""
+async def parse_page_range_activity(file_path: str, start_page: int, end_page: int) -> Dict[str, Any]:
+    """Parse pages [start_page, end_page) of a document in one activity call.
+    
+    Page texts are written to the blob store; the result carries only the
+    per-page status and a reference to the texts.
+    """
+    try:
+        info = activity.info()
+        workflow_id = info.workflow_id
+        logger.info(f"[{workflow_id}] Parsing pages {start_page}-{end_page - 1} from {file_path}")
+        
+        async with _heartbeating():
+            if file_path.lower().endswith('.pdf'):
+                # pdfplumber is blocking; parsing in a thread keeps the event loop
+                # free for the worker's other activity slots and heartbeats
+                pages = await asyncio.to_thread(extract_page_range, file_path, start_page, end_page)
+            else:
+                pages = [
+                    {
+                        "status": "error",
+                        "page_num": page_num,
+                        "error": "No text extracted or invalid page number"
+                    }
+                    for page_num in range(start_page, end_page)
+                ]
+            
+            # Pages without a usable text layer (scans, images) are OCRed,
+            # with a heartbeat per finished page
+            pages = await _ocr_fallback(file_path, pages)
+        
+        # One entry per page in the range, None where no text was extracted
+        texts = [page.get("text") if page["status"] == "success" else None for page in pages]
+        text_ref = await get_blob_store().aput_json(texts)
+        
+        parsed = sum(1 for text in texts if text is not None)
+        PAGES.labels("parse_page_range_activity", "success").inc(parsed)
+        PAGES.labels("parse_page_range_activity", "error").inc(len(pages) - parsed)
+        
+        return {
+            "status": "success",
+            "start_page": start_page,
+            "end_page": end_page,
+            "text_ref": text_ref,
+            "pages": [{key: value for key, value in page.items() if key != "text"} for page in pages]
+        }
+        
+    except Exception as e:
+        logger.error(f"Error parsing pages {start_page}-{end_page - 1}: {str(e)}")
+        raise
+
+def _chunk_pages(text_refs: List[str], doc_id: str, batch_size: int, page_aligned: bool) -> Dict[str, Any]:
+    """Stream page texts from the blob store through the chunker, storing new chunks in batches.
+    
+    Chunks whose content key is already in the document's manifest are
+    indexed and skipped; manifest keys that no longer occur are returned as
+    stale.
+    """
+    blob_store = get_blob_store()
+    indexed = get_chunk_manifest().get(doc_id)
+    
+    def page_texts() -> Iterator[str]:
+        # Load one parsed page range at a time
+        for text_ref in text_refs:
+            yield from (text for text in blob_store.get_json(text_ref) if text)
+    
+    def chunk_texts() -> Iterator[str]:
+        return iter_page_chunks(
+            page_texts(),
+            chunk_size=CHUNK_MAX_TOKENS,
+            overlap=CHUNK_OVERLAP_TOKENS,
+            tokenizer=get_tokenizer(OPENAI_EMBEDDING_MODEL),
+            page_aligned=page_aligned
+        )
+    
+    def store(texts: List[str], keys: List[str], start_index: int) -> Dict[str, Any]:
+        return {
+            "ref": blob_store.put_json({"texts": texts, "keys": keys}),
+            "start_index": start_index,
+            "count": len(texts)
+        }
+    
+    batches = []
+    texts, keys = [], []
+    seen = set()
+    chunk_count = 0
+    new_count = 0
+    chunk_keys = ChunkKeys()
+    for chunk in chunk_texts():
+        chunk_key = chunk_keys.key(chunk)
+        seen.add(chunk_key)
+        chunk_count += 1
+        if chunk_key in indexed:
+            continue
+        texts.append(chunk)
+        keys.append(chunk_key)
+        if len(texts) == batch_size:
+            batches.append(store(texts, keys, new_count))
+            new_count += len(texts)
+            texts, keys = [], []
+    if texts:
+        batches.append(store(texts, keys, new_count))
+        new_count += len(texts)
+    
+    stale = sorted(indexed - seen)
+    return {
+        "batches": batches,
+        "chunk_count": chunk_count,
+        "new_count": new_count,
+        "stale_ref": blob_store.put_json(stale) if stale else None,
+        "stale_count": len(stale)
+    }
+
+@activity.defn
+async def chunk_text_activity(text_refs: List[str],
+                              doc_id: str,
+                              batch_size: int = 100,
+                              page_aligned: bool = CHUNK_PAGE_ALIGNED) -> Dict[str, Any]:
+    """Split page texts into chunks for processing.
+    
+    text_refs are blob references written by parse_page_range_activity, in
+    page order. Chunks not yet indexed for doc_id are written back to the
+    blob store in batches of batch_size, one batch per embed_chunks_activity
+    call; chunks indexed by an earlier run are skipped.
+    """
     try:
         info = activity.info()
         workflow_id = info.workflow_id
         logger.info(f"[{workflow_id}] Chunking text for document {doc_id}")
         
-        # Combine texts with page breaks
-        combined_text = "\n\n".join(texts)
+        # Pages are chunked as they are read, so memory does not grow with
+        # document size; blob I/O and chunking run off the event loop
+        result = await asyncio.to_thread(_chunk_pages, text_refs, doc_id, max(1, batch_size), page_aligned)
         
-        # Split into chunks
-        chunks = split_into_chunks(combined_text, chunk_size=1000, overlap=200)
+        reused = result["chunk_count"] - result["new_count"]
+        CHUNKS.labels("chunk_text_activity", "new").inc(result["new_count"])
+        CHUNKS.labels("chunk_text_activity", "unchanged").inc(reused)
+        if reused or result["stale_count"]:
+            logger.info(
+                f"[{workflow_id}] Re-indexing {doc_id}: {result['new_count']} new chunks, "
+                f"{reused} unchanged, {result['stale_count']} stale"
+            )
         
         return {
             "status": "success",
             "doc_id": doc_id,
-            "chunks": chunks,
-            "chunk_count": len(chunks)
+            **result
         }
         
     except Exception as e:
@@ -121,43 +337,110 @@ async def chunk_text_activity(texts: List[str], doc_id: str) -> Dict[str, Any]:
         raise
 
 @activity.defn
-async def embed_chunks_activity(chunks: List[str], doc_id: str) -> Dict[str, Any]:
-    """Generate embeddings for a batch of chunks and index them."""
+async def embed_chunks_activity(chunks_ref: str, doc_id: str, start_index: int = 0) -> Dict[str, Any]:
+    """Generate embeddings for a batch of chunks and index them.
+    
+    chunks_ref is a blob reference written by chunk_text_activity, and
+    start_index is the position of its first chunk among the chunks being
+    indexed in this run.
+    """
     try:
+        # Imported on first use so only embedding workers load the OpenAI and
+        # vector store clients
+        from app.services.embeddings import get_embedding_service
+        from app.services.indexing import get_indexing_service
+        embedding_service = get_embedding_service()
+        indexing_service = get_indexing_service()
+        
         info = activity.info()
         workflow_id = info.workflow_id
+        batch = await get_blob_store().aget_json(chunks_ref)
+        chunks = batch["texts"]
         logger.info(f"[{workflow_id}] Embedding {len(chunks)} chunks for document {doc_id}")
         
         # Generate embeddings
-        embeddings = embedding_service.generate_embeddings(chunks)
-        
-        # Prepare chunks with embeddings for indexing
-        embedded_chunks = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            embedded_chunks.append({
-                "chunk_id": f"{doc_id}_{i}",
-                "text": chunk,
-                "embedding": embedding,
-                "metadata": {
-                    "doc_id": doc_id,
-                    "chunk_index": i
-                }
-            })
-        
-        # Index the chunks
-        indexing_service.index_document(
+        embeddings = await embedding_service.agenerate_embeddings(chunks)
+        
+        # Index the chunks off the event loop; upserts block on the network
+        await asyncio.to_thread(
+            indexing_service.index_document,
             doc_id=doc_id,
             chunks=chunks,
             embeddings=embeddings,
-            metadata={"doc_id": doc_id}
+            metadata={"doc_id": doc_id},
+            chunk_keys=batch["keys"]
         )
+        CHUNKS.labels("embed_chunks_activity", "embedded").inc(len(embeddings))
+        VECTORS.labels("embed_chunks_activity", "upsert").inc(len(embeddings))
+        
+        cache_stats = embedding_service.cache_stats()
+        if cache_stats:
+            logger.info(
+                f"[{workflow_id}] Embedding cache: {cache_stats['hits']} hits, "
+                f"{cache_stats['misses']} misses, ~{cache_stats['saved_tokens']} tokens saved"
+            )
         
+        # Only counts go back to the workflow; vectors are already indexed and
+        # would otherwise be stored in workflow history
         return {
             "status": "success",
             "doc_id": doc_id,
-            "embedded_chunks": embedded_chunks
+            "start_index": start_index,
+            "chunk_count": len(embeddings)
         }
         
     except Exception as e:
         logger.error(f"Error embedding chunks: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
+
+@activity.defn
+async def delete_stale_chunks_activity(stale_ref: str, doc_id: str) -> Dict[str, Any]:
+    """Remove chunks of a previous version of a document from every index.
+    
+    stale_ref is a blob reference to the chunk keys chunk_text_activity
+    found in the manifest but not in the new version.
+    """
+    try:
+        from app.services.indexing import get_indexing_service
+        indexing_service = get_indexing_service()
+        
+        info = activity.info()
+        workflow_id = info.workflow_id
+        chunk_keys = await get_blob_store().aget_json(stale_ref)
+        logger.info(f"[{workflow_id}] Deleting {len(chunk_keys)} stale chunks of document {doc_id}")
+        
+        await asyncio.to_thread(indexing_service.delete_chunks, doc_id, chunk_keys)
+        VECTORS.labels("delete_stale_chunks_activity", "delete").inc(len(chunk_keys))
+        
+        return {"status": "success", "doc_id": doc_id, "deleted_count": len(chunk_keys)}
+        
+    except Exception as e:
+        logger.error(f"Error deleting stale chunks: {str(e)}")
+        raise
+
+# Monotonic time of this worker's last blob sweep
+_last_blob_sweep: Optional[float] = None
+
+@activity.defn
+async def sweep_blobs_activity() -> Dict[str, Any]:
+    """Delete intermediate blobs that have not been written for BLOB_STORE_TTL_HOURS.
+    
+    Runs at the end of every intake workflow but scans the blob store at most
+    once per BLOB_STORE_SWEEP_INTERVAL_MINUTES on each worker.
+    """
+    global _last_blob_sweep
+    now = time.monotonic()
+    if BLOB_STORE_TTL_HOURS <= 0 or (
+        _last_blob_sweep is not None and now - _last_blob_sweep < BLOB_STORE_SWEEP_INTERVAL_MINUTES * 60
+    ):
+        return {"status": "skipped", "deleted": 0}
+    _last_blob_sweep = now
+    
+    try:
+        deleted = await asyncio.to_thread(get_blob_store().sweep, BLOB_STORE_TTL_HOURS * 3600)
+        if deleted:
+            logger.info(f"Deleted {deleted} blobs older than {BLOB_STORE_TTL_HOURS}h")
+        return {"status": "success", "deleted": deleted}
+    except Exception as e:
+        logger.error(f"Error sweeping blob store: {str(e)}")
+        raise
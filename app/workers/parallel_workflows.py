@@ -1,7 +1,10 @@
-from typing import Dict, Any, List
+import asyncio
+import math
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import timedelta
 from temporalio import workflow
 from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError
 
 # Define task queues
 THUMBNAIL_QUEUE = "thumbnail-generation"
@@ -9,81 +12,128 @@ PARSING_QUEUE = "page-parsing"
 CHUNKING_QUEUE = "text-chunking"
 EMBEDDING_QUEUE = "chunk-embedding"
 
+# Defaults for the tunables that can be passed to DocumentIntakeWorkflow.run.
+# Workflows cannot read the environment, so callers resolve these from
+# app.config and pass them in as the `options` argument.
+DEFAULT_INTAKE_OPTIONS: Dict[str, Any] = {
+    # Maximum number of parse activities in flight at once
+    "parse_max_in_flight": 20,
+    # Bounds on the number of pages parsed by one parse_page_range_activity
+    "parse_min_pages_per_range": 2,
+    "parse_max_pages_per_range": 25,
+    # Maximum number of embed activities in flight at once, and chunks per call
+    "embed_max_in_flight": 12,
+    "embed_chunks_per_activity": 100,
+    # Restart chunking at every page so edits only change their own pages' chunks
+    "chunk_page_aligned": True,
+    # Document to (re-)index; defaults to the workflow id. Re-using the doc_id
+    # of an indexed document only embeds chunks its manifest lacks and
+    # deletes the ones that are gone.
+    "doc_id": None,
+}
+
+ACTIVITY_RETRY_POLICY = RetryPolicy(
+    initial_interval=timedelta(seconds=5),
+    maximum_interval=timedelta(minutes=1),
+    maximum_attempts=3
+)
+
 @workflow.defn
 class DocumentIntakeWorkflow:
+    def __init__(self):
+        # Per-stage progress, exposed through the "progress" query
+        self._progress: Dict[str, Dict[str, Any]] = {
+            "thumbnails": {"status": "pending"},
+            "parsing": {"status": "pending", "total_pages": 0, "completed_pages": 0, "failed_pages": 0},
+            "chunking": {"status": "pending", "chunk_count": 0, "new_chunks": 0, "stale_chunks": 0},
+            "embedding": {"status": "pending", "total_chunks": 0, "completed_chunks": 0},
+        }
+    
+    @workflow.query
+    def progress(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-stage progress of the running workflow."""
+        return self._progress
+    
     @workflow.run
-    async def run(self, file_path: str) -> Dict[str, Any]:
+    async def run(self, file_path: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Main workflow that orchestrates the document processing pipeline."""
         workflow.logger.info(f"Starting document intake workflow for {file_path}")
+        options = {**DEFAULT_INTAKE_OPTIONS, **(options or {})}
+        
+        thumbnail_task: Optional[asyncio.Task] = None
         
         try:
-            # Step 1: Generate thumbnails for all pages
-            thumbnail_result = await workflow.execute_activity(
-                "generate_thumbnails_activity",
+            # Step 1: Read the page count without parsing or rendering any pages
+            probe = await workflow.execute_activity(
+                "probe_document_activity",
                 args=[file_path],
-                start_to_close_timeout=timedelta(minutes=5),
-                retry_policy=RetryPolicy(
-                    initial_interval=timedelta(seconds=5),
-                    maximum_interval=timedelta(minutes=1),
-                    maximum_attempts=3
-                ),
-                task_queue=THUMBNAIL_QUEUE
+                start_to_close_timeout=timedelta(minutes=1),
+                retry_policy=ACTIVITY_RETRY_POLICY,
+                task_queue=PARSING_QUEUE
             )
+            page_count = probe["page_count"]
+            
+            # Thumbnails are not needed for search, so they render alongside
+            # parse -> chunk -> embed instead of ahead of it
+            thumbnail_task = asyncio.create_task(self._generate_thumbnails(file_path))
             
             # Step 2: Process pages in parallel
-            page_count = thumbnail_result["page_count"]
-            page_results = []
+            self._progress["parsing"].update(status="running", total_pages=page_count)
+            page_results, text_refs = await self._parse_pages(file_path, page_count, options)
+            self._progress["parsing"]["status"] = "completed"
             
-            for page_num in range(page_count):
-                result = await workflow.execute_activity(
-                    "parse_page_activity",
-                    args=[file_path, page_num],
-                    start_to_close_timeout=timedelta(minutes=5),
-                    retry_policy=RetryPolicy(
-                        initial_interval=timedelta(seconds=5),
-                        maximum_interval=timedelta(minutes=1),
-                        maximum_attempts=3
-                    ),
-                    task_queue=PARSING_QUEUE
-                )
-                page_results.append(result)
+            failed_pages = [result["page_num"] for result in page_results if result["status"] != "success"]
+            if failed_pages:
+                workflow.logger.warning(f"{len(failed_pages)} of {page_count} pages produced no text: {failed_pages}")
             
-            # Step 3: Chunk the extracted text
-            texts = [result["text"] for result in page_results if result["status"] == "success"]
-            doc_id = workflow.info().workflow_id
+            # Step 3: Chunk the extracted text. Page texts and chunks stay in the
+            # blob store; only references pass through workflow history.
+            doc_id = options["doc_id"] or workflow.info().workflow_id
             
+            self._progress["chunking"]["status"] = "running"
             chunk_results = await workflow.execute_activity(
                 "chunk_text_activity",
-                args=[texts, doc_id],
+                args=[text_refs, doc_id, options["embed_chunks_per_activity"], options["chunk_page_aligned"]],
                 start_to_close_timeout=timedelta(minutes=5),
-                retry_policy=RetryPolicy(
-                    initial_interval=timedelta(seconds=5),
-                    maximum_interval=timedelta(minutes=1),
-                    maximum_attempts=3
-                ),
+                retry_policy=ACTIVITY_RETRY_POLICY,
                 task_queue=CHUNKING_QUEUE
             )
             
             # Step 4: Process chunks in parallel batches for embedding
-            batch_size = 100
-            chunks = chunk_results["chunks"]
-            total_chunks = len(chunks)
-            embedded_chunks = []
+            chunk_count = chunk_results["chunk_count"]
+            self._progress["chunking"].update(
+                status="completed",
+                chunk_count=chunk_count,
+                new_chunks=chunk_results["new_count"],
+                stale_chunks=chunk_results["stale_count"]
+            )
+            self._progress["embedding"].update(status="running", total_chunks=chunk_results["new_count"])
+            embedded_count = await self._embed_chunks(chunk_results["batches"], doc_id, options)
             
-            for i in range(0, total_chunks, batch_size):
-                batch = chunks[i:min(i + batch_size, total_chunks)]
-                result = await workflow.execute_activity(
-                    "embed_chunks_activity",
-                    args=[batch, doc_id],
+            # Step 5: Drop chunks of the previous version only once the new
+            # ones are searchable. Chunks of pages that failed to parse look
+            # stale too, so nothing is deleted unless every page parsed.
+            deleted_count = 0
+            if chunk_results["stale_ref"] and failed_pages:
+                workflow.logger.warning(
+                    f"Keeping {chunk_results['stale_count']} possibly stale chunks of {doc_id}: "
+                    f"{len(failed_pages)} pages failed to parse"
+                )
+            elif chunk_results["stale_ref"]:
+                await workflow.execute_activity(
+                    "delete_stale_chunks_activity",
+                    args=[chunk_results["stale_ref"], doc_id],
                     start_to_close_timeout=timedelta(minutes=5),
-                    retry_policy=RetryPolicy(
-                        initial_interval=timedelta(seconds=5),
-                        maximum_interval=timedelta(minutes=1),
-                        maximum_attempts=3
-                    ),
+                    retry_policy=ACTIVITY_RETRY_POLICY,
                     task_queue=EMBEDDING_QUEUE
                 )
-                embedded_chunks.extend(result["embedded_chunks"])
+                deleted_count = chunk_results["stale_count"]
+            self._progress["embedding"]["status"] = "completed"
+            
+            # Step 6: Expire intermediate blobs left by earlier documents
+            await self._sweep_blobs()
+            
+            thumbnail_result = await thumbnail_task
             
             return {
                 "status": "success",
@@ -91,15 +141,151 @@ class DocumentIntakeWorkflow:
                 "metadata": {
                     "file_path": file_path,
                     "page_count": page_count,
-                    "thumbnail_paths": thumbnail_result["thumbnail_paths"],
-                    "chunk_count": len(embedded_chunks),
+                    "document_info": probe["metadata"],
+                    "failed_pages": failed_pages,
+                    "thumbnail_paths": thumbnail_result["thumbnail_paths"] if thumbnail_result else [],
+                    "chunk_count": chunk_count,
+                    "embedded_chunks": embedded_count,
+                    "deleted_chunks": deleted_count,
                     "processing_status": "completed"
                 }
             }
             
         except Exception as e:
             workflow.logger.error(f"Workflow execution failed: {str(e)}")
+            if thumbnail_task is not None:
+                thumbnail_task.cancel()
+            for stage in self._progress.values():
+                if stage["status"] == "running":
+                    stage["status"] = "failed"
             return {
                 "status": "error",
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+    
+    async def _generate_thumbnails(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Render thumbnails; a failure is recorded in progress but does not fail the document."""
+        self._progress["thumbnails"]["status"] = "running"
+        try:
+            result = await workflow.execute_activity(
+                "generate_thumbnails_activity",
+                args=[file_path],
+                # Large documents take a while; heartbeats detect a stuck worker
+                start_to_close_timeout=timedelta(hours=1),
+                heartbeat_timeout=timedelta(minutes=2),
+                retry_policy=ACTIVITY_RETRY_POLICY,
+                task_queue=THUMBNAIL_QUEUE
+            )
+        except ActivityError as e:
+            workflow.logger.warning(f"Thumbnail generation failed: {str(e.cause or e)}")
+            self._progress["thumbnails"]["status"] = "failed"
+            return None
+        self._progress["thumbnails"]["status"] = "completed"
+        return result
+    
+    async def _sweep_blobs(self) -> None:
+        """Sweep the blob store; a failure only delays cleanup and does not fail the document."""
+        try:
+            await workflow.execute_activity(
+                "sweep_blobs_activity",
+                start_to_close_timeout=timedelta(minutes=30),
+                retry_policy=ACTIVITY_RETRY_POLICY,
+                task_queue=CHUNKING_QUEUE
+            )
+        except ActivityError as e:
+            workflow.logger.warning(f"Blob store sweep failed: {str(e.cause or e)}")
+    
+    @staticmethod
+    def _page_ranges(page_count: int, options: Dict[str, Any]) -> List[Tuple[int, int]]:
+        """Split [0, page_count) into ranges sized to fill the parse window.
+        
+        Range size is page_count / parse_max_in_flight clamped to the
+        configured bounds, so small documents still fan out while large ones
+        amortize the cost of opening the file over many pages.
+        """
+        range_size = math.ceil(page_count / max(1, options["parse_max_in_flight"]))
+        range_size = max(options["parse_min_pages_per_range"], range_size)
+        range_size = max(1, min(options["parse_max_pages_per_range"], range_size))
+        return [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+    
+    async def _parse_pages(self,
+                           file_path: str,
+                           page_count: int,
+                           options: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Fan out page-range parsing with a bounded number of activities in flight.
+        
+        A range whose activity still fails after retries is reported as
+        per-page error results instead of failing the whole document.
+        
+        Returns:
+            Tuple[List[Dict[str, Any]], List[str]]: One status per page, in
+                page order, and the blob references of the parsed ranges'
+                texts, in page order
+        """
+        semaphore = asyncio.Semaphore(max(1, options["parse_max_in_flight"]))
+        
+        async def parse_range(start_page: int, end_page: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+            async with semaphore:
+                try:
+                    result = await workflow.execute_activity(
+                        "parse_page_range_activity",
+                        args=[file_path, start_page, end_page],
+                        # Scanned ranges are OCRed in the same activity and can
+                        # wait on the OCR pool; heartbeats catch a lost worker
+                        start_to_close_timeout=timedelta(minutes=30),
+                        heartbeat_timeout=timedelta(minutes=2),
+                        retry_policy=ACTIVITY_RETRY_POLICY,
+                        task_queue=PARSING_QUEUE
+                    )
+                    pages = result["pages"]
+                    text_ref = result["text_ref"]
+                except ActivityError as e:
+                    workflow.logger.warning(f"Parsing pages {start_page}-{end_page - 1} failed: {str(e.cause or e)}")
+                    pages = [
+                        {
+                            "status": "error",
+                            "page_num": page_num,
+                            "error": str(e.cause or e)
+                        }
+                        for page_num in range(start_page, end_page)
+                    ]
+                    text_ref = None
+                parsing = self._progress["parsing"]
+                parsing["completed_pages"] += len(pages)
+                parsing["failed_pages"] += sum(1 for page in pages if page["status"] != "success")
+                return pages, text_ref
+        
+        ranges = self._page_ranges(page_count, options)
+        workflow.logger.info(f"Parsing {page_count} pages in {len(ranges)} ranges")
+        
+        # gather preserves argument order, so results come back in page order
+        range_results = await asyncio.gather(*(parse_range(start, end) for start, end in ranges))
+        pages = [page for range_pages, _ in range_results for page in range_pages]
+        text_refs = [text_ref for _, text_ref in range_results if text_ref is not None]
+        return pages, text_refs
+    
+    async def _embed_chunks(self, batches: List[Dict[str, Any]], doc_id: str, options: Dict[str, Any]) -> int:
+        """Dispatch embedding batches concurrently with a bounded number in flight.
+        
+        Args:
+            batches (List[Dict[str, Any]]): Chunk batch references from chunk_text_activity
+        
+        Returns:
+            int: Number of chunks embedded and indexed
+        """
+        semaphore = asyncio.Semaphore(max(1, options["embed_max_in_flight"]))
+        
+        async def embed_batch(batch: Dict[str, Any]) -> int:
+            async with semaphore:
+                result = await workflow.execute_activity(
+                    "embed_chunks_activity",
+                    args=[batch["ref"], doc_id, batch["start_index"]],
+                    start_to_close_timeout=timedelta(minutes=5),
+                    retry_policy=ACTIVITY_RETRY_POLICY,
+                    task_queue=EMBEDDING_QUEUE
+                )
+                self._progress["embedding"]["completed_chunks"] += result["chunk_count"]
+                return result["chunk_count"]
+        
+        batch_counts = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return sum(batch_counts)
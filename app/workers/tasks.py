@@ -1,7 +1,17 @@
 import asyncio
-from temporalio.client import Client
-from temporalio.worker import Worker
-from app.config import TEMPORAL_HOST
+from typing import Any, Dict, List, Optional, Sequence, Set
+from temporalio.client import Client, WorkflowExecutionStatus, WorkflowHandle
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from temporalio.worker import Interceptor, Worker
+from app.config import (
+    TEMPORAL_HOST,
+    PARSE_MAX_IN_FLIGHT,
+    PARSE_MIN_PAGES_PER_RANGE,
+    PARSE_MAX_PAGES_PER_RANGE,
+    EMBED_MAX_IN_FLIGHT,
+    EMBED_CHUNKS_PER_ACTIVITY,
+    CHUNK_PAGE_ALIGNED,
+)
 from app.workers.workflows import DocumentProcessingWorkflow
 from app.workers.parallel_workflows import (
     DocumentIntakeWorkflow,
@@ -11,160 +21,315 @@ from app.workers.parallel_workflows import (
     EMBEDDING_QUEUE,
 )
 from app.workers.activities import process_document_activity
+from app.workers.codec import DATA_CONVERTER
 from app.workers.parallel_activities import (
     generate_thumbnails_activity,
+    probe_document_activity,
     parse_page_activity,
+    parse_page_range_activity,
     chunk_text_activity,
-    embed_chunks_activity
+    embed_chunks_activity,
+    delete_stale_chunks_activity,
+    sweep_blobs_activity
 )
+from app.services.registry import DocumentRegistry
 from app.utils.logger import get_logger
+from app.utils.metrics import MetricsInterceptor, start_metrics_server
+from app.utils.singleflight import SingleFlight
 
 logger = get_logger(__name__)
 
 # Define processing queue
 PROCESSING_QUEUE = "document-processing"
 
-async def start_parsing_task(file_path: str, use_parallel: bool = True):
-    """Start a document processing workflow"""
-    client = await Client.connect(TEMPORAL_HOST)
+def intake_options() -> dict:
+    """Resolve DocumentIntakeWorkflow tunables from the environment."""
+    return {
+        "parse_max_in_flight": PARSE_MAX_IN_FLIGHT,
+        "parse_min_pages_per_range": PARSE_MIN_PAGES_PER_RANGE,
+        "parse_max_pages_per_range": PARSE_MAX_PAGES_PER_RANGE,
+        "embed_max_in_flight": EMBED_MAX_IN_FLIGHT,
+        "embed_chunks_per_activity": EMBED_CHUNKS_PER_ACTIVITY,
+        "chunk_page_aligned": CHUNK_PAGE_ALIGNED,
+    }
+
+# Collapses concurrent submissions of the same content within this process
+_ingest_flights = SingleFlight()
+
+# Shared Temporal client, created once per process
+_client: Optional[Client] = None
+_client_lock = asyncio.Lock()
+
+# Background tasks recording finished workflows in the registry
+_finalizers: Set[asyncio.Task] = set()
+
+async def get_temporal_client() -> Client:
+    """Return the process-wide Temporal client, connecting on first use."""
+    global _client
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                _client = await Client.connect(TEMPORAL_HOST, data_converter=DATA_CONVERTER)
+                logger.info(f"Connected to Temporal at {TEMPORAL_HOST}")
+    return _client
+
+async def submit_parsing_task(file_path: str,
+                              use_parallel: bool = True,
+                              content_hash: Optional[str] = None,
+                              doc_id: Optional[str] = None) -> WorkflowHandle:
+    """Start a document processing workflow and return without waiting for it
+    
+    When content_hash is given it is used as the workflow id, so concurrent
+    submissions of the same bytes from any API replica attach to the one
+    running workflow instead of starting another.
+    
+    When doc_id is given the file is indexed as a new version of that
+    document: only chunks not already indexed for it are embedded, and its
+    chunks that no longer occur are deleted. doc_id is then part of the
+    workflow id, so only re-indexes of the same document share a workflow.
+    """
+    client = await get_temporal_client()
+    workflow_key = content_hash or file_path
+    if doc_id is not None:
+        workflow_key = f"{doc_id}-{workflow_key}"
     
     if use_parallel:
         # Start the parallel workflow
-        handle = await client.start_workflow(
-            DocumentIntakeWorkflow.run,
-            args=[file_path],
-            id=f"doc-intake-{file_path}",
-            task_queue=PROCESSING_QUEUE
-        )
+        workflow_id = f"doc-intake-{workflow_key}"
+        workflow_run = DocumentIntakeWorkflow.run
+        args = [file_path, {**intake_options(), "doc_id": doc_id}]
     else:
         # Start the original workflow
-        handle = await client.start_workflow(
-            DocumentProcessingWorkflow.run,
-            args=[file_path],
-            id=f"doc-processing-{file_path}",
+        workflow_id = f"doc-processing-{workflow_key}"
+        workflow_run = DocumentProcessingWorkflow.run
+        args = [file_path, doc_id]
+    
+    try:
+        return await client.start_workflow(
+            workflow_run,
+            args=args,
+            id=workflow_id,
             task_queue=PROCESSING_QUEUE
         )
+    except WorkflowAlreadyStartedError:
+        logger.info(f"Workflow {workflow_id} already running, attaching to it")
+        return client.get_workflow_handle(workflow_id)
+
+async def start_parsing_task(file_path: str,
+                             use_parallel: bool = True,
+                             content_hash: Optional[str] = None,
+                             doc_id: Optional[str] = None):
+    """Start a document processing workflow and wait for its result"""
+    handle = await submit_parsing_task(file_path, use_parallel=use_parallel, content_hash=content_hash, doc_id=doc_id)
     
     # Wait for result
     result = await handle.result()
     logger.info(f"Document processing completed: {result}")
     return result
 
-async def run_processing_worker():
-    """Run the main document processing worker"""
-    client = await Client.connect(TEMPORAL_HOST)
-    worker = Worker(
+def _record_result(registry: DocumentRegistry, content_hash: str, result: Dict[str, Any]):
+    if result.get("status") == "success":
+        registry.mark_completed(content_hash, result["doc_id"], result)
+    else:
+        registry.mark_failed(content_hash, result.get("error", "unknown error"))
+
+async def _finalize_job(handle: WorkflowHandle, registry: DocumentRegistry, content_hash: str):
+    """Wait for a submitted workflow in the background and record its outcome."""
+    try:
+        _record_result(registry, content_hash, await handle.result())
+    except Exception as e:
+        logger.error(f"Ingestion job {handle.id} failed: {str(e)}")
+        registry.mark_failed(content_hash, str(e))
+
+async def submit_document(file_path: str,
+                          content_hash: str,
+                          registry: DocumentRegistry,
+                          original_name: Optional[str] = None,
+                          use_parallel: bool = True,
+                          doc_id: Optional[str] = None) -> Dict[str, Any]:
+    """Submit an uploaded file for ingestion unless its content is already indexed.
+    
+    Returns as soon as the workflow has been started; progress is available
+    from get_job_status using the returned job id.
+    
+    Args:
+        file_path (str): Content-addressed path of the stored upload
+        content_hash (str): SHA-256 of the file contents
+        registry (DocumentRegistry): Registry mapping content hashes to doc ids
+        original_name (Optional[str]): Filename the client uploaded
+        use_parallel (bool): Use DocumentIntakeWorkflow rather than the
+            single-activity workflow
+        doc_id (Optional[str]): Re-index the file as a new version of this
+            document instead of creating a new one
+        
+    Returns:
+        Dict[str, Any]: job_id, doc_id (once known) and whether the content
+            was a duplicate of an already indexed document
+    """
+    # A re-index always runs: the document may have been changed since these
+    # bytes were indexed, and unchanged chunks are skipped anyway
+    record = registry.get(content_hash)
+    if record and record["status"] == "completed" and doc_id is None:
+        logger.info(f"Content {content_hash} already indexed as {record['doc_id']}, skipping ingestion")
+        return {"job_id": record["workflow_id"], "doc_id": record["doc_id"], "duplicate": True}
+    
+    async def submit() -> str:
+        handle = await submit_parsing_task(
+            file_path, use_parallel=use_parallel, content_hash=content_hash, doc_id=doc_id
+        )
+        registry.mark_processing(content_hash, file_path, original_name, workflow_id=handle.id)
+        task = asyncio.create_task(_finalize_job(handle, registry, content_hash))
+        _finalizers.add(task)
+        task.add_done_callback(_finalizers.discard)
+        return handle.id
+    
+    # Only submissions for the same document may share a workflow
+    job_id = await _ingest_flights.do((content_hash, doc_id), submit)
+    return {"job_id": job_id, "doc_id": doc_id, "duplicate": False}
+
+async def ingest_document(file_path: str,
+                          content_hash: str,
+                          registry: DocumentRegistry,
+                          original_name: Optional[str] = None,
+                          use_parallel: bool = True,
+                          doc_id: Optional[str] = None) -> Dict[str, Any]:
+    """Ingest an uploaded file and wait for the workflow result.
+    
+    Same as submit_document, but blocks until ingestion finishes.
+    
+    Returns:
+        Dict[str, Any]: Workflow result, with "duplicate" set when the content
+            was already indexed
+    """
+    record = registry.get(content_hash)
+    if record and record["status"] == "completed" and doc_id is None:
+        logger.info(f"Content {content_hash} already indexed as {record['doc_id']}, skipping ingestion")
+        return {**(record["result"] or {}), "doc_id": record["doc_id"], "duplicate": True}
+    
+    submission = await submit_document(
+        file_path, content_hash, registry, original_name=original_name, use_parallel=use_parallel, doc_id=doc_id
+    )
+    client = await get_temporal_client()
+    result = await client.get_workflow_handle(submission["job_id"]).result()
+    _record_result(registry, content_hash, result)
+    return {**result, "duplicate": False}
+
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    """Report the state and per-stage progress of an ingestion job.
+    
+    Args:
+        job_id (str): Workflow id returned by submit_document
+        
+    Returns:
+        Dict[str, Any]: Workflow status, stage progress and, once finished,
+            the workflow result
+    """
+    client = await get_temporal_client()
+    handle = client.get_workflow_handle(job_id)
+    description = await handle.describe()
+    status = description.status.name.lower() if description.status else "unknown"
+    
+    job = {"job_id": job_id, "status": status, "stages": {}}
+    try:
+        job["stages"] = await handle.query("progress")
+    except Exception as e:
+        logger.warning(f"Could not query progress for job {job_id}: {str(e)}")
+    
+    if description.status == WorkflowExecutionStatus.COMPLETED:
+        job["result"] = await handle.result()
+        # Workflows catch their errors and complete with an error result
+        if job["result"].get("status") != "success":
+            job["status"] = "failed"
+    return job
+
+# Worker configuration per task queue. The run_*_worker entry points,
+# run_all_workers and the benchmark all build their workers from it.
+WORKER_OPTIONS: Dict[str, Dict[str, Any]] = {
+    PROCESSING_QUEUE: {
+        "workflows": [DocumentProcessingWorkflow, DocumentIntakeWorkflow],
+        "activities": [process_document_activity],
+        "max_concurrent_workflow_tasks": 5,
+        "max_concurrent_activities": 10,
+        "max_cached_workflows": 5,
+        "debug_mode": True
+    },
+    THUMBNAIL_QUEUE: {
+        "activities": [generate_thumbnails_activity],
+        "max_concurrent_activities": 5
+    },
+    PARSING_QUEUE: {
+        "activities": [probe_document_activity, parse_page_activity, parse_page_range_activity],
+        "max_concurrent_activities": 20
+    },
+    CHUNKING_QUEUE: {
+        "activities": [chunk_text_activity, sweep_blobs_activity],
+        "max_concurrent_activities": 10
+    },
+    EMBEDDING_QUEUE: {
+        "activities": [embed_chunks_activity, delete_stale_chunks_activity],
+        "max_concurrent_activities": 15
+    }
+}
+
+def create_worker(client: Client, task_queue: str, interceptors: Sequence[Interceptor] = ()) -> Worker:
+    """Create the worker for task_queue as configured in WORKER_OPTIONS.
+    
+    Args:
+        client (Client): Temporal client the worker polls through
+        task_queue (str): One of the queues in WORKER_OPTIONS
+        interceptors (Sequence[Interceptor]): Worker interceptors, e.g. for
+            instrumentation
+    """
+    return Worker(
         client,
-        task_queue=PROCESSING_QUEUE,
-        workflows=[DocumentProcessingWorkflow, DocumentIntakeWorkflow],
-        activities=[process_document_activity],
-        max_concurrent_workflow_tasks=5,
-        max_concurrent_activities=10,
-        max_cached_workflows=5,
-        debug_mode=True
+        task_queue=task_queue,
+        interceptors=list(interceptors),
+        **WORKER_OPTIONS[task_queue]
     )
-    logger.info(f"Starting processing worker on task queue {PROCESSING_QUEUE}")
+
+def create_workers(client: Client, interceptors: Sequence[Interceptor] = ()) -> List[Worker]:
+    """Create one worker per task queue, all sharing client.
+    
+    Args:
+        client (Client): Temporal client the workers poll through
+        interceptors (Sequence[Interceptor]): Worker interceptors, e.g. for
+            instrumentation
+    """
+    return [create_worker(client, task_queue, interceptors) for task_queue in WORKER_OPTIONS]
+
+async def _run_worker(task_queue: str, name: str):
+    start_metrics_server()
+    client = await get_temporal_client()
+    worker = create_worker(client, task_queue, interceptors=[MetricsInterceptor()])
+    logger.info(f"Starting {name} worker on task queue {task_queue}")
     await worker.run()
 
+async def run_processing_worker():
+    """Run the main document processing worker"""
+    await _run_worker(PROCESSING_QUEUE, "processing")
+
 async def run_thumbnail_worker():
     """Run the thumbnail generation worker"""
-    client = await Client.connect(TEMPORAL_HOST)
-    worker = Worker(
-        client,
-        task_queue=THUMBNAIL_QUEUE,
-        activities=[generate_thumbnails_activity],
-        max_concurrent_activities=5
-    )
-    logger.info(f"Starting thumbnail worker on task queue {THUMBNAIL_QUEUE}")
-    await worker.run()
+    await _run_worker(THUMBNAIL_QUEUE, "thumbnail")
 
 async def run_parsing_worker():
     """Run the page parsing worker"""
-    client = await Client.connect(TEMPORAL_HOST)
-    worker = Worker(
-        client,
-        task_queue=PARSING_QUEUE,
-        activities=[parse_page_activity],
-        max_concurrent_activities=20
-    )
-    logger.info(f"Starting parsing worker on task queue {PARSING_QUEUE}")
-    await worker.run()
+    await _run_worker(PARSING_QUEUE, "parsing")
 
 async def run_chunking_worker():
     """Run the text chunking worker"""
-    client = await Client.connect(TEMPORAL_HOST)
-    worker = Worker(
-        client,
-        task_queue=CHUNKING_QUEUE,
-        activities=[chunk_text_activity],
-        max_concurrent_activities=10
-    )
-    logger.info(f"Starting chunking worker on task queue {CHUNKING_QUEUE}")
-    await worker.run()
+    await _run_worker(CHUNKING_QUEUE, "chunking")
 
 async def run_embedding_worker():
     """Run the chunk embedding worker"""
-    client = await Client.connect(TEMPORAL_HOST)
-    worker = Worker(
-        client,
-        task_queue=EMBEDDING_QUEUE,
-        activities=[embed_chunks_activity],
-        max_concurrent_activities=15
-    )
-    logger.info(f"Starting embedding worker on task queue {EMBEDDING_QUEUE}")
-    await worker.run()
+    await _run_worker(EMBEDDING_QUEUE, "embedding")
 
 async def run_all_workers():
     """Run all workers concurrently"""
-    client = await Client.connect(TEMPORAL_HOST)
-    
-    # Create all workers
-    workflow_worker = Worker(
-        client,
-        task_queue=PROCESSING_QUEUE,
-        workflows=[DocumentProcessingWorkflow, DocumentIntakeWorkflow],
-        activities=[],
-        max_concurrent_workflow_tasks=5,
-        max_cached_workflows=5,
-        debug_mode=True
-    )
-    
-    thumbnail_worker = Worker(
-        client,
-        task_queue=THUMBNAIL_QUEUE,
-        activities=[generate_thumbnails_activity],
-        max_concurrent_activities=5
-    )
-    
-    parsing_worker = Worker(
-        client,
-        task_queue=PARSING_QUEUE,
-        activities=[parse_page_activity],
-        max_concurrent_activities=20
-    )
-    
-    chunking_worker = Worker(
-        client,
-        task_queue=CHUNKING_QUEUE,
-        activities=[chunk_text_activity],
-        max_concurrent_activities=10
-    )
-    
-    embedding_worker = Worker(
-        client,
-        task_queue=EMBEDDING_QUEUE,
-        activities=[embed_chunks_activity],
-        max_concurrent_activities=15
-    )
-    
-    # Run all workers concurrently
-    await asyncio.gather(
-        workflow_worker.run(),
-        thumbnail_worker.run(),
-        parsing_worker.run(),
-        chunking_worker.run(),
-        embedding_worker.run()
-    )
+    start_metrics_server()
+    client = await get_temporal_client()
+    workers = create_workers(client, interceptors=[MetricsInterceptor()])
+    await asyncio.gather(*(worker.run() for worker in workers))
 
 def start_all_workers():
     """Start all workers in the same process for development"""
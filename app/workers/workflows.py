@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import timedelta
 from temporalio import workflow
 from temporalio.common import RetryPolicy
@@ -8,14 +8,23 @@ TASK_QUEUE_NAME = "document-processing"
 
 @workflow.defn
 class DocumentProcessingWorkflow:
+    def __init__(self):
+        self._progress: Dict[str, Dict[str, Any]] = {"processing": {"status": "pending"}}
+    
+    @workflow.query
+    def progress(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-stage progress of the running workflow."""
+        return self._progress
+    
     @workflow.run
-    async def run(self, file_path: str) -> Dict[str, Any]:
+    async def run(self, file_path: str, doc_id: Optional[str] = None) -> Dict[str, Any]:
         workflow.logger.info(f"Starting document processing workflow for {file_path}")
         
         try:
+            self._progress["processing"]["status"] = "running"
             result = await workflow.execute_activity(
                 process_document_activity,
-                args=[file_path],
+                args=[file_path, doc_id],
                 start_to_close_timeout=timedelta(minutes=5),
                 retry_policy=RetryPolicy(
                     initial_interval=timedelta(seconds=5),
@@ -26,6 +35,7 @@ class DocumentProcessingWorkflow:
                 task_queue=TASK_QUEUE_NAME
             )
             
+            self._progress["processing"]["status"] = "completed" if result["status"] == "success" else "failed"
             if result["status"] == "success":
                 workflow.logger.info(
                     f"Document processing completed successfully. "
@@ -39,6 +49,7 @@ class DocumentProcessingWorkflow:
             
         except Exception as e:
             workflow.logger.error(f"Workflow execution failed: {str(e)}")
+            self._progress["processing"]["status"] = "failed"
             return {
                 "status": "error",
                 "error": str(e)
@@ -3,11 +3,11 @@
 # Create a directory for logs if it doesn't exist
 mkdir -p logs
 
-# Function to start a worker
+# Function to start a worker; each gets its own Prometheus metrics port
 start_worker() {
     worker_type=$1
-    echo "Starting $worker_type worker..."
-    python -m app.runners.${worker_type}_worker > logs/${worker_type}.log 2>&1 &
+    echo "Starting $worker_type worker (metrics on port $2)..."
+    METRICS_PORT=$2 python -m app.runners.${worker_type}_worker > logs/${worker_type}.log 2>&1 &
     echo $! > logs/${worker_type}.pid
     echo "$worker_type worker started with PID $(cat logs/${worker_type}.pid)"
 }
@@ -33,14 +33,17 @@ trap stop_workers EXIT
 # Ensure PYTHONPATH includes the app directory
 export PYTHONPATH=$PYTHONPATH:$(pwd)
 
+# Create the vector index once up front; workers don't check it at startup
+python -m app.runners.bootstrap || exit 1
+
 echo "Starting development workers..."
 
 # Start each worker type
-start_worker "workflow"
-start_worker "thumbnail"
-start_worker "parsing"
-start_worker "chunking"
-start_worker "embedding"
+start_worker "workflow" 9101
+start_worker "thumbnail" 9102
+start_worker "parsing" 9103
+start_worker "chunking" 9104
+start_worker "embedding" 9105
 
 echo "All workers started. Logs are being written to the logs directory."
 echo "Press Ctrl+C to stop all workers."
@@ -0,0 +1,424 @@
+"""Offline ingestion benchmark.
+
+Runs DocumentIntakeWorkflow and DocumentProcessingWorkflow end to end on
+Temporal's local test server with in-process workers, a deterministic fake
+OpenAI embeddings endpoint and the local vector store, so no API keys or
+services are needed. Documents are the PDFs in assets/ plus synthetic
+documents of the requested page counts.
+
+Reports per-stage throughput, p50/p99 latency per activity and per workflow,
+and peak RSS as JSON, for comparing runs across commits:
+
+    python scripts/benchmark_ingest.py --synthetic-pages 200 500 --output bench.json
+
+The Temporal test server binary is downloaded on first use unless
+--temporal-server points at an existing `temporal` CLI.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+# Activities whose results are counted toward a stage's throughput:
+# activity type -> (stage, unit, units in one result)
+STAGE_UNITS: Dict[str, Tuple[str, str, Callable[[Dict[str, Any]], int]]] = {
+    "generate_thumbnails_activity": ("thumbnails", "pages", lambda result: result["page_count"]),
+    "parse_page_range_activity": ("parse", "pages", lambda result: len(result["pages"])),
+    "chunk_text_activity": ("chunk", "chunks", lambda result: result["chunk_count"]),
+    "embed_chunks_activity": ("embed", "vectors", lambda result: result["chunk_count"]),
+    "delete_stale_chunks_activity": ("delete", "vectors", lambda result: result["deleted_count"]),
+    "probe_document_activity": ("probe", "documents", lambda result: 1),
+    "process_document_activity": ("process", "vectors", lambda result: result["embedded_chunks"]),
+}
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible POST /v1/embeddings returning deterministic vectors.
+
+    Each text maps to a unit vector seeded from its SHA-256, so repeated runs
+    produce identical indexes. Usage is reported as one token per four
+    characters, like the tokenizer's fallback estimate.
+    """
+
+    dimensions = 1536
+    latency = 0.0
+    requests = 0
+    inputs = 0
+    _counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    @staticmethod
+    def embed(text: str, dimensions: int) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or self.dimensions
+        if self.latency:
+            time.sleep(self.latency)
+
+        data = []
+        for index, text in enumerate(texts):
+            vector = self.embed(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(max(1, len(text) // 4) for text in texts)
+        with self._counter_lock:
+            FakeEmbeddingsHandler.requests += 1
+            FakeEmbeddingsHandler.inputs += len(texts)
+
+        payload = json.dumps({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_fake_embeddings(latency: float) -> ThreadingHTTPServer:
+    """Serve FakeEmbeddingsHandler on a free local port in a daemon thread."""
+    FakeEmbeddingsHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbeddingsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-embeddings", daemon=True).start()
+    return server
+
+def write_synthetic_pdf(path: str, page_count: int, words_per_page: int = 300, seed: int = 0):
+    """Write a text-only PDF of page_count pages of pseudo-random words.
+
+    Words are drawn from a fixed vocabulary with a seeded generator, so the
+    same arguments always produce the same file.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [
+        "ingest", "vector", "embedding", "chunk", "page", "token", "latency", "throughput",
+        "workflow", "activity", "document", "search", "index", "model", "query", "batch",
+        "retrieval", "context", "parser", "worker", "queue", "storage", "cluster", "result",
+    ]
+    objects: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_num in range(page_count):
+        words = [vocabulary[i] for i in rng.integers(0, len(vocabulary), words_per_page)]
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = f"BT /F1 10 Tf 40 760 Td 12 TL (Section {page_num + 1}) Tj T* "
+        stream += " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        page_id = len(objects) + 1
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of its reaped children (thumbnail/OCR pools)."""
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(records: List[Dict[str, Any]], runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate activity records and workflow runs into per-stage statistics.
+
+    A stage's wall time in one workflow run spans its first activity start to
+    its last activity end, so throughput reflects the stage's parallelism;
+    units and wall times are summed over runs before dividing.
+
+    Args:
+        records (List[Dict[str, Any]]): One entry per activity execution
+        runs (List[Dict[str, Any]]): One entry per workflow run
+
+    Returns:
+        Dict[str, Any]: Statistics keyed by workflow type, then stage
+    """
+    run_by_id = {run["workflow_id"]: run for run in runs}
+    summary: Dict[str, Any] = {}
+
+    for workflow_type in sorted({run["workflow_type"] for run in runs}):
+        type_runs = [run for run in runs if run["workflow_type"] == workflow_type]
+        type_records = [
+            record for record in records
+            if record["workflow_id"] in run_by_id and run_by_id[record["workflow_id"]]["workflow_type"] == workflow_type
+        ]
+
+        spans: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        stages: Dict[str, Dict[str, Any]] = {}
+        for record in type_records:
+            stage, unit, _ = STAGE_UNITS.get(record["activity_type"], (record["activity_type"], "calls", None))
+            stats = stages.setdefault(stage, {"unit": unit, "units": 0, "calls": 0, "failures": 0, "latencies": []})
+            stats["calls"] += 1
+            stats["units"] += record["units"]
+            stats["failures"] += 0 if record["ok"] else 1
+            stats["latencies"].append(record["end"] - record["start"])
+            spans[stage][record["workflow_id"]] += [record["start"], record["end"]]
+
+        for stage, stats in stages.items():
+            wall = sum(max(times) - min(times) for times in spans[stage].values())
+            latencies = stats.pop("latencies")
+            stats.update(
+                wall_seconds=round(wall, 4),
+                per_second=round(stats["units"] / wall, 2) if wall > 0 else None,
+                latency_p50=round(percentile(latencies, 50), 4),
+                latency_p99=round(percentile(latencies, 99), 4),
+            )
+
+        durations = [run["seconds"] for run in type_runs]
+        pages = sum(run["page_count"] for run in type_runs)
+        summary[workflow_type] = {
+            "runs": len(type_runs),
+            "failed_runs": sum(1 for run in type_runs if run["status"] != "success"),
+            "pages": pages,
+            "chunks": sum(run["chunk_count"] for run in type_runs),
+            "pages_per_second": round(pages / sum(durations), 2) if sum(durations) > 0 else None,
+            "latency_p50": round(percentile(durations, 50), 4),
+            "latency_p99": round(percentile(durations, 99), 4),
+            "stages": dict(sorted(stages.items())),
+        }
+    return summary
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark document ingestion without external services")
+    parser.add_argument("documents", nargs="*", help="PDFs to ingest (default: assets/*.pdf)")
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[200],
+                        help="Page counts of generated documents to add")
+    parser.add_argument("--workflows", nargs="+", choices=["intake", "processing"], default=["intake", "processing"])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each workflow per document")
+    parser.add_argument("--concurrency", type=int, default=1, help="Workflows in flight at once")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0,
+                        help="Delay added to every fake embeddings response")
+    parser.add_argument("--temporal-server", help="Existing temporal CLI binary to run the test server with")
+    parser.add_argument("--work-dir", help="Storage directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+async def run_benchmark(args: argparse.Namespace, documents: List[str]) -> Dict[str, Any]:
+    # App modules read the environment on import, so they are imported here,
+    # after main() has pointed it at the fakes
+    from temporalio.testing import WorkflowEnvironment
+    from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+    from temporalio import activity
+    import pypdfium2
+    from app.config import EMBEDDING_DIMENSION
+    from app.workers.codec import DATA_CONVERTER
+    from app.workers.parallel_workflows import DocumentIntakeWorkflow
+    from app.workers.workflows import DocumentProcessingWorkflow
+    from app.workers.tasks import PROCESSING_QUEUE, create_workers, intake_options
+
+    records: List[Dict[str, Any]] = []
+
+    class TimingInterceptor(ActivityInboundInterceptor):
+        async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+            info = activity.info()
+            record = {"workflow_id": info.workflow_id, "activity_type": info.activity_type, "units": 0, "ok": False}
+            record["start"] = time.perf_counter()
+            try:
+                result = await super().execute_activity(input)
+                _, _, units = STAGE_UNITS.get(info.activity_type, (None, None, lambda result: 0))
+                record.update(ok=True, units=units(result))
+                return result
+            finally:
+                record["end"] = time.perf_counter()
+                records.append(record)
+
+    class Timing(Interceptor):
+        def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+            return TimingInterceptor(next)
+
+    page_counts = {}
+    for path in documents:
+        pdf = pypdfium2.PdfDocument(path)
+        page_counts[path] = len(pdf)
+        pdf.close()
+
+    runs: List[Dict[str, Any]] = []
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def run_workflow(client, workflow_type: str, path: str, iteration: int):
+        async with semaphore:
+            workflow_id = f"bench-{workflow_type}-{iteration}-{uuid.uuid4().hex[:8]}"
+            if workflow_type == "intake":
+                workflow_run, workflow_args = DocumentIntakeWorkflow.run, [path, intake_options()]
+            else:
+                workflow_run, workflow_args = DocumentProcessingWorkflow.run, [path]
+            started = time.perf_counter()
+            result = await client.execute_workflow(
+                workflow_run, args=workflow_args, id=workflow_id, task_queue=PROCESSING_QUEUE
+            )
+            seconds = time.perf_counter() - started
+            metadata = result.get("metadata", {})
+            runs.append({
+                "workflow_id": workflow_id,
+                "workflow_type": workflow_type,
+                "document": os.path.basename(path),
+                "status": result.get("status"),
+                "error": result.get("error"),
+                "seconds": seconds,
+                "page_count": page_counts[path],
+                "chunk_count": metadata.get("chunk_count", 0),
+            })
+            print(f"{workflow_type} {os.path.basename(path)}: {result.get('status')} in {seconds:.2f}s", file=sys.stderr)
+
+    FakeEmbeddingsHandler.dimensions = EMBEDDING_DIMENSION
+    env = await WorkflowEnvironment.start_local(
+        data_converter=DATA_CONVERTER,
+        dev_server_existing_path=args.temporal_server
+    )
+    try:
+        workers = create_workers(env.client, interceptors=[Timing()])
+        worker_tasks = [asyncio.create_task(worker.run()) for worker in workers]
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                run_workflow(env.client, workflow_type, path, iteration)
+                for workflow_type in args.workflows
+                for path in documents
+                for iteration in range(args.repeat)
+            ))
+        finally:
+            total_seconds = time.perf_counter() - started
+            await asyncio.gather(*(worker.shutdown() for worker in workers))
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+    finally:
+        await env.shutdown()
+
+    # Reap the thumbnail and OCR pools so their peak RSS is counted
+    from app.services.thumbnails import get_thumbnail_engine
+    get_thumbnail_engine().close()
+    if "app.services.ocr" in sys.modules:
+        from app.services.ocr import get_ocr_engine
+        get_ocr_engine().close()
+
+    return {
+        "total_seconds": round(total_seconds, 4),
+        "embedding_requests": FakeEmbeddingsHandler.requests,
+        "embedding_inputs": FakeEmbeddingsHandler.inputs,
+        "peak_rss_mb": peak_rss_mb(),
+        "workflows": summarize(records, runs),
+        "runs": runs,
+    }
+
+def main():
+    args = parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-ingest-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+
+    documents = [os.path.abspath(path) for path in args.documents] or sorted(
+        str(path) for path in (project_root / "assets").glob("*.pdf")
+    )
+    for page_count in args.synthetic_pages:
+        path = os.path.join(work_dir, f"synthetic_{page_count}.pdf")
+        write_synthetic_pdf(path, page_count, seed=page_count)
+        documents.append(path)
+
+    # Point every external dependency at an in-process fake before any app
+    # module reads its configuration
+    os.environ.update({
+        "STORAGE_PATH": os.path.join(work_dir, "storage"),
+        "VECTOR_STORE_BACKEND": "local",
+        "BLOB_STORE_BACKEND": "local",
+        "OPENAI_API_KEY": "benchmark",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "EMBEDDING_RPM_LIMIT": "0",
+        "EMBEDDING_TPM_LIMIT": "0",
+    })
+    os.environ.pop("DRAGONFLY_URL", None)
+    for name in ("REGISTRY_PATH", "BLOB_STORE_PATH", "LOCAL_VECTOR_STORE_PATH", "KEYWORD_INDEX_PATH",
+                 "CHUNK_STORE_PATH", "CHUNK_MANIFEST_PATH", "EMBEDDING_CACHE_PATH"):
+        os.environ.pop(name, None)
+
+    # The embeddings client reads OPENAI_BASE_URL when the app is imported,
+    # so the fake server has to be listening first
+    embeddings_server = start_fake_embeddings(args.embedding_latency_ms / 1000)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{embeddings_server.server_address[1]}/v1"
+
+    try:
+        results = asyncio.run(run_benchmark(args, documents))
+    finally:
+        embeddings_server.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "documents": [os.path.basename(path) for path in documents],
+            "workflows": args.workflows,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "embedding_latency_ms": args.embedding_latency_ms,
+        },
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
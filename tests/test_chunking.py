@@ -0,0 +1,15 @@
+from app.services.chunking import iter_chunks
+
+def test_text_without_whitespace_keeps_overlap():
+    chunks = list(iter_chunks(["x" * 250], chunk_size=100, overlap=20))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 90]
+    # Chunks start at 0, 80 and 160, so 250 characters appear with 2 x 20 overlap
+    assert sum(len(chunk) for chunk in chunks) == 250 + 2 * 20
+
+def test_breaks_at_any_whitespace():
+    text = "\t".join(f"word{i:02d}" for i in range(40))
+    chunks = list(iter_chunks([text], chunk_size=100, overlap=20))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # No word is cut in half by a tab-separated break
+        assert all(len(word) == 6 for word in chunk.split("\t"))
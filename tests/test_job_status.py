@@ -0,0 +1,29 @@
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from temporalio.service import RPCError, RPCStatusCode
+
+os.environ.setdefault("OPENAI_API_KEY", "job-status-test")
+
+import app.routes.index as index_routes
+
+app = FastAPI()
+app.include_router(index_routes.router, prefix="/index")
+client = TestClient(app)
+
+def fail_with(error: Exception):
+    async def get_job_status(job_id: str):
+        raise error
+    return get_job_status
+
+def test_unknown_job_is_404(monkeypatch):
+    monkeypatch.setattr(index_routes, "get_job_status", fail_with(RPCError("no such workflow", RPCStatusCode.NOT_FOUND, b"")))
+    assert client.get("/index/jobs/doc-intake-missing").status_code == 404
+
+def test_unreachable_temporal_is_503(monkeypatch):
+    monkeypatch.setattr(index_routes, "get_job_status", fail_with(RPCError("connection refused", RPCStatusCode.UNAVAILABLE, b"")))
+    assert client.get("/index/jobs/doc-intake-1").status_code == 503
+
+def test_other_errors_are_500(monkeypatch):
+    monkeypatch.setattr(index_routes, "get_job_status", fail_with(RuntimeError("Failed client connect")))
+    assert client.get("/index/jobs/doc-intake-1").status_code == 500
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+
+# fakeredis runs the limiter's Lua scripts in process (via lupa), standing in
+# for the shared Dragonfly store
+fakeredis = pytest.importorskip("fakeredis")
+import redis
+
+from app.services.rate_limiter import PRIORITY_BULK, PRIORITY_QUERY, RateLimiter
+
+@pytest.fixture
+def server(monkeypatch):
+    """Point every limiter at one fake Redis server, like replicas sharing Dragonfly."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return server
+
+def make_limiter(**kwargs) -> RateLimiter:
+    options = {
+        "requests_per_minute": 10,
+        "tokens_per_minute": 0,
+        "query_reserve": 0.2,
+        "redis_url": "redis://dragonfly:6379/0",
+        **kwargs
+    }
+    return RateLimiter(**options)
+
+def drain(limiter: RateLimiter, priority: str) -> int:
+    """Acquire until the limiter asks the caller to wait; returns requests granted."""
+    granted = 0
+    while limiter.try_acquire(1, priority) == 0:
+        granted += 1
+    return granted
+
+def test_bulk_callers_leave_the_query_reserve(server):
+    limiter = make_limiter()
+    assert limiter.shared
+    assert drain(limiter, PRIORITY_BULK) == 8
+    assert drain(limiter, PRIORITY_QUERY) == 2
+
+def test_token_bucket_caps_bulk_at_the_reserve(server):
+    limiter = make_limiter(requests_per_minute=0, tokens_per_minute=1000)
+    assert limiter.try_acquire(600, PRIORITY_BULK) == 0
+    # 400 tokens left, 200 of them reserved for queries
+    assert limiter.try_acquire(300, PRIORITY_BULK) > 0
+    assert limiter.try_acquire(300, PRIORITY_QUERY) == 0
+
+def test_limiters_share_one_bucket(server):
+    first, second = make_limiter(), make_limiter()
+    assert drain(first, PRIORITY_BULK) == 8
+    assert second.try_acquire(1, PRIORITY_BULK) > 0
+    assert second.try_acquire(1, PRIORITY_QUERY) == 0
+
+def test_pause_applies_to_every_limiter(server):
+    first, second = make_limiter(), make_limiter()
+    first.pause(30)
+    wait = second.try_acquire(1, PRIORITY_QUERY)
+    assert 29 < wait <= 30
+
+def test_async_path_acquires_and_pauses(server):
+    first, second = make_limiter(), make_limiter()
+
+    async def run():
+        await first.aacquire(1, PRIORITY_QUERY)
+        await first.apause(30)
+
+    asyncio.run(run())
+    assert second.try_acquire(1, PRIORITY_QUERY) > 29
+
+def test_unreachable_store_falls_back_for_retry_interval(server, monkeypatch):
+    limiter = make_limiter(retry_interval=60)
+    calls = []
+
+    def unreachable(**kwargs):
+        calls.append(kwargs)
+        raise redis.ConnectionError("connection refused")
+
+    monkeypatch.setattr(limiter, "_acquire_script", unreachable)
+    assert limiter.try_acquire(1, PRIORITY_BULK) == 0
+    assert not limiter.shared
+    # Later calls limit in process without trying the store again
+    assert drain(limiter, PRIORITY_BULK) == 7
+    assert len(calls) == 1
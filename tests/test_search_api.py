@@ -1,6 +1,6 @@
 import requests
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 def test_search(query_config: Dict[str, Any]) -> None:
     """
@@ -47,6 +47,36 @@ def test_search(query_config: Dict[str, Any]) -> None:
     except Exception as e:
         print(f"Error during search: {str(e)}")
 
+def test_search_batch(query_configs: List[Dict[str, Any]]) -> None:
+    """
+    Run several searches through the batch endpoint in one request.
+    
+    Args:
+        query_configs (List[Dict[str, Any]]): Search configurations, as for test_search
+    """
+    search_url = "http://localhost:8000/search/batch"
+    
+    print(f"Executing batch search with {len(query_configs)} queries")
+    
+    try:
+        response = requests.post(
+            search_url,
+            json=query_configs,
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code == 200:
+            for config, results in zip(query_configs, response.json()["results"]):
+                print(f"\n{config['query']}")
+                for result in results:
+                    print(f"  {result['score']:.3f}  {result['doc_id']}  {result['chunk_id']}")
+        else:
+            print(f"Batch search failed with status code: {response.status_code}")
+            print(f"Error: {response.text}")
+            
+    except Exception as e:
+        print(f"Error during batch search: {str(e)}")
+
 if __name__ == "__main__":
     # Example search configurations
     search_configs = [
@@ -77,4 +107,9 @@ if __name__ == "__main__":
     for config in search_configs:
         print("\n" + "="*80)
         test_search(config)
-        print("="*80) 
\ No newline at end of file
+        print("="*80) 
+    
+    # The same searches as one batch request
+    print("\n" + "="*80)
+    test_search_batch(search_configs)
+    print("="*80)
@@ -0,0 +1,29 @@
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Requests rejected by validation never reach the search service, so no
+# OpenAI key or vector store is needed
+os.environ.setdefault("OPENAI_API_KEY", "search-batch-test")
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+
+from app.config import SEARCH_BATCH_MAX_QUERIES
+from app.routes.search import router
+
+app = FastAPI()
+app.include_router(router, prefix="/search")
+client = TestClient(app)
+
+def test_search_batch_rejects_empty_batch():
+    response = client.post("/search/batch", json=[])
+    assert response.status_code == 400
+
+def test_search_batch_rejects_oversized_batch():
+    searches = [{"query": f"query {i}"} for i in range(SEARCH_BATCH_MAX_QUERIES + 1)]
+    response = client.post("/search/batch", json=searches)
+    assert response.status_code == 400
+    assert str(SEARCH_BATCH_MAX_QUERIES) in response.json()["detail"]
+
+def test_search_batch_validates_each_search():
+    response = client.post("/search/batch", json=[{"query": "ok"}, {"query": "too many", "limit": 100}])
+    assert response.status_code == 422
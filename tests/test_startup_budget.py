@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Seconds a cold process may take to import each entry point. Override with
+# STARTUP_BUDGET_SECONDS on slow machines.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+
+# Runner module -> client libraries it must not load at startup
+WORKER_RUNNERS = {
+    "app.runners.workflow_worker": ["openai", "pinecone", "fastapi", "boto3"],
+    "app.runners.thumbnail_worker": ["openai", "pinecone", "fastapi", "boto3"],
+    "app.runners.parsing_worker": ["openai", "pinecone", "fastapi", "boto3"],
+    "app.runners.chunking_worker": ["openai", "pinecone", "fastapi", "boto3"],
+    "app.runners.embedding_worker": ["openai", "pinecone", "fastapi", "boto3"],
+    "app.main": ["pinecone", "boto3"],
+}
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "loaded": [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+def measure_startup(module: str) -> Dict[str, Any]:
+    """
+    Import module in a fresh interpreter and report how long it took.
+
+    Pinecone is selected with a bogus key and unroutable endpoints, so any
+    network call made at import time fails or hangs past the budget.
+
+    Returns:
+        Dict[str, Any]: seconds spent importing and the forbidden client
+            libraries that were loaded
+    """
+    with tempfile.TemporaryDirectory() as storage:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(PROJECT_ROOT),
+            "STORAGE_PATH": storage,
+            "VECTOR_STORE_BACKEND": "pinecone",
+            "PINECONE_API_KEY": "startup-test",
+            "OPENAI_API_KEY": "startup-test",
+            "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+            "TEMPORAL_HOST": "127.0.0.1:9",
+            "METRICS_PORT": "0",
+        }
+        env.pop("DRAGONFLY_URL", None)
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, forbidden=WORKER_RUNNERS[module])],
+            cwd=storage,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=STARTUP_BUDGET_SECONDS * 5
+        )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_startup_budget():
+    """Every worker and the API import within budget without loading clients they don't use."""
+    for module in WORKER_RUNNERS:
+        result = measure_startup(module)
+        print(f"{module}: {result['seconds']:.2f}s")
+        assert not result["loaded"], f"{module} loads {result['loaded']} at startup"
+        assert result["seconds"] < STARTUP_BUDGET_SECONDS, (
+            f"{module} took {result['seconds']:.2f}s to import (budget {STARTUP_BUDGET_SECONDS}s)"
+        )
+
+if __name__ == "__main__":
+    test_startup_budget()
@@ -6,8 +6,21 @@ from pathlib import Path
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
+import time
 import requests
 
+def wait_for_job(job_id: str, timeout: float = 600) -> None:
+    """Poll the job status endpoint until the ingestion workflow finishes."""
+    status_url = f"http://localhost:8000/index/jobs/{job_id}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(status_url).json()
+        print(f"Job {job_id}: {job.get('status')} {job.get('stages')}")
+        if job.get("status") != "running":
+            return
+        time.sleep(2)
+    print(f"Job {job_id} still running after {timeout}s")
+
 def test_document_upload():
     """Test uploading a document to the ingestion pipeline."""
     
@@ -32,11 +45,13 @@ def test_document_upload():
             # Make the upload request
             response = requests.post(upload_url, files=files)
             
-            # Check response
-            if response.status_code == 200:
+            # Check response (202 = queued, 200 = content already indexed)
+            if response.status_code in (200, 202):
                 result = response.json()
                 print("Upload successful!")
                 print(f"Response: {result}")
+                if response.status_code == 202:
+                    wait_for_job(result["job_id"])
             else:
                 print(f"Upload failed with status code: {response.status_code}")
                 print(f"Error: {response.text}")